@@ -4,25 +4,51 @@ AI Analysis Functions - Phân tích CV và Jobs bằng Gemini AI
 import logging
 import json
 from typing import Dict, List, Optional, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
-from api_key_manager import get_next_api_key
+from context_packer import estimate_tokens, pack_text, token_budget
+from llm_cache import cached_llm_call
+from llm_registry import get_chat_model
+
+ANALYSIS_MODEL = "gemini-2.5-flash"
+# Version của prompt trong llm_cache: tăng khi sửa prompt / cách parse để bỏ kết quả cũ
+CV_INSIGHTS_PROMPT_VERSION = "1"
+CV_IMPROVEMENTS_PROMPT_VERSION = "1"
+CV_INSIGHTS_CACHE_TTL = int(os.getenv("CV_INSIGHTS_CACHE_TTL", str(30 * 24 * 3600)))
+CV_IMPROVEMENTS_CACHE_TTL = int(os.getenv("CV_IMPROVEMENTS_CACHE_TTL", str(30 * 24 * 3600)))
+# Ngân sách token cho các trường CV tự do trong prompt (phần còn lại là chỉ dẫn cố định)
+CV_SKILLS_TOKENS = token_budget(ANALYSIS_MODEL) // 10
+CV_OBJECTIVE_TOKENS = token_budget(ANALYSIS_MODEL) // 15
 
 # Initialize Gemini model with API key rotation
 def get_llm():
     """
     Get LLM instance with rotated API key
     Uses gemini-2.5-flash (stable, higher quota than 2.0-flash-exp)
+    Mỗi key chỉ có một instance (llm_registry), nên client gRPC được dùng lại giữa các request
     """
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=get_next_api_key(),
-        temperature=0.3
-    )
+    return get_chat_model(ANALYSIS_MODEL, temperature=0.3)
 
 # Legacy global instance (for backward compatibility)
 llm = get_llm()
 
+
+async def _invoke_json(prompt: str) -> Any:
+    """Gọi LLM rồi parse JSON của response (bỏ markdown code block). JSON hỏng -> JSONDecodeError."""
+    # LLM của key kế tiếp trong vòng xoay (instance dùng chung, xem llm_registry)
+    llm_instance = get_llm()
+    logging.info(f"📦 Prompt ~{estimate_tokens(prompt)} tokens")
+    response = await llm_instance.ainvoke(prompt)
+    content = response.content.strip()
+
+    # Remove markdown code blocks if present
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return json.loads(content.strip())
+
 async def analyze_cv_insights(cv_info: Dict) -> Dict[str, Any]:
     """
     Phân tích CV chuyên sâu - Đánh giá chất lượng, điểm mạnh/yếu
@@ -33,6 +59,10 @@ async def analyze_cv_insights(cv_info: Dict) -> Dict[str, Any]:
     Returns:
         Dict chứa quality_score, strengths, weaknesses, completeness, market_fit
     """
+    # Skills / mục tiêu nghề nghiệp có thể rất dài: giới hạn theo ngân sách token
+    skills_str = pack_text(', '.join(cv_info.get('skills', [])), CV_SKILLS_TOKENS)
+    career_objective = pack_text(cv_info.get('career_objective') or 'N/A', CV_OBJECTIVE_TOKENS, skills_str)
+
     prompt = f"""
 Bạn là chuyên gia phân tích CV. Hãy phân tích CV sau và đưa ra đánh giá chi tiết:
 
@@ -40,8 +70,8 @@ Bạn là chuyên gia phân tích CV. Hãy phân tích CV sau và đưa ra đán
 - Tên: {cv_info.get('name', 'N/A')}
 - Email: {cv_info.get('email', 'N/A')}
 - Điện thoại: {cv_info.get('phone', 'N/A')}
-- Kỹ năng: {', '.join(cv_info.get('skills', []))}
-- Mục tiêu nghề nghiệp: {cv_info.get('career_objective', 'N/A')}
+- Kỹ năng: {skills_str}
+- Mục tiêu nghề nghiệp: {career_objective}
 - Kinh nghiệm: {len(cv_info.get('experience', []))} công việc
 - Học vấn: {len(cv_info.get('education', []))} bằng cấp
 
@@ -91,21 +121,9 @@ Chỉ trả về JSON, không giải thích thêm.
 """
 
     try:
-        # Use fresh LLM instance with rotated API key
-        llm_instance = get_llm()
-        response = await llm_instance.ainvoke(prompt)
-        content = response.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
-        result = json.loads(content)
+        # Cùng prompt (cùng nội dung CV) -> dùng lại kết quả đã sinh, kể cả sau restart
+        result = await cached_llm_call("cv_insights", CV_INSIGHTS_PROMPT_VERSION, ANALYSIS_MODEL, prompt,
+                                       lambda: _invoke_json(prompt), ttl=CV_INSIGHTS_CACHE_TTL)
 
         # Validate và fix completeness_score (KHÔNG BAO GIỜ ÂM)
         if 'completeness_score' in result:
@@ -124,7 +142,7 @@ Chỉ trả về JSON, không giải thích thêm.
         
     except json.JSONDecodeError as e:
         logging.error(f"❌ Lỗi parse JSON từ Gemini: {e}")
-        logging.error(f"Response content: {content}")
+        logging.error(f"Response content: {e.doc}")
         # Return default values
         return {
             "quality_score": 5.0,
@@ -157,10 +175,10 @@ async def generate_cv_improvements(cv_info: Dict, insights: Dict) -> List[Dict[s
         List các gợi ý cải thiện
     """
     # Chuẩn bị thông tin chi tiết
-    skills_str = ', '.join(cv_info.get('skills', [])) if cv_info.get('skills') else 'Chưa có'
+    skills_str = pack_text(', '.join(cv_info.get('skills', [])), CV_SKILLS_TOKENS) if cv_info.get('skills') else 'Chưa có'
     experience_count = len(cv_info.get('experience', []))
     education_count = len(cv_info.get('education', []))
-    career_objective = cv_info.get('career_objective', 'Chưa có')
+    career_objective = pack_text(cv_info.get('career_objective') or 'Chưa có', CV_OBJECTIVE_TOKENS, skills_str)
 
     prompt = f"""
 Bạn là chuyên gia tư vấn CV. Dựa trên phân tích CV, hãy đưa ra gợi ý cải thiện CỤ THỂ DỰA TRÊN CV HIỆN TẠI:
@@ -169,7 +187,7 @@ Bạn là chuyên gia tư vấn CV. Dựa trên phân tích CV, hãy đưa ra g
 - Kỹ năng: {skills_str}
 - Số lượng kinh nghiệm: {experience_count} công việc
 - Số lượng học vấn: {education_count} bằng cấp
-- Mục tiêu nghề nghiệp: {career_objective[:200]}...
+- Mục tiêu nghề nghiệp: {career_objective}
 - Điểm yếu đã phát hiện: {', '.join(insights.get('weaknesses', []))}
 - Phần thiếu: {', '.join(insights.get('missing_sections', []))}
 - Có Portfolio: {insights.get('has_portfolio', False)}
@@ -243,21 +261,9 @@ Chỉ trả về JSON array, không giải thích thêm.
 """
 
     try:
-        # Use fresh LLM instance with rotated API key
-        llm_instance = get_llm()
-        response = await llm_instance.ainvoke(prompt)
-        content = response.content.strip()
-
-        # Remove markdown code blocks
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
-        improvements = json.loads(content)
+        # Mỗi lần bấm /cv/improve với cùng CV + insights không gọi lại Gemini
+        improvements = await cached_llm_call("cv_improvements", CV_IMPROVEMENTS_PROMPT_VERSION, ANALYSIS_MODEL,
+                                             prompt, lambda: _invoke_json(prompt), ttl=CV_IMPROVEMENTS_CACHE_TTL)
 
         # Validate và fix data types
         for imp in improvements:
@@ -274,7 +280,7 @@ Chỉ trả về JSON array, không giải thích thêm.
         
     except json.JSONDecodeError as e:
         logging.error(f"❌ Lỗi parse JSON: {e}")
-        logging.error(f"Response: {content}")
+        logging.error(f"Response: {e.doc}")
         return [
             {
                 "section": "general",
@@ -0,0 +1,163 @@
+"""
+Async Data-Access Layer - Bản async của db_utils cho các endpoint FastAPI
+
+Mọi hàm sqlite3 trong db_utils đều blocking. Gọi trực tiếp trong `async def`
+sẽ chặn event loop (1 query analytics chậm làm treo mọi request khác).
+Module này chạy chúng trên một thread pool riêng, có giới hạn số worker
+(mỗi worker giữ kết nối SQLite riêng của ConnectionManager), và giữ nguyên
+tên + tham số của db_utils để endpoint chỉ cần thêm `await`.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import db_utils
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Thread pool dành riêng cho SQLite (singleton, tạo khi dùng lần đầu)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="sqlite")
+                logging.info(f"✅ Initialized SQLite executor with {DB_EXECUTOR_WORKERS} workers")
+    return _executor
+
+
+def shutdown_db_executor() -> None:
+    """Dừng thread pool (gọi khi shutdown app)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """Chạy một hàm blocking của db_utils trên SQLite executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+# ===== CV FUNCTIONS =====
+
+async def insert_cv_record(filename: str, cv_info: Dict, file_data: bytes = None) -> int:
+    return await run_db(db_utils.insert_cv_record, filename, cv_info, file_data)
+
+async def get_all_cvs() -> List[Dict]:
+    return await run_db(db_utils.get_all_cvs)
+
+async def delete_cv_record(cv_id: int) -> bool:
+    return await run_db(db_utils.delete_cv_record, cv_id)
+
+async def get_cv_info(cv_id: int) -> Optional[Dict]:
+    return await run_db(db_utils.get_cv_info, cv_id)
+
+async def get_cv_record(cv_id: int) -> Optional[Dict]:
+    return await run_db(db_utils.get_cv_record, cv_id)
+
+async def get_cv_file(cv_id: int) -> Optional[Dict]:
+    return await run_db(db_utils.get_cv_file, cv_id)
+
+async def list_cv_records(limit: int, offset: int = 0, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    return await run_db(db_utils.list_cv_records, limit, offset, cursor)
+
+async def list_cvs_page(limit: Optional[int] = None, cursor: Optional[str] = None,
+                        fields: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    return await run_db(db_utils.list_cvs_page, limit, cursor, fields)
+
+async def cv_exists(cv_id: int) -> bool:
+    return await run_db(db_utils.cv_exists, cv_id)
+
+# ===== MATCH LOG FUNCTIONS =====
+
+async def insert_match_log(session_id: str, cv_id: int, matched_jobs: Dict, filter_hash: str = None,
+                           model: str = None, corpus_version: int = None) -> None:
+    return await run_db(db_utils.insert_match_log, session_id, cv_id, matched_jobs, filter_hash, model, corpus_version)
+
+async def get_cached_matches(cv_id: int) -> Optional[List[Dict]]:
+    return await run_db(db_utils.get_cached_matches, cv_id)
+
+async def get_match_history(session_id: str) -> List[Dict]:
+    return await run_db(db_utils.get_match_history, session_id)
+
+async def get_match_cache(cv_id: int, filter_hash: str, model: str) -> Optional[Dict]:
+    return await run_db(db_utils.get_match_cache, cv_id, filter_hash, model)
+
+async def invalidate_match_cache(cv_ids: List[int]) -> int:
+    return await run_db(db_utils.invalidate_match_cache, cv_ids)
+
+async def get_corpus_version() -> int:
+    return await run_db(db_utils.get_corpus_version)
+
+async def purge_expired_match_logs(retention_hours: float = None) -> int:
+    return await run_db(db_utils.purge_expired_match_logs, retention_hours)
+
+# ===== APPLICATIONS FUNCTIONS =====
+
+async def insert_application(cv_id: int, job_id: int, cover_letter: str = "", status: str = "applied") -> int:
+    return await run_db(db_utils.insert_application, cv_id, job_id, cover_letter, status)
+
+async def get_applications_by_cv(cv_id: int, status: str = None) -> List[Dict]:
+    return await run_db(db_utils.get_applications_by_cv, cv_id, status)
+
+async def check_application_exists(cv_id: int, job_id: int) -> bool:
+    return await run_db(db_utils.check_application_exists, cv_id, job_id)
+
+# ===== CV INSIGHTS / PREVIEW FUNCTIONS =====
+
+async def save_cv_insights(cv_id: int, insights: Dict) -> None:
+    return await run_db(db_utils.save_cv_insights, cv_id, insights)
+
+async def get_cv_insights(cv_id: int) -> Optional[Dict]:
+    return await run_db(db_utils.get_cv_insights, cv_id)
+
+async def save_document_preview(file_id: int, preview_data: Dict) -> None:
+    return await run_db(db_utils.save_document_preview, file_id, preview_data)
+
+async def get_document_preview(file_id: int) -> Optional[Dict]:
+    return await run_db(db_utils.get_document_preview, file_id)
+
+# ===== JOB FUNCTIONS =====
+
+async def get_filtered_jobs(filters: Dict) -> Optional[List[int]]:
+    return await run_db(db_utils.get_filtered_jobs, filters)
+
+async def get_total_jobs() -> int:
+    return await run_db(db_utils.get_total_jobs)
+
+async def job_exists(job_id: int) -> bool:
+    return await run_db(db_utils.job_exists, job_id)
+
+async def get_job_title(job_id: int) -> Optional[str]:
+    return await run_db(db_utils.get_job_title, job_id)
+
+async def get_jobs_by_ids(job_ids: List[int], batch_size: int = 100) -> List[Dict]:
+    return await run_db(db_utils.get_jobs_by_ids, job_ids, batch_size)
+
+async def bm25_job_ids(fts_query: str, limit: int, job_ids: Optional[List[int]] = None) -> List[int]:
+    return await run_db(db_utils.bm25_job_ids, fts_query, limit, job_ids)
+
+async def get_jobs_page(limit: int, offset: int = 0, cursor: Optional[str] = None,
+                        fields: Optional[str] = None) -> Tuple[List[Dict], int, Optional[str]]:
+    return await run_db(db_utils.get_jobs_page, limit, offset, cursor, fields)
+
+async def search_jobs(query: Optional[str], filters: Dict, limit: int, offset: int,
+                      sort: str = "relevance") -> Tuple[List[Dict], int]:
+    return await run_db(db_utils.search_jobs, query, filters, limit, offset, sort)
+
+async def get_skill_overlap(job_ids: List[int], cv_skills: List[str]) -> Dict[int, Dict[str, Any]]:
+    return await run_db(db_utils.get_skill_overlap, job_ids, cv_skills)
+
+async def compute_jobs_analytics() -> Dict:
+    return await run_db(db_utils.compute_jobs_analytics)
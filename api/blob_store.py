@@ -0,0 +1,71 @@
+"""
+CV Blob Store - Lưu file PDF của CV theo nội dung (content-addressed) trên đĩa
+
+Mỗi file được đặt tên theo sha256 của nội dung, chia thư mục 2 cấp
+(db/cv_blobs/ab/cd/abcd...) để không dồn hàng chục nghìn file vào một thư mục.
+SQLite chỉ giữ hash + kích thước, nên quét cv_store không kéo theo blob PDF.
+Upload trùng nội dung dùng chung một file (dedupe).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional, Tuple
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(base_dir)
+_default_db_path = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+BLOB_STORE_DIR = os.getenv("TALENTBRIDGE_BLOB_DIR", os.path.join(os.path.dirname(_default_db_path), "cv_blobs"))
+
+
+def blob_path(sha256: str) -> str:
+    """Đường dẫn file của blob theo hash (không kiểm tra tồn tại)."""
+    return os.path.join(BLOB_STORE_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def blob_exists(sha256: str) -> bool:
+    return bool(sha256) and os.path.isfile(blob_path(sha256))
+
+
+def put_blob(data: bytes) -> Tuple[str, int]:
+    """
+    Ghi nội dung vào store, trả về (sha256, size).
+    Ghi atomic (file tạm + fsync + os.replace); nội dung đã có thì bỏ qua.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_path(sha256)
+    if os.path.isfile(path) and os.path.getsize(path) == len(data):
+        return sha256, len(data)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logging.info(f"✅ Stored CV blob {sha256[:12]}… ({len(data)} bytes)")
+    return sha256, len(data)
+
+
+def read_blob(sha256: str) -> Optional[bytes]:
+    """Đọc nội dung blob, None nếu không có."""
+    if not blob_exists(sha256):
+        return None
+    with open(blob_path(sha256), "rb") as f:
+        return f.read()
+
+
+def delete_blob(sha256: str) -> bool:
+    """Xoá blob khỏi store (caller đảm bảo không còn bản ghi nào tham chiếu)."""
+    if not blob_exists(sha256):
+        return False
+    os.remove(blob_path(sha256))
+    logging.info(f"🗑️ Deleted CV blob {sha256[:12]}…")
+    return True
@@ -1,146 +1,199 @@
+import asyncio
 import json
 import logging
 import os
+import time
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import chromadb
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from db_utils import get_db_connection, create_tables
+from typing import Dict, List, Optional, Tuple
+from embedding_providers import EMBEDDING_PROVIDER, create_embeddings, collection_suffix
+from ingest_pipeline import run_ingest
+from vector_index import JobVectorIndex, VECTOR_INDEX_ENABLED, VECTOR_INDEX_DIR
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 _vectorstore = None
+_cv_vectorstore = None
+_chroma_client = None
+_embedding_function = None
+_job_index = None
+
+CHROMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db/chroma_db")
+# Job và CV ở 2 collection riêng: retriever job không bao giờ trả về CV của người khác.
+# Mỗi embedding provider một bộ collection (vector khác số chiều), vd. jobs_hashing
+JOBS_COLLECTION = os.getenv("CHROMA_JOBS_COLLECTION", "jobs") + collection_suffix()
+CVS_COLLECTION = os.getenv("CHROMA_CVS_COLLECTION", "cvs") + collection_suffix()
+LEGACY_COLLECTION = "langchain"  # collection mặc định của langchain_chroma trước khi tách
+# Tham số HNSW theo collection: jobs lớn + truy vấn nhiều -> graph dày hơn, ef_search cao hơn
+JOBS_HNSW = {"space": "cosine", "ef_construction": 200, "max_neighbors": 32, "ef_search": 100}
+CVS_HNSW = {"space": "cosine", "ef_construction": 100, "max_neighbors": 16, "ef_search": 50}
+
+def _get_chroma_client():
+    """chromadb client dùng chung cho mọi collection (một PersistentClient / thư mục)."""
+    global _chroma_client
+    if _chroma_client is None:
+        os.makedirs(CHROMA_PATH, exist_ok=True)
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _chroma_client
+
+def _get_embedding_function():
+    """Embedding function dùng chung, theo EMBEDDING_PROVIDER (google / local / hashing)."""
+    global _embedding_function
+    if _embedding_function is None:
+        _embedding_function = create_embeddings()
+    return _embedding_function
+
+def _open_collection(name: str, hnsw: Dict) -> Chroma:
+    return Chroma(
+        collection_name=name,
+        client=_get_chroma_client(),
+        embedding_function=_get_embedding_function(),
+        collection_configuration={"hnsw": hnsw},
+    )
 
 def get_vectorstore():
     """
-    Khởi tạo Chroma vectorstore với Google Gemini Embedding API
-    Model: text-embedding-004 (miễn phí, hỗ trợ multilingual)
+    Chroma vectorstore của job (collection `jobs`), embedding theo EMBEDDING_PROVIDER
+    (mặc định Google Gemini text-embedding-004, miễn phí, hỗ trợ multilingual)
     """
     global _vectorstore
     if _vectorstore is None:
         try:
-            # Lấy API key từ environment
-            google_api_key = os.getenv("GOOGLE_API_KEY")
-            if not google_api_key:
-                raise ValueError("GOOGLE_API_KEY not found in environment variables")
-
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(base_dir)
-            chroma_path = os.path.join(project_root, "db/chroma_db")
-            os.makedirs(chroma_path, exist_ok=True)
-
-            # Sử dụng Google Gemini Embedding API
-            embedding_function = GoogleGenerativeAIEmbeddings(
-                model="models/text-embedding-004",
-                google_api_key=google_api_key,
-                task_type="retrieval_document"  # Tối ưu cho retrieval
-            )
-
-            _vectorstore = Chroma(
-                persist_directory=chroma_path,
-                embedding_function=embedding_function
-            )
-            logging.info("✅ Initialized Chroma vectorstore with Google Gemini Embedding API (text-embedding-004)")
+            _vectorstore = _open_collection(JOBS_COLLECTION, JOBS_HNSW)
+            logging.info(f"✅ Initialized Chroma collection '{JOBS_COLLECTION}' (embedding provider: {EMBEDDING_PROVIDER})")
         except Exception as e:
             logging.error(f"❌ Error initializing Chroma vectorstore: {e}")
             raise
     return _vectorstore
 
-def preload_jobs(jsonl_path: str, batch_size: int = 1000) -> bool:
+def get_cv_vectorstore():
+    """Chroma vectorstore của CV (collection `cvs`), tách khỏi collection job."""
+    global _cv_vectorstore
+    if _cv_vectorstore is None:
+        try:
+            _cv_vectorstore = _open_collection(CVS_COLLECTION, CVS_HNSW)
+            logging.info(f"✅ Initialized Chroma collection '{CVS_COLLECTION}'")
+        except Exception as e:
+            logging.error(f"❌ Error initializing Chroma CV vectorstore: {e}")
+            raise
+    return _cv_vectorstore
+
+def get_job_index() -> Optional[JobVectorIndex]:
+    """Index ANN trong process (mmap) của collection jobs; None nếu VECTOR_INDEX_ENABLED tắt."""
+    global _job_index
+    if not VECTOR_INDEX_ENABLED:
+        return None
+    if _job_index is None:
+        _job_index = JobVectorIndex(os.path.join(VECTOR_INDEX_DIR, JOBS_COLLECTION))
+    return _job_index
+
+def _metadata_int(metadata: Dict, key: str) -> Optional[int]:
     try:
-        if not os.path.exists(jsonl_path):
-            logging.error(f"File {jsonl_path} does not exist")
-            return False
-        if not jsonl_path.lower().endswith('.jsonl'):
-            raise ValueError(f"File must be .jsonl, got: {jsonl_path}")
+        return int(metadata.get(key))
+    except (TypeError, ValueError):
+        return None
 
-        # Tạo bảng trước khi truy vấn
-        create_tables()
-        logging.info("Ensured database tables are created")
+def migrate_legacy_collection(batch_size: int = 1000, drop_legacy: bool = True) -> Dict[str, int]:
+    """
+    Tách collection cũ (job + CV chung trong `langchain`) sang `jobs` và `cvs`.
+
+    Dùng lại vector đã lưu (không gọi embedding API), id mới cố định job_{id} / cv_{id},
+    job_id trong metadata chuẩn hoá về int. Xoá collection cũ sau khi chép xong.
+    Vector cũ là của Gemini nên chỉ chép khi EMBEDDING_PROVIDER=google.
+    """
+    if EMBEDDING_PROVIDER != "google":
+        logging.info(f"Skipping legacy collection migration (EMBEDDING_PROVIDER={EMBEDDING_PROVIDER})")
+        return {"jobs": 0, "cvs": 0, "skipped": 0}
+    client = _get_chroma_client()
+    if LEGACY_COLLECTION not in {c.name for c in client.list_collections()}:
+        return {"jobs": 0, "cvs": 0, "skipped": 0}
+    legacy = client.get_collection(LEGACY_COLLECTION)
+    targets = {"jobs": get_vectorstore()._collection, "cvs": get_cv_vectorstore()._collection}
+    counts = {"jobs": 0, "cvs": 0, "skipped": 0}
+    total = legacy.count()
+    logging.info(f"⚙️ Migrating {total} documents from Chroma collection '{LEGACY_COLLECTION}'...")
+    for offset in range(0, total, batch_size):
+        page = legacy.get(limit=batch_size, offset=offset, include=["embeddings", "metadatas", "documents"])
+        batches = {"jobs": ([], [], [], []), "cvs": ([], [], [], [])}
+        for embedding, metadata, document in zip(page["embeddings"], page["metadatas"], page["documents"]):
+            metadata = dict(metadata or {})
+            cv_id, job_id = _metadata_int(metadata, "cv_id"), _metadata_int(metadata, "job_id")
+            if cv_id is not None:
+                target, doc_id = "cvs", f"cv_{cv_id}"
+                metadata["cv_id"] = cv_id
+            elif job_id is not None:
+                target, doc_id = "jobs", f"job_{job_id}"
+                metadata["job_id"] = job_id
+            else:
+                counts["skipped"] += 1
+                continue
+            ids, embeddings, metadatas, documents = batches[target]
+            ids.append(doc_id)
+            embeddings.append(embedding)
+            metadatas.append(metadata)
+            documents.append(document)
+        for target, (ids, embeddings, metadatas, documents) in batches.items():
+            if ids:
+                targets[target].upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+                counts[target] += len(ids)
+    if drop_legacy:
+        client.delete_collection(LEGACY_COLLECTION)
+    logging.info(f"✅ Chroma migration completed: {counts['jobs']} jobs, {counts['cvs']} CVs, "
+                 f"{counts['skipped']} skipped")
+    return counts
 
+def preload_jobs(jsonl_path: str, batch_size: int = 1000) -> Optional[Dict]:
+    """
+    Ingest tăng dần file job (JSONL hoặc CSV) vào SQLite + Chroma qua ingest_pipeline.
+    Trả về thống kê inserted/updated/unchanged + throughput từng stage, None nếu lỗi.
+    """
+    try:
+        if not os.path.exists(jsonl_path):
+            logging.error(f"File {jsonl_path} does not exist")
+            return None
         vectorstore = get_vectorstore()
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM job_store')
-            if cursor.fetchone()[0] > 0:
-                logging.info("Skipping preload: job_store already populated")
-                return True
-
-            documents = []
-            with open(jsonl_path, 'r', encoding='utf-8-sig') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        row = json.loads(line)
-                        if not isinstance(row, dict):
-                            continue
-                        # Lưu vào SQLite
-                        number_of_hires = int(float(str(row.get('number_of_hires', '1')).split()[0])) if row.get('number_of_hires') else 1
-                        values = (
-                            row.get('name', '') or '',
-                            row.get('job_title', '') or '',
-                            row.get('job_url', '') or '',
-                            row.get('job_description', '') or '',
-                            row.get('candidate_requirements', '') or '',
-                            row.get('benefits', '') or '',
-                            row.get('work_location', '') or '',
-                            row.get('work_time', '') or '',
-                            row.get('job_tags', '') or '',
-                            row.get('skills', '') or '',
-                            row.get('related_categories', '') or '',
-                            row.get('salary', '') or '',
-                            row.get('experience', '') or '',
-                            row.get('deadline', '') or '',
-                            row.get('company_logo', '') or '',
-                            row.get('company_scale', '') or '',
-                            row.get('company_field', '') or '',
-                            row.get('company_address', '') or '',
-                            row.get('level', '') or '',
-                            row.get('education', '') or '',
-                            number_of_hires,
-                            row.get('work_type', '') or '',
-                            row.get('company_url', '') or '',
-                            row.get('timestamp', '') or ''
-                        )
-                        cursor.execute('''INSERT OR IGNORE INTO job_store (
-                            name, job_title, job_url, job_description, candidate_requirements, 
-                            benefits, work_location, work_time, job_tags, skills, 
-                            related_categories, salary, experience, deadline, company_logo, 
-                            company_scale, company_field, company_address, level, education, 
-                            number_of_hires, work_type, company_url, timestamp
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', values)
-                        if cursor.rowcount > 0:
-                            cursor.execute('SELECT id FROM job_store WHERE job_url = ?', (row.get('job_url', ''),))
-                            job_id = cursor.fetchone()[0]
-                            row['job_id'] = job_id
-                            # Tạo document đầy đủ (không cắt)
-                            page_content = (
-                                f"{row.get('job_title', '')} "
-                                f"{row.get('job_description', '')} "
-                                f"{row.get('candidate_requirements', '')} "
-                                f"{json.dumps(row.get('skills', []), ensure_ascii=False)}"
-                            )
-                            documents.append(Document(page_content=page_content, metadata=row))
-                            # Lưu vào Chroma theo batch 1000
-                            if len(documents) >= batch_size:
-                                vectorstore.add_documents(documents)
-                                logging.info(f"Added batch of {len(documents)} jobs to Chroma")
-                                documents = []
-                    except json.JSONDecodeError as e:
-                        logging.warning(f"Skipping line: JSON error - {e}")
-                        continue
-            # Lưu batch cuối nếu còn
-            if documents:
-                vectorstore.add_documents(documents)
-                logging.info(f"Added final batch of {len(documents)} jobs to Chroma")
-            conn.commit()
-            logging.info(f"Preloaded jobs from {jsonl_path}")
-            return True
+        job_index = get_job_index()
+        stats = run_ingest(jsonl_path, vectorstore, batch_size,
+                           on_batch_written=job_index.add if job_index else None)
     except Exception as e:
         logging.error(f"Error preloading jobs: {e}")
-        return False
+        return None
+    if job_index:
+        try:
+            # Chưa có index / delta quá lớn -> build lại từ Chroma
+            job_index.ensure_built(vectorstore._collection)
+        except Exception as e:
+            logging.error(f"❌ Error building vector index: {e}")
+    return stats
+
+async def find_similar_jobs(job_id: int, k: int = 10) -> Optional[List[Tuple[int, float]]]:
+    """
+    Top-k job gần nhất với job_id theo vector (cosine similarity, không gồm chính nó).
+    Dùng vector_index nếu đã bật và build xong, không thì truy vấn Chroma.
+    None nếu job không có vector.
+    """
+    job_index = get_job_index()
+    if job_index is not None and job_index.ready():
+        return job_index.similar(job_id, k)
+
+    collection = get_vectorstore()._collection
+
+    def query_chroma():
+        found = collection.get(ids=[f"job_{job_id}"], include=["embeddings"])
+        if not found["ids"]:
+            return None
+        result = collection.query(query_embeddings=[found["embeddings"][0]], n_results=k + 1,
+                                  include=["metadatas", "distances"])
+        hits = []
+        for metadata, distance in zip(result["metadatas"][0], result["distances"][0]):
+            other_id = _metadata_int(metadata or {}, "job_id")
+            if other_id is not None and other_id != job_id:
+                hits.append((other_id, 1.0 - float(distance)))
+        return hits[:k]
+
+    return await asyncio.to_thread(query_chroma)
 
 async def index_cv_extracts(skills: list, aspirations: str, experience: str, education: str, cv_id: int) -> bool:
     if not isinstance(cv_id, int):
@@ -153,8 +206,10 @@ async def index_cv_extracts(skills: list, aspirations: str, experience: str, edu
             f"Education: {education}"
         )
         doc = Document(page_content=content, metadata={"cv_id": cv_id})
-        vectorstore = get_vectorstore()
-        vectorstore.add_documents([doc])
+        vectorstore = get_cv_vectorstore()
+        # Embed (API hoặc model local) + ghi Chroma đều chặn: chạy trong thread, không chặn event loop.
+        # upsert: index lại CV thì ghi đè
+        await asyncio.to_thread(vectorstore.add_documents, [doc], ids=[f"cv_{cv_id}"])
         logging.info(f"Indexed CV {cv_id} into Chroma")
         return True
     except Exception as e:
@@ -165,7 +220,7 @@ def delete_cv_from_chroma(cv_id: int) -> bool:
     if not isinstance(cv_id, int):
         raise ValueError("cv_id must be an integer")
     try:
-        vectorstore = get_vectorstore()
+        vectorstore = get_cv_vectorstore()
         docs = vectorstore.get(where={"cv_id": cv_id})
         if not docs['ids']:
             logging.info(f"No documents found for CV {cv_id}")
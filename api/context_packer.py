@@ -0,0 +1,156 @@
+"""
+Context Packer - Đóng gói context cho prompt LLM trong một ngân sách token cố định
+
+Thay vì cắt cứng N ký tự đầu của mỗi tài liệu (bất kể độ dài token hay mức liên quan),
+packer:
+
+1. tách từng phần (yêu cầu ứng viên, kỹ năng, mô tả...) thành câu;
+2. chấm điểm câu theo số từ khoá của query xuất hiện (không phân biệt dấu), cộng ưu tiên
+   theo thứ tự phần (phần đầu — thường là yêu cầu / kỹ năng — được ưu tiên);
+3. bỏ câu boilerplate đã xuất hiện ở tài liệu trước (phúc lợi, giới thiệu công ty lặp lại);
+4. chọn câu tốt nhất cho tới khi hết ngân sách của tài liệu, rồi giữ thứ tự gốc khi in.
+
+Ngân sách chia đều cho các tài liệu còn lại, phần thừa của tài liệu ngắn chuyển sang tài
+liệu sau. Token được ước lượng offline (không gọi countTokens của Gemini), hơi dư để an toàn.
+"""
+import math
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from job_parsing import fold_text
+
+# Ngân sách token cho phần context của prompt, theo model (CONTEXT_TOKEN_BUDGET ghi đè tất cả)
+MODEL_TOKEN_BUDGETS = {
+    "gemini-2.5-flash": 3000,
+    "gemini-2.0-flash-exp": 2000,
+}
+DEFAULT_TOKEN_BUDGET = 2000
+_BUDGET_OVERRIDE = os.getenv("CONTEXT_TOKEN_BUDGET")
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\s*\n+\s*|\s+[•\-–]\s+")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SECTION_BONUS = 0.5  # điểm cộng cho phần đứng trước, giảm dần theo thứ tự phần
+
+
+def token_budget(model: Optional[str] = None) -> int:
+    """Ngân sách token cho context của model."""
+    if _BUDGET_OVERRIDE:
+        return int(_BUDGET_OVERRIDE)
+    return MODEL_TOKEN_BUDGETS.get(model or "", DEFAULT_TOKEN_BUDGET)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Ước lượng số token: mỗi từ / dấu câu ~1.3 token (tiếng Việt có dấu tách thành nhiều
+    sub-token hơn tiếng Anh). Dùng để giới hạn prompt, không cần chính xác tuyệt đối.
+    """
+    return math.ceil(len(_TOKEN_RE.findall(text or "")) * 1.3)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Tách text thành câu / dòng / gạch đầu dòng, bỏ phần rỗng."""
+    return [s.strip(" -•–\t") for s in _SENTENCE_RE.split(text or "") if s and s.strip(" -•–\t")]
+
+
+def query_terms(*parts: str) -> set:
+    """Từ khoá (đã bỏ dấu, dài > 1 ký tự) của query."""
+    return {w for part in parts for w in _WORD_RE.findall(fold_text(part or "")) if len(w) > 1}
+
+
+def _truncate(sentence: str, tokens: int) -> str:
+    """Cắt câu theo từ cho vừa `tokens`, kể cả dấu "…" đánh dấu phần bị cắt."""
+    words = sentence.split()
+    if estimate_tokens(sentence) <= tokens:
+        return sentence
+    kept = []
+    for word in words:
+        if estimate_tokens(" ".join(kept + [word]) + "…") > tokens:
+            break
+        kept.append(word)
+    return " ".join(kept) + "…"
+
+
+def pack_sections(sections: Sequence[Tuple[str, str]], terms: set, budget: int,
+                  seen: Optional[set] = None) -> Tuple[str, int, int]:
+    """
+    Chọn câu liên quan nhất từ các phần (label, text) trong `budget` token.
+    seen: tập câu đã in ở tài liệu trước (bỏ trùng boilerplate), được cập nhật tại chỗ.
+    Trả về (text đã đóng gói, số token ước lượng, số câu trùng đã bỏ).
+    """
+    seen = seen if seen is not None else set()
+    candidates = []  # (score, section_index, position, sentence, tokens, key)
+    duplicates = 0
+    keys = set()
+    budget -= sum(estimate_tokens(f"{label}:") for label, text in sections if label and text)
+    for section_index, (_, text) in enumerate(sections):
+        for position, sentence in enumerate(split_sentences(text)):
+            key = " ".join(_WORD_RE.findall(fold_text(sentence)))
+            if not key:
+                continue
+            if key in seen or key in keys:
+                duplicates += 1
+                continue
+            keys.add(key)
+            hits = len(terms & set(key.split()))
+            score = hits + _SECTION_BONUS * (len(sections) - section_index)
+            candidates.append((score, section_index, position, sentence, estimate_tokens(sentence), key))
+
+    chosen, used = [], 0
+    for candidate in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        score, section_index, position, sentence, tokens, key = candidate
+        if used + tokens > budget:
+            if chosen or budget - used < 8:
+                continue
+            sentence = _truncate(sentence, budget - used)  # câu đầu dài hơn cả ngân sách
+            tokens = estimate_tokens(sentence)
+        chosen.append((section_index, position, sentence))
+        seen.add(key)
+        used += tokens
+
+    lines = []
+    for section_index, (label, _) in enumerate(sections):
+        picked = [sentence for index, _, sentence in sorted(chosen) if index == section_index]
+        if picked:
+            lines.append(f"{label}: {' '.join(picked)}" if label else " ".join(picked))
+    packed = "\n".join(lines)
+    return packed, estimate_tokens(packed), duplicates
+
+
+def pack_text(text: str, budget: int, query: str = "") -> str:
+    """Một đoạn text trong `budget` token: câu liên quan tới query trước, giữ thứ tự gốc."""
+    if estimate_tokens(text) <= budget:
+        return text or ""
+    return pack_sections([("", text)], query_terms(query), budget)[0]
+
+
+def pack_documents(documents: Sequence[Tuple[str, Sequence[Tuple[str, str]]]], query: str,
+                   budget: int) -> Dict:
+    """
+    Đóng gói nhiều tài liệu (header, [(label, text), ...]) vào `budget` token.
+
+    Header (vd. JOB_ID / tiêu đề) luôn được giữ; phần còn lại chia đều ngân sách, phần
+    thừa chuyển cho tài liệu sau. Trả về {"text", "tokens", "budget", "documents": [tokens...],
+    "duplicates_dropped"}.
+    """
+    terms = query_terms(query)
+    seen: set = set()
+    header_tokens = sum(estimate_tokens(header) for header, _ in documents)
+    remaining = max(0, budget - header_tokens)
+    blocks, per_document, duplicates = [], [], 0
+    for index, (header, sections) in enumerate(documents):
+        share = remaining // (len(documents) - index)
+        body, tokens, dropped = pack_sections(sections, terms, share, seen)
+        remaining -= tokens
+        duplicates += dropped
+        blocks.append(f"{header}\n{body}" if body else header)
+        per_document.append(estimate_tokens(header) + tokens)
+    text = "\n\n".join(blocks)
+    return {
+        "text": text,
+        "tokens": estimate_tokens(text),
+        "budget": budget,
+        "documents": per_document,
+        "duplicates_dropped": duplicates,
+    }
@@ -1,35 +1,180 @@
 import sqlite3
 from datetime import datetime
+import base64
+import hashlib
 import json
 import logging
 import os
-from typing import Dict, List, Optional
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from job_parsing import (
+    normalize_skill, parse_skills, typed_job_fields, JOB_SOURCE_COLUMNS, job_row_values, job_content_hash,
+)
+from blob_store import put_blob, delete_blob, blob_path, blob_exists
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(base_dir)
-DB_NAME = os.path.join(project_root, "db/cv_job_matching.db")
+DB_NAME = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+
+# ===== CONNECTION MANAGER =====
+# Các PRAGMA áp dụng cho mọi kết nối (có thể chỉnh qua biến môi trường)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256MB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))   # 64MB / kết nối
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# Match cache: đọc cache trong MATCH_CACHE_TTL_HOURS, xoá log cũ hơn MATCH_LOG_RETENTION_HOURS
+MATCH_CACHE_TTL_HOURS = float(os.getenv("MATCH_CACHE_TTL_HOURS", "1"))
+MATCH_CACHE_MAX_STALE_HOURS = float(os.getenv("MATCH_CACHE_MAX_STALE_HOURS", "24"))  # quá hạn vẫn trả (kèm refresh nền)
+MATCH_LOG_RETENTION_HOURS = float(os.getenv("MATCH_LOG_RETENTION_HOURS", str(7 * 24)))
+MATCH_LOG_PURGE_EVERY = int(os.getenv("MATCH_LOG_PURGE_EVERY", "100"))  # purge sau mỗi N lần ghi
+CV_INFO_CACHE_SIZE = int(os.getenv("CV_INFO_CACHE_SIZE", "1024"))  # số cv_info đã parse giữ trong RAM
 
 from contextlib import contextmanager
+
+
+class ConnectionManager:
+    """
+    Quản lý kết nối SQLite dùng lại theo từng thread.
+
+    - Mỗi thread giữ 1 kết nối đọc và 1 kết nối ghi, mở một lần rồi dùng lại
+      (kèm cache prepared statement của sqlite3).
+    - WAL + synchronous=NORMAL: reader đọc snapshot, không phải chờ writer.
+    - Kết nối ghi được tuần tự hoá trong process bằng một lock, tránh
+      lỗi "database is locked" giữa các thread.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._registry_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+            check_same_thread=False,  # chỉ thread sở hữu dùng; cho phép close_all() từ thread khác
+        )
+        conn.row_factory = sqlite3.Row
+        if not readonly:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        with self._registry_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _get(self, readonly: bool) -> sqlite3.Connection:
+        # Sau fork (nhiều worker uvicorn) không được dùng lại kết nối của process cha
+        if os.getpid() != self._pid:
+            self._local = threading.local()
+            with self._registry_lock:
+                self._connections = []
+            self._write_lock = threading.RLock()
+            self._pid = os.getpid()
+        attr = "reader" if readonly else "writer"
+        conn = getattr(self._local, attr, None)
+        if conn is None:
+            conn = self._connect(readonly)
+            setattr(self._local, attr, conn)
+        return conn
+
+    @contextmanager
+    def connection(self, readonly: bool = False):
+        conn = self._get(readonly)
+        depth_attr = "reader_depth" if readonly else "writer_depth"
+        depth = getattr(self._local, depth_attr, 0)
+        lock = None if readonly else self._write_lock
+        if lock is not None:
+            lock.acquire()
+        setattr(self._local, depth_attr, depth + 1)
+        try:
+            yield conn
+        finally:
+            setattr(self._local, depth_attr, depth)
+            # Giống hành vi close() cũ: thay đổi chưa commit sẽ bị huỷ,
+            # đồng thời giải phóng snapshot đọc để WAL checkpoint được.
+            if depth == 0 and conn.in_transaction:
+                conn.rollback()
+            if lock is not None:
+                lock.release()
+
+    def close_all(self) -> None:
+        """Đóng tất cả kết nối đã mở (dùng khi shutdown hoặc reset database)."""
+        with self._registry_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to close SQLite connection: {e}")
+        self._local = threading.local()
+
+
+_connection_manager = ConnectionManager(DB_NAME)
+
+
 @contextmanager
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+    """Kết nối ghi (dùng lại theo thread, tuần tự hoá giữa các writer)."""
+    with _connection_manager.connection(readonly=False) as conn:
+        yield conn
+
+
+@contextmanager
+def get_read_connection():
+    """Kết nối chỉ đọc (dùng lại theo thread, không chờ writer nhờ WAL)."""
+    with _connection_manager.connection(readonly=True) as conn:
+        yield conn
+
+
+@contextmanager
+def read_snapshot(conn: sqlite3.Connection):
+    """
+    Các câu SELECT trong khối đọc cùng một snapshot (BEGIN DEFERRED, kết thúc bằng rollback).
+    Kết nối đang ở trong transaction thì dùng luôn snapshot đó thay vì BEGIN lồng nhau.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN DEFERRED")
     try:
         yield conn
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def close_all_connections() -> None:
+    _connection_manager.close_all()
 
 def create_tables():
     with get_db_connection() as conn:
-        # Create cv_store table with file_data column
+        # Create cv_store table (file PDF nằm trong blob_store, ở đây chỉ giữ sha256 + size;
+        # file_data chỉ còn cho dữ liệu cũ chưa migrate)
         conn.execute('''CREATE TABLE IF NOT EXISTS cv_store
                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
                          filename TEXT,
                          cv_info_json TEXT,
                          file_data BLOB,
-                         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+                         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         file_sha256 TEXT,
+                         file_size INTEGER)''')
 
         # Migrate existing table if needed (add file_data column if missing)
         cursor = conn.cursor()
@@ -39,13 +184,37 @@ def create_tables():
             logging.info("⚙️ Migrating cv_store: Adding file_data column...")
             conn.execute("ALTER TABLE cv_store ADD COLUMN file_data BLOB")
             logging.info("✅ Migration completed: file_data column added")
+        for column, column_type in (("file_sha256", "TEXT"), ("file_size", "INTEGER")):
+            if column not in columns:
+                logging.info(f"⚙️ Migrating cv_store: Adding {column} column...")
+                conn.execute(f"ALTER TABLE cv_store ADD COLUMN {column} {column_type}")
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_cv_store_sha256 ON cv_store(file_sha256)''')
+        # Keyset pagination cho /cvs, /list-cvs (mới nhất trước)
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_cv_store_upload ON cv_store(upload_timestamp DESC, id DESC)''')
+        _migrate_cv_blobs(conn)
 
         conn.execute('''CREATE TABLE IF NOT EXISTS match_logs
                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
                          session_id TEXT,
                          cv_id INTEGER,
                          matched_jobs_json TEXT,
-                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         matched_jobs_zlib BLOB,
+                         filter_hash TEXT,
+                         model TEXT,
+                         corpus_version INTEGER)''')
+        cursor.execute("PRAGMA table_info(match_logs)")
+        match_log_columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in (("matched_jobs_zlib", "BLOB"), ("filter_hash", "TEXT"),
+                                    ("model", "TEXT"), ("corpus_version", "INTEGER")):
+            if column not in match_log_columns:
+                logging.info(f"⚙️ Migrating match_logs: Adding {column} column...")
+                conn.execute(f"ALTER TABLE match_logs ADD COLUMN {column} {column_type}")
+        # Tra cache theo khoá (cv_id, filter_hash, model), mới nhất trước + purge theo thời gian
+        conn.execute('''DROP INDEX IF EXISTS idx_match_logs_cv_created''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_match_logs_cache_key
+                        ON match_logs(cv_id, filter_hash, model, created_at DESC)''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_match_logs_created ON match_logs(created_at)''')
         conn.execute('''CREATE TABLE IF NOT EXISTS job_store
                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
                          name TEXT,
@@ -71,10 +240,83 @@ def create_tables():
                          number_of_hires INTEGER,
                          work_type TEXT,
                          company_url TEXT,
-                         timestamp TEXT)''')
+                         timestamp TEXT,
+                         deadline_date TEXT,
+                         salary_min_vnd INTEGER,
+                         salary_max_vnd INTEGER,
+                         salary_negotiable INTEGER,
+                         content_hash TEXT)''')
         conn.execute('''CREATE INDEX IF NOT EXISTS idx_job_store_filters ON job_store
                         (work_type, work_location, experience, education, skills)''')
 
+        # Cột đã parse lúc ingest (deadline ISO, lương VND) để lọc/sort bằng index
+        cursor.execute("PRAGMA table_info(job_store)")
+        job_columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in JOB_TYPED_COLUMNS:
+            if column not in job_columns:
+                logging.info(f"⚙️ Migrating job_store: Adding {column} column...")
+                conn.execute(f"ALTER TABLE job_store ADD COLUMN {column} {column_type}")
+        for column, _ in JOB_TYPED_COLUMNS:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_job_store_{column} ON job_store({column})")
+        _backfill_job_typed_fields(conn)
+
+        # Fingerprint nội dung job (ingest chỉ ghi/embed lại các job có nội dung thay đổi)
+        if "content_hash" not in job_columns:
+            logging.info("⚙️ Migrating job_store: Adding content_hash column...")
+            conn.execute("ALTER TABLE job_store ADD COLUMN content_hash TEXT")
+        _backfill_job_content_hash(conn)
+        # Tiến độ ingest theo file nguồn (byte offset) để chạy tiếp sau khi bị ngắt
+        conn.execute('''CREATE TABLE IF NOT EXISTS ingest_checkpoints
+                        (source_path TEXT PRIMARY KEY,
+                         file_size INTEGER,
+                         file_mtime_ns INTEGER,
+                         byte_offset INTEGER NOT NULL DEFAULT 0,
+                         inserted INTEGER NOT NULL DEFAULT 0,
+                         updated INTEGER NOT NULL DEFAULT 0,
+                         unchanged INTEGER NOT NULL DEFAULT 0,
+                         completed INTEGER NOT NULL DEFAULT 0,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # corpus_version: tăng mỗi khi job_store thay đổi (match cache so sánh để biết kết quả đã cũ)
+        conn.execute('''CREATE TABLE IF NOT EXISTS app_meta
+                        (key TEXT PRIMARY KEY,
+                         value INTEGER NOT NULL) WITHOUT ROWID''')
+        conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('corpus_version', 0)")
+        for event in ("INSERT", "DELETE", "UPDATE"):
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_corpus_version_{event.lower()}
+                            AFTER {event} ON job_store BEGIN
+                                UPDATE app_meta SET value = value + 1 WHERE key = 'corpus_version';
+                            END''')
+
+        # Full-text index cho /jobs/search (FTS5, đồng bộ bằng trigger)
+        _create_job_search_index(conn)
+
+        # Skills chuẩn hoá: job_skills (job_id, skill_norm) + từ điển skill kèm số job
+        conn.execute('''CREATE TABLE IF NOT EXISTS skill_dictionary
+                        (skill_norm TEXT PRIMARY KEY,
+                         display_name TEXT NOT NULL,
+                         job_count INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_skill_dictionary_count ON skill_dictionary(job_count DESC)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS job_skills
+                        (job_id INTEGER NOT NULL,
+                         skill_norm TEXT NOT NULL,
+                         PRIMARY KEY (job_id, skill_norm),
+                         FOREIGN KEY (job_id) REFERENCES job_store(id)) WITHOUT ROWID''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_job_skills_skill ON job_skills(skill_norm, job_id)''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS job_skills_count_ai AFTER INSERT ON job_skills BEGIN
+                            UPDATE skill_dictionary SET job_count = job_count + 1 WHERE skill_norm = new.skill_norm;
+                        END''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS job_skills_count_ad AFTER DELETE ON job_skills BEGIN
+                            UPDATE skill_dictionary SET job_count = job_count - 1 WHERE skill_norm = old.skill_norm;
+                        END''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS job_store_skills_ad AFTER DELETE ON job_store BEGIN
+                            DELETE FROM job_skills WHERE job_id = old.id;
+                        END''')
+        _backfill_job_skills(conn)
+
+        # Thống kê /jobs/analytics được duy trì bằng trigger (đọc O(1) thay vì GROUP BY toàn bảng)
+        _create_job_analytics(conn)
+
         # Bảng applications - Lưu lịch sử ứng tuyển
         conn.execute('''CREATE TABLE IF NOT EXISTS applications
                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -114,14 +356,336 @@ def create_tables():
 
         conn.commit()
 
+# ===== FULL-TEXT SEARCH (FTS5) =====
+# unicode61 + remove_diacritics 2: "Kế toán" khớp "ke toan". Riêng "đ/Đ" không phải
+# dấu nên được thay bằng "d/D" trước khi index (vị trí token không đổi nên
+# snippet() vẫn highlight đúng trên nội dung gốc của job_store).
+JOB_FTS_COLUMNS = ["job_title", "job_description", "candidate_requirements", "skills", "job_tags"]
+JOB_FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+JOB_FTS_WEIGHTS = (10.0, 1.0, 2.0, 5.0, 3.0)  # trọng số BM25 theo thứ tự JOB_FTS_COLUMNS
+_job_fts_available: Optional[bool] = None
+
+def fold_vietnamese(text: str) -> str:
+    """Gộp đ/Đ về d/D (các dấu còn lại do tokenizer FTS5 xử lý)."""
+    return text.replace("đ", "d").replace("Đ", "D")
+
+def _fts_folded_values(prefix: str) -> str:
+    return ", ".join(
+        f"replace(replace(coalesce({prefix}.{col}, ''), 'đ', 'd'), 'Đ', 'D')" for col in JOB_FTS_COLUMNS
+    )
+
+def _create_job_search_index(conn: sqlite3.Connection) -> None:
+    global _job_fts_available
+    existed = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_store_fts'").fetchone()
+    columns = ", ".join(JOB_FTS_COLUMNS)
+    try:
+        conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS job_store_fts USING fts5(
+                            {columns},
+                            content='job_store', content_rowid='id',
+                            tokenize='{JOB_FTS_TOKENIZER}', prefix='2 3')''')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"⚠️ FTS5 không khả dụng, /jobs/search sẽ dùng LIKE: {e}")
+        _job_fts_available = False
+        return
+
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_fts_ai AFTER INSERT ON job_store BEGIN
+                        INSERT INTO job_store_fts(rowid, {columns})
+                        VALUES (new.id, {_fts_folded_values("new")});
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_fts_ad AFTER DELETE ON job_store BEGIN
+                        INSERT INTO job_store_fts(job_store_fts, rowid, {columns})
+                        VALUES ('delete', old.id, {_fts_folded_values("old")});
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_fts_au AFTER UPDATE OF {columns} ON job_store BEGIN
+                        INSERT INTO job_store_fts(job_store_fts, rowid, {columns})
+                        VALUES ('delete', old.id, {_fts_folded_values("old")});
+                        INSERT INTO job_store_fts(rowid, {columns})
+                        VALUES (new.id, {_fts_folded_values("new")});
+                    END''')
+
+    if not existed:
+        # Index lần đầu cho dữ liệu có sẵn (không dùng 'rebuild' vì cần gộp đ/Đ)
+        logging.info("⚙️ Building job_store_fts index...")
+        conn.execute(f'''INSERT INTO job_store_fts(rowid, {columns})
+                        SELECT j.id, {_fts_folded_values("j")} FROM job_store j''')
+        logging.info("✅ job_store_fts index built")
+    _job_fts_available = True
+
+def _is_job_fts_available(conn: sqlite3.Connection) -> bool:
+    global _job_fts_available
+    if not _job_fts_available:
+        _job_fts_available = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_store_fts'").fetchone() is not None
+    return _job_fts_available
+
+def build_fts_query(text: str, max_terms: int = 10) -> Optional[str]:
+    """
+    Chuyển chuỗi người dùng nhập thành biểu thức MATCH an toàn:
+    mỗi từ được đặt trong dấu nháy (không bị hiểu là toán tử FTS5) và
+    tìm theo tiền tố, các từ nối với nhau bằng AND ngầm định.
+    """
+    terms = re.findall(r"\w+", fold_vietnamese(text or ""))[:max_terms]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+def build_fts_any_query(phrases: List[str], max_terms: int = 32) -> Optional[str]:
+    """
+    Biểu thức MATCH khớp BẤT KỲ cụm nào (OR), mỗi cụm là một phrase chính xác
+    ("Kế toán" -> "Kế toán", các từ phải liền nhau). Dùng cho truy vấn dài như
+    kỹ năng của CV, nơi AND ngầm định của build_fts_query gần như không khớp job nào.
+    """
+    parts, seen, n_terms = [], set(), 0
+    for phrase in phrases:
+        terms = re.findall(r"\w+", fold_vietnamese(phrase or "").lower())
+        key = " ".join(terms)
+        if not terms or key in seen or n_terms + len(terms) > max_terms:
+            continue
+        seen.add(key)
+        n_terms += len(terms)
+        parts.append(f'"{key}"')
+    return " OR ".join(parts) or None
+
+def bm25_job_ids(fts_query: str, limit: int, job_ids: Optional[List[int]] = None) -> List[int]:
+    """
+    Top `limit` job_id theo BM25 (trọng số JOB_FTS_WEIGHTS) cho biểu thức MATCH đã dựng sẵn,
+    giới hạn trong job_ids nếu có. Không có FTS5 thì trả về [].
+    """
+    with get_read_connection() as conn:
+        if not _is_job_fts_available(conn):
+            return []
+        weights = ", ".join(str(w) for w in JOB_FTS_WEIGHTS)
+        sql = "SELECT rowid FROM job_store_fts WHERE job_store_fts MATCH ?"
+        params: List[Any] = [fts_query]
+        if job_ids is not None:
+            # json_each: danh sách id dài không bị giới hạn số tham số của SQLite
+            sql += " AND rowid IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps([int(j) for j in job_ids]))
+        rows = conn.execute(f"{sql} ORDER BY bm25(job_store_fts, {weights}) LIMIT ?", params + [limit])
+        return [row[0] for row in rows]
+
+# ===== JOB TYPED FIELDS =====
+
+# (tên cột, kiểu) - giá trị tính bằng job_parsing.typed_job_fields(salary, deadline, timestamp)
+JOB_TYPED_COLUMNS = [
+    ("deadline_date", "TEXT"),
+    ("salary_min_vnd", "INTEGER"),
+    ("salary_max_vnd", "INTEGER"),
+    ("salary_negotiable", "INTEGER"),
+]
+
+def _backfill_job_typed_fields(conn: sqlite3.Connection, batch_size: int = 1000) -> None:
+    """
+    Migration: parse salary/deadline cho các job chưa có cột typed
+    (salary_negotiable luôn được ghi 0/1 lúc ingest, NULL = chưa parse).
+    """
+    rows = conn.execute(
+        "SELECT id, salary, deadline, timestamp FROM job_store WHERE salary_negotiable IS NULL").fetchall()
+    if not rows:
+        return
+    logging.info(f"⚙️ Parsing salary/deadline for {len(rows)} jobs...")
+    for start in range(0, len(rows), batch_size):
+        conn.executemany(
+            '''UPDATE job_store SET deadline_date = ?, salary_min_vnd = ?, salary_max_vnd = ?, salary_negotiable = ?
+               WHERE id = ?''',
+            [typed_job_fields(row['salary'], row['deadline'], row['timestamp']) + (row['id'],) for row in rows[start:start + batch_size]])
+    logging.info(f"✅ Migration completed: typed salary/deadline columns filled for {len(rows)} jobs")
+
+# ===== JOB INGESTION =====
+
+INGEST_STATUSES = ("inserted", "updated", "unchanged")
+JOB_URL_INDEX = JOB_SOURCE_COLUMNS.index("job_url")
+
+def _backfill_job_content_hash(conn: sqlite3.Connection, batch_size: int = 1000) -> None:
+    """Migration: tính content_hash cho các job đã ingest trước khi có cột này."""
+    rows = conn.execute(f"SELECT id, {', '.join(JOB_SOURCE_COLUMNS)} FROM job_store WHERE content_hash IS NULL").fetchall()
+    if not rows:
+        return
+    logging.info(f"⚙️ Computing content_hash for {len(rows)} jobs...")
+    for start in range(0, len(rows), batch_size):
+        conn.executemany(
+            'UPDATE job_store SET content_hash = ? WHERE id = ?',
+            [(job_content_hash(job_row_values({c: row[c] for c in JOB_SOURCE_COLUMNS})), row['id'])
+             for row in rows[start:start + batch_size]])
+    logging.info(f"✅ Migration completed: content_hash filled for {len(rows)} jobs")
+
+JOB_UPSERT_CHUNK_SIZE = 500  # 29 tham số / job, dưới giới hạn biến của SQLite
+
+def get_existing_jobs(conn: sqlite3.Connection, job_urls: List[str]) -> Dict[str, Tuple[int, str]]:
+    """(id, content_hash) hiện tại theo job_url (job chưa có trong job_store thì không có trong kết quả)."""
+    existing: Dict[str, Tuple[int, str]] = {}
+    unique = list(dict.fromkeys(job_urls))
+    for start in range(0, len(unique), JOB_UPSERT_CHUNK_SIZE):
+        chunk = unique[start:start + JOB_UPSERT_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT id, job_url, content_hash FROM job_store WHERE job_url IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update((row['job_url'], (row['id'], row['content_hash'])) for row in rows)
+    return existing
+
+def bulk_upsert_jobs(conn: sqlite3.Connection, jobs: List[Dict]) -> List[Tuple[Optional[int], str]]:
+    """
+    Ghi nhiều job đã chuẩn hoá (values, typed, content_hash, skills) bằng INSERT nhiều dòng
+    ... ON CONFLICT(job_url) DO UPDATE ... RETURNING id. Job có content_hash không đổi
+    được bỏ qua. Gọi trong transaction của code ingest; không commit.
+
+    Trả về (job_id, status) theo đúng thứ tự `jobs`; job 'unchanged' giữ id hiện có
+    (None với các bản trùng job_url trước bản cuối trong batch).
+    """
+    results: List[Tuple[Optional[int], str]] = [(None, "unchanged")] * len(jobs)
+    # Job trùng job_url trong cùng batch: chỉ ghi bản cuối
+    last_index = {job['values'][JOB_URL_INDEX]: i for i, job in enumerate(jobs)}
+    existing = get_existing_jobs(conn, list(last_index))
+    pending = []
+    for url, i in last_index.items():
+        if url in existing and existing[url][1] == jobs[i]['content_hash']:
+            results[i] = (existing[url][0], "unchanged")
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    columns = JOB_SOURCE_COLUMNS + [column for column, _ in JOB_TYPED_COLUMNS] + ["content_hash"]
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "job_url")
+    row_placeholder = f"({', '.join('?' * len(columns))})"
+    job_ids: Dict[str, int] = {}
+    for start in range(0, len(pending), JOB_UPSERT_CHUNK_SIZE):
+        chunk = pending[start:start + JOB_UPSERT_CHUNK_SIZE]
+        params = [p for i in chunk for p in jobs[i]['values'] + tuple(jobs[i]['typed']) + (jobs[i]['content_hash'],)]
+        rows = conn.execute(
+            f'''INSERT INTO job_store ({', '.join(columns)}) VALUES {', '.join([row_placeholder] * len(chunk))}
+                ON CONFLICT(job_url) DO UPDATE SET {updates}
+                WHERE job_store.content_hash IS NOT excluded.content_hash
+                RETURNING id, job_url''', params).fetchall()
+        job_ids.update((row['job_url'], row['id']) for row in rows)
+
+    written = [i for i in pending if jobs[i]['values'][JOB_URL_INDEX] in job_ids]
+    for i in written:
+        url = jobs[i]['values'][JOB_URL_INDEX]
+        results[i] = (job_ids[url], "updated" if url in existing else "inserted")
+    _replace_job_skills(conn, [(job_ids[jobs[i]['values'][JOB_URL_INDEX]], jobs[i]['skills']) for i in written])
+    return results
+
+def _replace_job_skills(conn: sqlite3.Connection, items: List[Tuple[int, List[Tuple[str, str]]]]) -> None:
+    """Bản bulk của set_job_skills cho skills đã parse sẵn [(skill_norm, display_name)]."""
+    if not items:
+        return
+    conn.executemany('DELETE FROM job_skills WHERE job_id = ?', [(job_id,) for job_id, _ in items])
+    conn.executemany('INSERT OR IGNORE INTO skill_dictionary (skill_norm, display_name) VALUES (?, ?)',
+                     [skill for _, skills in items for skill in skills])
+    conn.executemany('INSERT OR IGNORE INTO job_skills (job_id, skill_norm) VALUES (?, ?)',
+                     [(job_id, norm) for job_id, skills in items for norm, _ in skills])
+
+def get_ingest_checkpoint(conn: sqlite3.Connection, source_path: str) -> Optional[Dict]:
+    row = conn.execute('SELECT * FROM ingest_checkpoints WHERE source_path = ?', (source_path,)).fetchone()
+    return dict(row) if row else None
+
+def save_ingest_checkpoint(conn: sqlite3.Connection, source_path: str, file_size: int, file_mtime_ns: int,
+                           byte_offset: int, stats: Dict[str, int], completed: bool = False) -> None:
+    """Lưu tiến độ ingest; gọi trong cùng transaction với batch vừa ghi (không commit)."""
+    conn.execute('''INSERT INTO ingest_checkpoints
+                    (source_path, file_size, file_mtime_ns, byte_offset, inserted, updated, unchanged, completed, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(source_path) DO UPDATE SET
+                        file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns,
+                        byte_offset = excluded.byte_offset, inserted = excluded.inserted,
+                        updated = excluded.updated, unchanged = excluded.unchanged,
+                        completed = excluded.completed, updated_at = excluded.updated_at''',
+                 (source_path, file_size, file_mtime_ns, byte_offset,
+                  stats.get("inserted", 0), stats.get("updated", 0), stats.get("unchanged", 0), int(completed)))
+
+# ===== JOB SKILLS =====
+
+def set_job_skills(conn: sqlite3.Connection, job_id: int, raw_skills: Any) -> int:
+    """
+    Ghi skills đã chuẩn hoá của một job vào job_skills (thay thế skills cũ).
+    Gọi trong transaction của code ingest; không commit. Trả về số skill.
+    """
+    skills = parse_skills(raw_skills)
+    conn.execute('DELETE FROM job_skills WHERE job_id = ?', (job_id,))
+    if skills:
+        conn.executemany('INSERT OR IGNORE INTO skill_dictionary (skill_norm, display_name) VALUES (?, ?)', skills)
+        conn.executemany('INSERT OR IGNORE INTO job_skills (job_id, skill_norm) VALUES (?, ?)',
+                         [(job_id, norm) for norm, _ in skills])
+    return len(skills)
+
+def _backfill_job_skills(conn: sqlite3.Connection) -> None:
+    """Migration: tách skills cho các job đã có trước khi có bảng job_skills."""
+    has_skills = conn.execute('SELECT 1 FROM job_skills LIMIT 1').fetchone()
+    has_jobs = conn.execute("SELECT 1 FROM job_store WHERE skills IS NOT NULL AND skills != '' LIMIT 1").fetchone()
+    if has_skills or not has_jobs:
+        return
+    logging.info("⚙️ Migrating job_store.skills into job_skills...")
+    rows = conn.execute("SELECT id, skills FROM job_store WHERE skills IS NOT NULL AND skills != ''").fetchall()
+    for row in rows:
+        set_job_skills(conn, row['id'], row['skills'])
+    logging.info(f"✅ Migration completed: skills parsed for {len(rows)} jobs")
+
+def get_skill_overlap(job_ids: List[int], cv_skills: List[str]) -> Dict[int, Dict[str, Any]]:
+    """
+    So khớp skills của CV với từng job bằng index job_skills.
+    Trả về {job_id: {"matched": [display_name, ...], "total": số skill của job}}.
+    """
+    norms = sorted({normalize_skill(s) for s in cv_skills or [] if isinstance(s, str) and s.strip()})
+    if not job_ids:
+        return {}
+    job_placeholders = ",".join(["?"] * len(job_ids))
+    if norms:
+        skill_placeholders = ",".join(["?"] * len(norms))
+        matched_expr = f"group_concat(CASE WHEN js.skill_norm IN ({skill_placeholders}) THEN d.display_name END, char(31))"
+    else:
+        matched_expr = "NULL"
+    with get_read_connection() as conn:
+        cursor = conn.execute(
+            f'''SELECT js.job_id, COUNT(*) AS total, {matched_expr} AS matched
+                FROM job_skills js JOIN skill_dictionary d ON d.skill_norm = js.skill_norm
+                WHERE js.job_id IN ({job_placeholders})
+                GROUP BY js.job_id''',
+            norms + list(job_ids))
+        return {
+            row['job_id']: {
+                "matched": row['matched'].split("\x1f") if row['matched'] else [],
+                "total": row['total']
+            }
+            for row in cursor.fetchall()
+        }
+
+# ===== CV BLOBS =====
+
+def _migrate_cv_blobs(conn: sqlite3.Connection) -> None:
+    """Migration: chuyển file_data inline trong cv_store sang blob_store."""
+    ids = [row['id'] for row in conn.execute('SELECT id FROM cv_store WHERE file_data IS NOT NULL').fetchall()]
+    if not ids:
+        return
+    logging.info(f"⚙️ Migrating {len(ids)} CV files from cv_store.file_data to blob store...")
+    for cv_id in ids:
+        # Đọc từng blob một để không nạp toàn bộ PDF vào RAM
+        row = conn.execute('SELECT file_data FROM cv_store WHERE id = ?', (cv_id,)).fetchone()
+        sha256, size = put_blob(bytes(row['file_data']))
+        conn.execute('UPDATE cv_store SET file_sha256 = ?, file_size = ?, file_data = NULL WHERE id = ?',
+                     (sha256, size, cv_id))
+    logging.info("✅ Migration completed: CV files moved to blob store (chạy VACUUM để thu hồi dung lượng DB)")
+
+def _release_cv_blob(conn: sqlite3.Connection, sha256: Optional[str]) -> None:
+    """Xoá blob nếu không còn CV nào tham chiếu (gọi khi đang giữ kết nối ghi)."""
+    if not sha256:
+        return
+    still_used = conn.execute('SELECT 1 FROM cv_store WHERE file_sha256 = ? LIMIT 1', (sha256,)).fetchone()
+    if not still_used:
+        delete_blob(sha256)
+
 def insert_cv_record(filename: str, cv_info: Dict, file_data: bytes = None) -> int:
     if not isinstance(cv_info, dict):
         raise ValueError("cv_info must be a dictionary")
     with get_db_connection() as conn:
         cursor = conn.cursor()
         if file_data:
-            cursor.execute('INSERT INTO cv_store (filename, cv_info_json, file_data) VALUES (?, ?, ?)',
-                           (filename, json.dumps(cv_info, ensure_ascii=False), file_data))
+            # Ghi blob trong lúc giữ kết nối ghi: không xen kẽ với việc xoá blob của delete_cv_record
+            sha256, size = put_blob(file_data)
+            # Upload lại cùng file: cv_info được trích xuất lại, bỏ match cache của các bản upload trước
+            cursor.execute('DELETE FROM match_logs WHERE cv_id IN (SELECT id FROM cv_store WHERE file_sha256 = ?)',
+                           (sha256,))
+            cursor.execute('INSERT INTO cv_store (filename, cv_info_json, file_sha256, file_size) VALUES (?, ?, ?, ?)',
+                           (filename, json.dumps(cv_info, ensure_ascii=False), sha256, size))
         else:
             cursor.execute('INSERT INTO cv_store (filename, cv_info_json) VALUES (?, ?)',
                            (filename, json.dumps(cv_info, ensure_ascii=False)))
@@ -129,69 +693,188 @@ def insert_cv_record(filename: str, cv_info: Dict, file_data: bytes = None) -> i
         conn.commit()
         return cv_id
 
-def insert_match_log(session_id: str, cv_id: int, matched_jobs: Dict) -> None:
+# ===== MATCH CACHE =====
+
+# Chỉ lưu kết quả match; chi tiết job được hydrate lúc đọc bằng get_jobs_by_ids
+MATCH_CACHE_FIELDS = ("job_id", "match_score", "matched_skills", "matched_aspirations",
+                      "matched_experience", "matched_education", "why_match")
+
+_match_log_writes = 0
+_match_log_writes_lock = threading.Lock()
+
+def _compact_matched_job(job: Dict) -> Dict:
+    compact = {field: job[field] for field in MATCH_CACHE_FIELDS if job.get(field) not in (None, [], "")}
+    job_id = compact.get("job_id")
+    if isinstance(job_id, str) and job_id.isdigit():
+        compact["job_id"] = int(job_id)
+    return compact
+
+def _encode_matched_jobs(matched_jobs) -> bytes:
+    if isinstance(matched_jobs, list):
+        matched_jobs = [_compact_matched_job(job) if isinstance(job, dict) else job for job in matched_jobs]
+    payload = json.dumps(matched_jobs, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(payload, 6)
+
+def _decode_matched_jobs(row: sqlite3.Row):
+    """Đọc matched jobs từ cột nén (định dạng mới) hoặc matched_jobs_json (log cũ)."""
+    if row['matched_jobs_zlib'] is not None:
+        return json.loads(zlib.decompress(row['matched_jobs_zlib']).decode("utf-8"))
+    return json.loads(row['matched_jobs_json'])
+
+def match_filter_hash(filters: Optional[Dict]) -> str:
+    """
+    Hash ổn định của bộ lọc /match: bỏ giá trị rỗng, sort key và phần tử list,
+    nên {"skills": ["SQL", "Python"]} và {"skills": ["Python", "SQL"], "education": []} cùng hash.
+    """
+    normalized = {}
+    for key, value in (filters or {}).items():
+        if value in (None, "", [], {}):
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted({str(v).strip() for v in value if str(v).strip()})
+        elif isinstance(value, str):
+            value = value.strip()
+        normalized[key] = value
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def get_corpus_version() -> int:
+    """Phiên bản hiện tại của job_store (tăng bởi trigger khi thêm/sửa/xoá job)."""
+    with get_read_connection() as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'corpus_version'").fetchone()
+    return row['value'] if row else 0
+
+def insert_match_log(session_id: str, cv_id: int, matched_jobs: Dict, filter_hash: str = None,
+                     model: str = None, corpus_version: int = None) -> None:
+    """
+    Lưu kết quả match dạng gọn (job_id, score, matched_*, why_match), nén zlib.
+    corpus_version nên là phiên bản lúc bắt đầu match (mặc định: phiên bản hiện tại).
+    """
+    global _match_log_writes
     if not isinstance(session_id, str) or not session_id:
         raise ValueError("session_id must be a non-empty string")
     if not isinstance(cv_id, int):
         raise ValueError("cv_id must be an integer")
     if not isinstance(matched_jobs, (list, dict)):
         raise ValueError("matched_jobs must be a list or dict")
+    if filter_hash is None:
+        filter_hash = match_filter_hash({})
+    with get_db_connection() as conn:
+        if corpus_version is None:
+            row = conn.execute("SELECT value FROM app_meta WHERE key = 'corpus_version'").fetchone()
+            corpus_version = row['value'] if row else 0
+        conn.execute('''INSERT INTO match_logs (session_id, cv_id, matched_jobs_zlib, filter_hash, model, corpus_version)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (session_id, cv_id, _encode_matched_jobs(matched_jobs), filter_hash, model, corpus_version))
+        conn.commit()
+    with _match_log_writes_lock:
+        _match_log_writes += 1
+        should_purge = _match_log_writes % MATCH_LOG_PURGE_EVERY == 0
+    if should_purge:
+        purge_expired_match_logs()
+
+def purge_expired_match_logs(retention_hours: float = None) -> int:
+    """Xoá match_logs cũ hơn retention_hours (mặc định MATCH_LOG_RETENTION_HOURS). Trả về số dòng đã xoá."""
+    hours = MATCH_LOG_RETENTION_HOURS if retention_hours is None else retention_hours
     with get_db_connection() as conn:
-        conn.execute('INSERT INTO match_logs (session_id, cv_id, matched_jobs_json) VALUES (?, ?, ?)',
-                     (session_id, cv_id, json.dumps(matched_jobs, ensure_ascii=False)))
+        deleted = conn.execute("DELETE FROM match_logs WHERE created_at < datetime('now', ?)",
+                               (f"-{hours} hours",)).rowcount
         conn.commit()
+    if deleted:
+        logging.info(f"🧹 Đã xoá {deleted} match_logs cũ hơn {hours} giờ")
+    return deleted
 
 def get_cached_matches(cv_id: int) -> Optional[List[Dict]]:
     """
-    Lấy cached matches cho CV (20 jobs đã match trước đó)
+    Lấy cached matches cho CV (MATCH_TOP_K jobs đã match trước đó)
 
     Args:
         cv_id: ID của CV
 
     Returns:
-        List 20 jobs đã match, hoặc None nếu chưa có cache
+        List kết quả match dạng gọn (job_id, match_score, matched_*, why_match),
+        hoặc None nếu chưa có cache / cache cũ hơn MATCH_CACHE_TTL_HOURS.
+        Caller hydrate chi tiết job bằng get_jobs_by_ids.
     """
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT matched_jobs_json, created_at FROM match_logs WHERE cv_id = ? ORDER BY created_at DESC LIMIT 1',
-            (cv_id,)
-        )
-        row = cursor.fetchone()
-        if row:
-            try:
-                jobs = json.loads(row['matched_jobs_json'])
-                # Kiểm tra cache có cũ hơn 1 giờ không
-                from datetime import datetime, timedelta
-                created_at = datetime.fromisoformat(row['created_at'])
-                if datetime.now() - created_at < timedelta(hours=1):
-                    logging.info(f"✅ Lấy {len(jobs)} cached jobs cho CV {cv_id}")
-                    return jobs
-                else:
-                    logging.info(f"⚠️ Cache cho CV {cv_id} đã cũ hơn 1 giờ, cần refresh")
-                    return None
-            except Exception as e:
-                logging.error(f"❌ Lỗi parse cached jobs: {e}")
-                return None
+    with get_read_connection() as conn:
+        # created_at là CURRENT_TIMESTAMP (UTC) nên so sánh bằng datetime('now') của SQLite
+        row = conn.execute(
+            '''SELECT matched_jobs_json, matched_jobs_zlib FROM match_logs
+               WHERE cv_id = ? AND created_at > datetime('now', ?)
+               ORDER BY created_at DESC LIMIT 1''',
+            (cv_id, f"-{MATCH_CACHE_TTL_HOURS} hours")
+        ).fetchone()
+    if not row:
+        logging.info(f"⚠️ Không có cache còn hạn cho CV {cv_id}, cần refresh")
+        return None
+    try:
+        jobs = _decode_matched_jobs(row)
+        logging.info(f"✅ Lấy {len(jobs)} cached jobs cho CV {cv_id}")
+        return jobs
+    except Exception as e:
+        logging.error(f"❌ Lỗi parse cached jobs: {e}")
+        return None
+
+def get_match_cache(cv_id: int, filter_hash: str, model: str) -> Optional[Dict]:
+    """
+    Tra match cache theo khoá (cv_id, filter_hash, model) - stale-while-revalidate.
+
+    Returns:
+        None nếu không có entry nào trong MATCH_CACHE_MAX_STALE_HOURS, ngược lại
+        {"matched_jobs": [...], "stale": bool, "corpus_version": int}. stale=True khi
+        entry cũ hơn MATCH_CACHE_TTL_HOURS hoặc job_store đã đổi (corpus_version khác):
+        vẫn trả về ngay, caller tự refresh nền.
+    """
+    with get_read_connection() as conn:
+        row = conn.execute(
+            '''SELECT matched_jobs_json, matched_jobs_zlib, corpus_version,
+                      created_at > datetime('now', ?) AS fresh,
+                      (SELECT value FROM app_meta WHERE key = 'corpus_version') AS current_version
+               FROM match_logs
+               WHERE cv_id = ? AND filter_hash = ? AND model = ? AND created_at > datetime('now', ?)
+               ORDER BY created_at DESC LIMIT 1''',
+            (f"-{MATCH_CACHE_TTL_HOURS} hours", cv_id, filter_hash, model, f"-{MATCH_CACHE_MAX_STALE_HOURS} hours")
+        ).fetchone()
+    if not row:
         return None
+    try:
+        jobs = _decode_matched_jobs(row)
+    except Exception as e:
+        logging.error(f"❌ Lỗi parse cached jobs: {e}")
+        return None
+    stale = not row['fresh'] or row['corpus_version'] != row['current_version']
+    return {"matched_jobs": jobs, "stale": stale, "corpus_version": row['corpus_version']}
+
+def invalidate_match_cache(cv_ids: List[int]) -> int:
+    """Xoá match cache của các CV (khi nội dung CV đổi / upload lại). Trả về số entry đã xoá."""
+    if not cv_ids:
+        return 0
+    with get_db_connection() as conn:
+        deleted = conn.execute(f"DELETE FROM match_logs WHERE cv_id IN ({','.join(['?'] * len(cv_ids))})",
+                               list(cv_ids)).rowcount
+        conn.commit()
+    if deleted:
+        logging.info(f"🧹 Đã xoá {deleted} match cache của CV {list(cv_ids)}")
+    return deleted
 
 def get_match_history(session_id: str) -> List[Dict]:
     if not isinstance(session_id, str) or not session_id:
         raise ValueError("session_id must be a non-empty string")
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT cv_id, matched_jobs_json FROM match_logs WHERE session_id = ? ORDER BY created_at', (session_id,))
+        cursor.execute('''SELECT cv_id, matched_jobs_json, matched_jobs_zlib FROM match_logs
+                          WHERE session_id = ? ORDER BY created_at''', (session_id,))
         history = []
         for row in cursor.fetchall():
             try:
-                history.append({"cv_id": row["cv_id"], "matched_jobs": json.loads(row["matched_jobs_json"])})
-            except json.JSONDecodeError as e:
-                logging.warning(f"Failed to parse matched_jobs_json for cv_id {row['cv_id']}: {e}")
+                history.append({"cv_id": row["cv_id"], "matched_jobs": _decode_matched_jobs(row)})
+            except (json.JSONDecodeError, zlib.error) as e:
+                logging.warning(f"Failed to parse matched jobs for cv_id {row['cv_id']}: {e}")
                 continue
         return history
 
 def get_all_cvs() -> List[Dict]:
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id, filename, cv_info_json, upload_timestamp FROM cv_store ORDER BY upload_timestamp DESC')
         cvs = []
@@ -212,9 +895,14 @@ def delete_cv_record(cv_id: int) -> bool:
     if not isinstance(cv_id, int):
         raise ValueError("cv_id must be an integer")
     with get_db_connection() as conn:
+        row = conn.execute('SELECT file_sha256 FROM cv_store WHERE id = ?', (cv_id,)).fetchone()
         conn.execute('DELETE FROM cv_store WHERE id = ?', (cv_id,))
         conn.execute('DELETE FROM match_logs WHERE cv_id = ?', (cv_id,))
         conn.commit()
+        with _cv_info_cache_lock:
+            _cv_info_cache.pop(cv_id, None)
+        if row:
+            _release_cv_blob(conn, row['file_sha256'])
         return True
 
 # ===== APPLICATIONS FUNCTIONS =====
@@ -231,7 +919,7 @@ def insert_application(cv_id: int, job_id: int, cover_letter: str = "", status:
 
 def get_applications_by_cv(cv_id: int, status: str = None) -> List[Dict]:
     """Lấy danh sách applications của CV."""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         if status:
             cursor.execute('''SELECT a.*, j.job_title, j.company_url, j.salary, j.work_location
@@ -249,7 +937,7 @@ def get_applications_by_cv(cv_id: int, status: str = None) -> List[Dict]:
 
 def check_application_exists(cv_id: int, job_id: int) -> bool:
     """Kiểm tra xem đã apply job này chưa."""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM applications WHERE cv_id = ? AND job_id = ?', (cv_id, job_id))
         return cursor.fetchone() is not None
@@ -274,7 +962,7 @@ def save_cv_insights(cv_id: int, insights: Dict) -> None:
 
 def get_cv_insights(cv_id: int) -> Optional[Dict]:
     """Lấy kết quả phân tích CV từ cache."""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM cv_insights WHERE cv_id = ?', (cv_id,))
         row = cursor.fetchone()
@@ -308,7 +996,7 @@ def save_document_preview(file_id: int, preview_data: Dict) -> None:
 
 def get_document_preview(file_id: int) -> Optional[Dict]:
     """Lấy preview tài liệu từ cache."""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM document_previews WHERE file_id = ?', (file_id,))
         row = cursor.fetchone()
@@ -322,7 +1010,7 @@ def get_filtered_jobs(filters: Dict) -> Optional[List[int]]:
     if not isinstance(filters, dict):
         raise ValueError("filters must be a dictionary")
     try:
-        with get_db_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM job_store")
             total_jobs = cursor.fetchone()[0]
@@ -347,7 +1035,7 @@ def get_filtered_jobs(filters: Dict) -> Optional[List[int]]:
                     query += " AND work_location LIKE ?"
                     params.append(f"%{filters['work_location']}%")
             if 'deadline_after' in filters and filters['deadline_after']:
-                query += " AND deadline > ?"
+                query += " AND deadline_date > ?"
                 params.append(filters['deadline_after'])
             if 'experience' in filters and filters['experience']:
                 if isinstance(filters['experience'], list):
@@ -364,12 +1052,12 @@ def get_filtered_jobs(filters: Dict) -> Optional[List[int]]:
                     query += " AND education = ?"
                     params.append(filters['education'])
             if 'skills' in filters and filters['skills']:
-                if isinstance(filters['skills'], list):
-                    query += " AND (" + " OR ".join(["LOWER(skills) LIKE LOWER(?)" for _ in filters['skills']]) + ")"
-                    params.extend([f"%{skill.lower()}%" for skill in filters['skills']])
-                else:
-                    query += " AND LOWER(skills) LIKE LOWER(?)"
-                    params.append(f"%{filters['skills'].lower()}%")
+                skills = filters['skills'] if isinstance(filters['skills'], list) else [filters['skills']]
+                norms = sorted({normalize_skill(skill) for skill in skills if isinstance(skill, str) and skill.strip()})
+                if norms:
+                    # Job có ít nhất 1 skill trong bộ lọc (index idx_job_skills_skill)
+                    query += f" AND id IN (SELECT job_id FROM job_skills WHERE skill_norm IN ({','.join(['?' for _ in norms])}))"
+                    params.extend(norms)
             try:
                 cursor.execute(query, params)
                 job_ids = [row['id'] for row in cursor.fetchall()]
@@ -386,7 +1074,449 @@ def get_filtered_jobs(filters: Dict) -> Optional[List[int]]:
         raise
 
 def get_total_jobs() -> int:
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM job_store")
-        return cursor.fetchone()[0]
\ No newline at end of file
+        return cursor.fetchone()[0]
+
+# ===== KEYSET PAGINATION =====
+
+# Field được phép trong `fields=` của /jobs: tên -> biểu thức SQL
+JOB_LIST_FIELDS = {column: column for column in (
+    "id", "name", "job_title", "job_url", "job_description", "candidate_requirements", "benefits",
+    "work_location", "work_time", "job_tags", "skills", "related_categories", "salary", "experience",
+    "deadline", "company_logo", "company_scale", "company_field", "company_address", "level", "education",
+    "number_of_hires", "work_type", "company_url", "timestamp", "deadline_date", "salary_min_vnd",
+    "salary_max_vnd", "salary_negotiable")}
+JOB_LIST_FIELDS["summary"] = "substr(job_description, 1, 200)"  # đoạn mô tả ngắn cho card
+
+# Field được phép trong `fields=` của /cvs: tên -> cột (field của cv_info lấy từ cv_info_json đã parse)
+CV_LIST_FIELDS = {
+    "id": "id", "filename": "filename", "upload_timestamp": "upload_timestamp", "file_size": "file_size",
+    "cv_info": "cv_info_json", "name": "cv_info_json", "email": "cv_info_json", "phone": "cv_info_json",
+    "skills": "cv_info_json", "career_objective": "cv_info_json",
+}
+
+_cv_info_cache: "OrderedDict[int, Tuple[Any, Dict]]" = OrderedDict()
+_cv_info_cache_lock = threading.Lock()
+
+def encode_cursor(kind: str, key: List[Any]) -> str:
+    """Cursor opaque (base64url) chứa khoá sort của dòng cuối trang."""
+    payload = json.dumps({"t": kind, "k": key}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(kind: str, cursor: str, size: int) -> List[Any]:
+    """
+    Giải mã cursor của encode_cursor (khoá gồm `size` giá trị scalar);
+    ValueError nếu sai định dạng, khác loại hoặc đã bị sửa.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict) or payload.get("t") != kind or not isinstance(payload.get("k"), list):
+        raise ValueError("Invalid cursor")
+    key = payload["k"]
+    # Giá trị được bind thẳng vào câu SQL: chỉ nhận đúng số phần tử kiểu scalar
+    if len(key) != size or not all(v is None or isinstance(v, (int, float, str)) and not isinstance(v, bool)
+                                   for v in key):
+        raise ValueError("Invalid cursor")
+    return key
+
+def parse_fields(fields: Optional[str], allowed: Dict[str, str]) -> Optional[List[str]]:
+    """'id, job_title' -> ['id', 'job_title'] (giữ thứ tự, bỏ trùng); ValueError nếu có field lạ."""
+    if not fields:
+        return None
+    selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected or None
+
+def _parse_cv_info_cached(cv_id: int, upload_timestamp: Any, cv_info_json: Optional[str]) -> Optional[Dict]:
+    """json.loads cv_info có cache LRU theo (cv_id, upload_timestamp) - CV không bị sửa sau khi tạo."""
+    with _cv_info_cache_lock:
+        cached = _cv_info_cache.get(cv_id)
+        if cached and cached[0] == upload_timestamp:
+            _cv_info_cache.move_to_end(cv_id)
+            return cached[1]
+    try:
+        cv_info = json.loads(cv_info_json) if cv_info_json else {}
+    except json.JSONDecodeError as e:
+        logging.warning(f"Failed to parse cv_info_json for cv_id {cv_id}: {e}")
+        return None
+    with _cv_info_cache_lock:
+        _cv_info_cache[cv_id] = (upload_timestamp, cv_info)
+        _cv_info_cache.move_to_end(cv_id)
+        while len(_cv_info_cache) > CV_INFO_CACHE_SIZE:
+            _cv_info_cache.popitem(last=False)
+    return cv_info
+
+def _cv_keyset_page(columns: str, limit: Optional[int], offset: int,
+                    cursor: Optional[str]) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """Một trang cv_store theo (upload_timestamp DESC, id DESC) + cursor trang sau."""
+    where, params = "", []
+    if cursor:
+        last_timestamp, last_id = decode_cursor("cvs", cursor, 2)
+        where, params, offset = "WHERE (upload_timestamp, id) < (?, ?)", [last_timestamp, last_id], 0
+    sql = f"SELECT {columns} FROM cv_store {where} ORDER BY upload_timestamp DESC, id DESC"
+    if limit is None:
+        with get_read_connection() as conn:
+            return conn.execute(sql, params).fetchall(), None
+    with get_read_connection() as conn:
+        rows = conn.execute(sql + " LIMIT ? OFFSET ?", params + [limit + 1, offset]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("cvs", [rows[-1]["upload_timestamp"], rows[-1]["id"]])
+    return rows, next_cursor
+
+# ===== READ HELPERS FOR API ENDPOINTS =====
+
+def get_cv_info(cv_id: int) -> Optional[Dict]:
+    """Lấy cv_info (đã parse) của CV, None nếu CV không tồn tại."""
+    with get_read_connection() as conn:
+        row = conn.execute('SELECT cv_info_json FROM cv_store WHERE id = ?', (cv_id,)).fetchone()
+    if not row:
+        return None
+    return json.loads(row['cv_info_json']) if row['cv_info_json'] else {}
+
+def get_cv_record(cv_id: int) -> Optional[Dict]:
+    """Lấy filename + cv_info (đã parse) của CV."""
+    with get_read_connection() as conn:
+        row = conn.execute('SELECT id, filename, cv_info_json, upload_timestamp, file_size FROM cv_store WHERE id = ?',
+                           (cv_id,)).fetchone()
+    if not row:
+        return None
+    return {
+        "id": row["id"],
+        "filename": row["filename"],
+        "cv_info": json.loads(row["cv_info_json"]) if row["cv_info_json"] else {},
+        "upload_timestamp": row["upload_timestamp"],
+        "file_size": row["file_size"]
+    }
+
+def get_cv_file(cv_id: int) -> Optional[Dict]:
+    """Lấy filename + đường dẫn file PDF gốc của CV trong blob store (file_path None nếu không có)."""
+    with get_read_connection() as conn:
+        row = conn.execute('SELECT filename, file_sha256, file_size FROM cv_store WHERE id = ?', (cv_id,)).fetchone()
+    if not row:
+        return None
+    sha256 = row['file_sha256']
+    return {
+        "filename": row['filename'],
+        "file_sha256": sha256,
+        "file_size": row['file_size'],
+        "file_path": blob_path(sha256) if blob_exists(sha256) else None
+    }
+
+def list_cv_records(limit: int, offset: int = 0, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Liệt kê CV (cv_info_json dạng chuỗi) theo trang, mới nhất trước.
+    Có cursor thì dùng keyset (bỏ qua offset). Trả về (cvs, next_cursor).
+    """
+    rows, next_cursor = _cv_keyset_page("id, filename, cv_info_json, upload_timestamp", limit, offset, cursor)
+    return [dict(row) for row in rows], next_cursor
+
+def list_cvs_page(limit: Optional[int] = None, cursor: Optional[str] = None,
+                  fields: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Liệt kê CV với cv_info đã parse (cache LRU), mới nhất trước, cho /cvs.
+
+    Args:
+        limit: Số CV mỗi trang (None = tất cả)
+        cursor: Cursor trả về từ trang trước
+        fields: Danh sách field, phân tách bằng dấu phẩy (xem CV_LIST_FIELDS), None = id, filename, cv_info, upload_timestamp
+
+    Returns:
+        (cvs, next_cursor)
+    """
+    selected = parse_fields(fields, CV_LIST_FIELDS) or ["id", "filename", "cv_info", "upload_timestamp"]
+    needs_cv_info = any(CV_LIST_FIELDS[f] == "cv_info_json" for f in selected)
+    columns = "id, filename, upload_timestamp, file_size" + (", cv_info_json" if needs_cv_info else "")
+    rows, next_cursor = _cv_keyset_page(columns, limit, 0, cursor)
+
+    cvs = []
+    for row in rows:
+        cv_info = _parse_cv_info_cached(row["id"], row["upload_timestamp"], row["cv_info_json"]) if needs_cv_info else None
+        if needs_cv_info and cv_info is None:
+            continue
+        cv = {}
+        for field in selected:
+            if field == "cv_info":
+                cv[field] = dict(cv_info)
+            elif CV_LIST_FIELDS[field] == "cv_info_json":
+                cv[field] = cv_info.get(field)
+            else:
+                cv[field] = row[field]
+        cvs.append(cv)
+    return cvs, next_cursor
+
+def cv_exists(cv_id: int) -> bool:
+    with get_read_connection() as conn:
+        return conn.execute('SELECT 1 FROM cv_store WHERE id = ?', (cv_id,)).fetchone() is not None
+
+def job_exists(job_id: int) -> bool:
+    with get_read_connection() as conn:
+        return conn.execute('SELECT 1 FROM job_store WHERE id = ?', (job_id,)).fetchone() is not None
+
+def get_job_title(job_id: int) -> Optional[str]:
+    with get_read_connection() as conn:
+        row = conn.execute('SELECT job_title FROM job_store WHERE id = ?', (job_id,)).fetchone()
+        return row['job_title'] if row else None
+
+def get_jobs_by_ids(job_ids: List[int], batch_size: int = 100) -> List[Dict]:
+    """Lấy đầy đủ các cột job_store cho danh sách job_id (truy vấn theo batch)."""
+    jobs: List[Dict] = []
+    with get_read_connection() as conn:
+        for i in range(0, len(job_ids), batch_size):
+            batch_ids = job_ids[i:i + batch_size]
+            placeholders = ",".join(["?"] * len(batch_ids))
+            cursor = conn.execute(f"SELECT * FROM job_store WHERE id IN ({placeholders})", batch_ids)
+            jobs.extend(dict(row) for row in cursor.fetchall())
+    return jobs
+
+def get_jobs_page(limit: int, offset: int = 0, cursor: Optional[str] = None,
+                  fields: Optional[str] = None) -> Tuple[List[Dict], int, Optional[str]]:
+    """
+    Trả về (jobs, total, next_cursor) cho /jobs, sắp theo id.
+
+    Có cursor thì dùng keyset `id > ?` (không phụ thuộc độ sâu trang, bỏ qua offset).
+    fields: danh sách cột phân tách bằng dấu phẩy (xem JOB_LIST_FIELDS), None = mọi cột.
+    """
+    selected = parse_fields(fields, JOB_LIST_FIELDS)
+    if selected:
+        if "id" not in selected:
+            selected = ["id"] + selected
+        columns = ", ".join(f"{JOB_LIST_FIELDS[f]} AS {f}" if JOB_LIST_FIELDS[f] != f else f for f in selected)
+    else:
+        columns = "*"
+
+    where, params = "", []
+    if cursor:
+        (after_id,) = decode_cursor("jobs", cursor, 1)
+        where, params, offset = "WHERE id > ?", [after_id], 0
+    with get_read_connection() as conn:
+        total = conn.execute("SELECT COUNT(*) AS total FROM job_store").fetchone()["total"]
+        rows = conn.execute(f"SELECT {columns} FROM job_store {where} ORDER BY id LIMIT ? OFFSET ?",
+                            params + [limit + 1, offset]).fetchall()
+    jobs = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor("jobs", [jobs[-1]["id"]]) if len(rows) > limit else None
+    return jobs, total, next_cursor
+
+# Thứ tự sort cho /jobs/search (NULL luôn xếp cuối); "relevance" = BM25 khi có từ khóa
+JOB_SEARCH_SORTS = {
+    "deadline": "j.deadline_date IS NULL, j.deadline_date ASC",
+    "salary_desc": "j.salary_max_vnd IS NULL, j.salary_max_vnd DESC",
+    "salary_asc": "j.salary_min_vnd IS NULL, j.salary_min_vnd ASC",
+    "newest": "j.id DESC",
+}
+
+def search_jobs(query: Optional[str], filters: Dict, limit: int, offset: int,
+                sort: str = "relevance") -> Tuple[List[Dict], int]:
+    """
+    Tìm kiếm jobs theo từ khóa + bộ lọc, trả về (jobs, total).
+
+    Có từ khóa: dùng FTS5 (job_store_fts), xếp hạng BM25, mỗi job kèm
+    `snippet` đã highlight bằng <mark>. Không có FTS5: fallback LIKE.
+    Lọc/sort lương và deadline chạy trên các cột typed (salary_*_vnd, deadline_date).
+    """
+    where = ""
+    params: List[Any] = []
+
+    # Filters
+    if filters.get('work_location'):
+        locations = filters['work_location']
+        placeholders = ','.join(['?' for _ in locations])
+        where += f" AND j.work_location IN ({placeholders})"
+        params.extend(locations)
+
+    if filters.get('work_type'):
+        work_types = filters['work_type']
+        placeholders = ','.join(['?' for _ in work_types])
+        where += f" AND j.work_type IN ({placeholders})"
+        params.extend(work_types)
+
+    if filters.get('experience'):
+        where += " AND j.experience = ?"
+        params.append(filters['experience'])
+
+    if filters.get('salary_min'):
+        # Job trả được ít nhất salary_min (VND)
+        where += " AND j.salary_max_vnd >= ?"
+        params.append(int(filters['salary_min']))
+
+    if filters.get('salary_max'):
+        where += " AND j.salary_min_vnd <= ?"
+        params.append(int(filters['salary_max']))
+
+    if filters.get('deadline_after'):
+        where += " AND j.deadline_date > ?"
+        params.append(filters['deadline_after'])
+
+    order_by = JOB_SEARCH_SORTS.get(sort)
+
+    with get_read_connection() as conn:
+        fts_query = build_fts_query(query) if query else None
+        if fts_query and _is_job_fts_available(conn):
+            weights = ", ".join(str(w) for w in JOB_FTS_WEIGHTS)
+            base = ("FROM job_store_fts JOIN job_store j ON j.id = job_store_fts.rowid "
+                    "WHERE job_store_fts MATCH ?" + where)
+            cursor = conn.execute(
+                f"""SELECT j.*, bm25(job_store_fts, {weights}) AS rank,
+                           snippet(job_store_fts, -1, '<mark>', '</mark>', '…', 24) AS snippet
+                    {base} ORDER BY {order_by or 'rank'} LIMIT ? OFFSET ?""",
+                [fts_query] + params + [limit, offset])
+            jobs = [dict(row) for row in cursor.fetchall()]
+            if where:
+                total = conn.execute(f"SELECT COUNT(*) AS total {base}", [fts_query] + params).fetchone()['total']
+            else:
+                total = conn.execute("SELECT COUNT(*) AS total FROM job_store_fts WHERE job_store_fts MATCH ?",
+                                     (fts_query,)).fetchone()['total']
+            return jobs, total
+
+        # Text search (fallback LIKE)
+        if query:
+            where = " AND (j.job_title LIKE ? OR j.job_description LIKE ? OR j.skills LIKE ?)" + where
+            search_term = f"%{query}%"
+            params = [search_term, search_term, search_term] + params
+        sql = "SELECT j.* FROM job_store j WHERE 1=1" + where
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        cursor = conn.execute(sql + " LIMIT ? OFFSET ?", params + [limit, offset])
+        jobs = [dict(row) for row in cursor.fetchall()]
+        total = conn.execute(f"SELECT COUNT(*) AS total FROM job_store j WHERE 1=1{where}", params).fetchone()['total']
+    return jobs, total
+
+# ===== JOB ANALYTICS =====
+
+# (dimension, biểu thức cột job_store) được đếm trong analytics_counts; "total" đếm mọi job
+ANALYTICS_DIMENSIONS = [
+    ("total", "''"),
+    ("title", "job_title"),
+    ("company", "name"),
+    ("salary", "salary"),
+    ("location", "work_location"),
+    ("work_type", "work_type"),
+    ("experience", "experience"),
+    ("deadline", "deadline_date"),
+]
+
+def _analytics_trigger_body(row: str, delta: int) -> str:
+    """Các câu lệnh cộng/trừ analytics_counts cho một dòng job_store (row = 'new' hoặc 'old')."""
+    statements = []
+    for dimension, column in ANALYTICS_DIMENSIONS:
+        value = column if column == "''" else f"{row}.{column}"
+        if delta > 0:
+            statements.append(
+                f"INSERT INTO analytics_counts (dimension, value, count) SELECT '{dimension}', {value}, 1 "
+                f"WHERE {value} IS NOT NULL AND {value} != '' OR '{dimension}' = 'total' "
+                f"ON CONFLICT(dimension, value) DO UPDATE SET count = count + 1;")
+        else:
+            statements.append(
+                f"UPDATE analytics_counts SET count = count - 1 WHERE dimension = '{dimension}' AND value = {value};")
+    return "\n".join(statements)
+
+def _create_job_analytics(conn: sqlite3.Connection) -> None:
+    """Bảng analytics_counts + trigger cập nhật tăng dần; rebuild nếu lệch với job_store."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS analytics_counts
+                    (dimension TEXT NOT NULL,
+                     value TEXT NOT NULL,
+                     count INTEGER NOT NULL,
+                     PRIMARY KEY (dimension, value)) WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_analytics_counts_top ON analytics_counts(dimension, count DESC)''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_analytics_ai AFTER INSERT ON job_store BEGIN
+                        {_analytics_trigger_body("new", 1)}
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_analytics_ad AFTER DELETE ON job_store BEGIN
+                        {_analytics_trigger_body("old", -1)}
+                    END''')
+    columns = ", ".join(column for _, column in ANALYTICS_DIMENSIONS if column != "''")
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS job_store_analytics_au AFTER UPDATE OF {columns} ON job_store BEGIN
+                        {_analytics_trigger_body("old", -1)}
+                        {_analytics_trigger_body("new", 1)}
+                    END''')
+
+    total = conn.execute("SELECT count FROM analytics_counts WHERE dimension = 'total' AND value = ''").fetchone()
+    job_count = conn.execute("SELECT COUNT(*) FROM job_store").fetchone()[0]
+    if (total['count'] if total else 0) != job_count:
+        rebuild_job_analytics(conn)
+
+def rebuild_job_analytics(conn: sqlite3.Connection) -> None:
+    """Tính lại toàn bộ analytics_counts từ job_store (migration / sửa lệch). Không commit."""
+    logging.info("⚙️ Rebuilding analytics_counts from job_store...")
+    conn.execute("DELETE FROM analytics_counts")
+    for dimension, column in ANALYTICS_DIMENSIONS:
+        condition = "1" if dimension == "total" else f"{column} IS NOT NULL AND {column} != ''"
+        conn.execute(f'''INSERT INTO analytics_counts (dimension, value, count)
+                         SELECT ?, {column}, COUNT(*) FROM job_store WHERE {condition} GROUP BY {column}''',
+                     (dimension,))
+    logging.info("✅ analytics_counts rebuilt")
+
+def _top_counts(conn: sqlite3.Connection, dimension: str, limit: Optional[int] = None,
+                exclude: Tuple[str, ...] = ()) -> List[sqlite3.Row]:
+    sql = "SELECT value, count FROM analytics_counts WHERE dimension = ? AND count > 0"
+    params: List[Any] = [dimension]
+    if exclude:
+        sql += f" AND value NOT IN ({','.join(['?'] * len(exclude))})"
+        params.extend(exclude)
+    sql += " ORDER BY count DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+def compute_jobs_analytics() -> Dict:
+    """
+    Thống kê cho dashboard /jobs/analytics, đọc từ analytics_counts / skill_dictionary
+    (đã được trigger cập nhật). snapshot_id = corpus_version của job_store lúc đọc.
+    """
+    from datetime import timedelta
+    today = datetime.now().date()
+    deadline_7_days = (today + timedelta(days=7)).isoformat()
+    deadline_30_days = (today + timedelta(days=30)).isoformat()
+
+    # Đọc trong một transaction để mọi con số cùng một snapshot
+    with get_read_connection() as conn, read_snapshot(conn):
+        snapshot = conn.execute("SELECT value FROM app_meta WHERE key = 'corpus_version'").fetchone()
+        total = conn.execute("SELECT count FROM analytics_counts WHERE dimension = 'total' AND value = ''").fetchone()
+
+        top_job_titles = [{"title": r["value"], "count": r["count"]} for r in _top_counts(conn, "title", 10)]
+        top_companies = [{"company": r["value"], "count": r["count"]} for r in _top_counts(conn, "company", 10)]
+        salary_distribution = [{"salary": r["value"], "count": r["count"]}
+                               for r in _top_counts(conn, "salary", 15, exclude=("Thỏa thuận",))]
+        location_distribution = [{"location": r["value"], "count": r["count"]} for r in _top_counts(conn, "location", 10)]
+        job_type_distribution = [{"type": r["value"], "count": r["count"]} for r in _top_counts(conn, "work_type")]
+        experience_distribution = [{"experience": r["value"], "count": r["count"]} for r in _top_counts(conn, "experience")]
+
+        # Top Skills (từ skill_dictionary, job_count được trigger cập nhật)
+        top_skills = [{"skill": r["display_name"], "count": r["job_count"]} for r in conn.execute(
+            "SELECT display_name, job_count FROM skill_dictionary WHERE job_count > 0 ORDER BY job_count DESC LIMIT 20")]
+
+        # Deadline Stats: đếm theo ngày (dimension 'deadline'), cộng các ngày trong khoảng
+        deadline_row = conn.execute("""
+            SELECT
+                SUM(CASE WHEN value BETWEEN ? AND ? THEN count ELSE 0 END) AS expiring_7_days,
+                SUM(CASE WHEN value BETWEEN ? AND ? THEN count ELSE 0 END) AS expiring_30_days,
+                SUM(count) AS total
+            FROM analytics_counts
+            WHERE dimension = 'deadline'
+        """, (today.isoformat(), deadline_7_days, today.isoformat(), deadline_30_days)).fetchone()
+
+    return {
+        "snapshot_id": snapshot["value"] if snapshot else 0,
+        "total_jobs": total["count"] if total else 0,
+        "top_job_titles": top_job_titles,
+        "top_companies": top_companies,
+        "salary_distribution": salary_distribution,
+        "location_distribution": location_distribution,
+        "job_type_distribution": job_type_distribution,
+        "experience_distribution": experience_distribution,
+        "top_skills": top_skills,
+        "deadline_stats": {
+            "expiring_7_days": deadline_row["expiring_7_days"] or 0,
+            "expiring_30_days": deadline_row["expiring_30_days"] or 0,
+            "total_with_deadline": deadline_row["total"] or 0
+        }
+    }
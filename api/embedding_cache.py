@@ -0,0 +1,165 @@
+"""
+Embedding Cache - Cache embedding bền vững trên đĩa, đặt giữa LangChain và provider
+
+Mỗi vector được lưu theo khoá (model, task_type, sha256(text)) trong một file
+SQLite riêng (db/embedding_cache.db), nên rebuild Chroma (vd. sau
+scripts/reset_database.py) hoặc upload lại CV có nội dung cũ không gọi lại
+Gemini API. Số entry bị giới hạn bởi EMBEDDING_CACHE_MAX_ENTRIES: vượt ngưỡng
+thì xoá các vector lâu không dùng nhất (theo last_used, ghi theo lô - xem sqlite_cache).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from sqlite_cache import SQLiteCacheStore
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(base_dir)
+_default_db_path = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(_default_db_path), "embedding_cache.db")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+_LOOKUP_BATCH_SIZE = 500  # giới hạn số tham số của câu IN (...)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore(SQLiteCacheStore):
+    """Bảng embeddings trong SQLite: vector lưu dạng float32 BLOB."""
+
+    table = "embeddings"
+    key_columns = ("model", "task_type", "text_sha256")
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        super().__init__(db_path, max_entries)
+
+    def _create_schema(self, conn) -> None:
+        conn.execute('''CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            task_type TEXT NOT NULL,
+            text_sha256 TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            last_used INTEGER NOT NULL,
+            PRIMARY KEY (model, task_type, text_sha256)
+        ) WITHOUT ROWID''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)')
+
+    def get_many(self, model: str, task_type: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Tra cache theo danh sách hash; trả về {hash: vector} cho các hash có trong cache."""
+        self._ensure_schema()
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._manager.connection(readonly=True) as conn:
+            for i in range(0, len(unique), _LOOKUP_BATCH_SIZE):
+                batch = unique[i:i + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f'''SELECT text_sha256, vector FROM embeddings
+                        WHERE model = ? AND task_type = ? AND text_sha256 IN ({placeholders})''',
+                    [model, task_type, *batch],
+                ).fetchall()
+                for row in rows:
+                    found[row["text_sha256"]] = np.frombuffer(row["vector"], dtype=np.float32).tolist()
+        if found:
+            # last_used được gom và ghi theo lô (xem sqlite_cache), không ghi ở mỗi lần hit
+            self._record_touches([(model, task_type, h) for h in found])
+        return found
+
+    def put_many(self, model: str, task_type: str, items: List[Tuple[str, List[float]]]) -> None:
+        """Ghi các cặp (hash, vector) vào cache rồi evict nếu vượt ngưỡng."""
+        if not items:
+            return
+        self._ensure_schema()
+        now = int(time.time())
+        rows = []
+        for h, vector in items:
+            arr = np.asarray(vector, dtype=np.float32)
+            rows.append((model, task_type, h, int(arr.shape[0]), arr.tobytes(), now))
+        with self._manager.connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                '''INSERT OR IGNORE INTO embeddings (model, task_type, text_sha256, dim, vector, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                rows,
+            )
+            self._after_insert(conn, conn.total_changes - before)
+            conn.commit()
+
+
+_store: Optional[EmbeddingCacheStore] = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_cache_store() -> EmbeddingCacheStore:
+    """Store dùng chung cho cả process (singleton, tạo khi dùng lần đầu)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingCacheStore()
+    return _store
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc một Embeddings của LangChain: chỉ gọi provider cho các text chưa có trong cache.
+
+    GoogleGenerativeAIEmbeddings dùng task_type của instance cho cả embed_query
+    (khi được khởi tạo với task_type), nên mặc định query_task_type = document_task_type.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, document_task_type: str,
+                 query_task_type: Optional[str] = None, store: Optional[EmbeddingCacheStore] = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.document_task_type = document_task_type
+        self.query_task_type = query_task_type or document_task_type
+        self.store = store or get_embedding_cache_store()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_cached(self, texts: List[str], task_type: str, embed_fn) -> List[List[float]]:
+        if not texts:
+            return []
+        hashes = [text_hash(t) for t in texts]
+        try:
+            cached = self.store.get_many(self.model_name, task_type, hashes)
+        except Exception as e:
+            logging.warning(f"⚠️ Embedding cache lookup failed, calling provider directly: {e}")
+            cached = {}
+
+        # Text trùng nhau trong cùng batch chỉ gửi lên provider một lần
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            cached.update(fresh)
+            try:
+                self.store.put_many(self.model_name, task_type, fresh)
+            except Exception as e:
+                logging.warning(f"⚠️ Failed to write embeddings to cache: {e}")
+        return [cached[h] for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached(texts, self.document_task_type, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_cached(
+            [text], self.query_task_type, lambda batch: [self.underlying.embed_query(batch[0])]
+        )[0]
@@ -0,0 +1,152 @@
+"""
+Embedding Providers - Chọn backend embedding qua cấu hình EMBEDDING_PROVIDER
+
+- google  : Gemini text-embedding-004 qua key pool + cache trên đĩa (mặc định).
+- local   : sentence-transformers chạy CPU, load từ LOCAL_EMBEDDING_MODEL (tên model
+            hoặc đường dẫn thư mục). Cần cài thêm requirements-local.txt (sentence-transformers).
+- hashing : hashing vectorizer thuần numpy, tất định, không cần mạng (cho test/offline).
+
+Backend local/hashing chia texts thành batch và chạy trên thread pool riêng, nên
+aembed_* không chặn event loop. Mỗi provider có vector khác số chiều / không gian,
+nên dùng collection Chroma riêng (collection_suffix).
+"""
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google").strip().lower()
+EMBEDDING_PROVIDERS = ("google", "local", "hashing")
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_TASK_TYPE = "retrieval_document"  # Tối ưu cho retrieval
+
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+LOCAL_EMBEDDING_DEVICE = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "384"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_LOCAL_MISSING_MESSAGE = ("EMBEDDING_PROVIDER=local requires sentence-transformers: "
+                          "pip install -r requirements-local.txt (or set EMBEDDING_PROVIDER=google / hashing)")
+
+
+class ThreadPoolEmbeddings(Embeddings, ABC):
+    """
+    Embeddings chạy local: chia batch, các hàm async chạy trên thread pool riêng.
+    Lớp con chỉ cần cài _embed_batch.
+    """
+
+    def __init__(self, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE, workers: int = LOCAL_EMBEDDING_WORKERS):
+        self.batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed-local")
+
+    @abstractmethod
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Ma trận (len(texts), dim) float32 đã chuẩn hoá L2."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack([self._embed_batch(batch) for batch in batches]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_query, text)
+
+
+class HashingEmbeddings(ThreadPoolEmbeddings):
+    """
+    Hashing vectorizer: token (unigram + bigram) -> chỉ số bằng blake2b, dấu ±1, trọng số
+    log(1 + tf), chuẩn hoá L2. Tất định giữa các process (không dùng hash() của Python).
+    """
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM, **kwargs):
+        super().__init__(**kwargs)
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest & 1 else -1.0
+                matrix[row, (digest >> 1) % self.dim] += sign * np.log1p(count)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class SentenceTransformerEmbeddings(ThreadPoolEmbeddings):
+    """Model sentence-transformers chạy CPU (load một lần, encode theo batch, đã chuẩn hoá)."""
+
+    def __init__(self, model_name_or_path: str = LOCAL_EMBEDDING_MODEL, device: str = LOCAL_EMBEDDING_DEVICE, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(_LOCAL_MISSING_MESSAGE) from e
+        self.model_name = model_name_or_path
+        self._model = SentenceTransformer(model_name_or_path, device=device)
+        self._lock = threading.Lock()  # encode() của một model không an toàn khi gọi song song
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            return self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                      convert_to_numpy=True, show_progress_bar=False)
+
+
+def collection_suffix(provider: Optional[str] = None) -> str:
+    """Hậu tố tên collection Chroma theo provider ('' cho google để giữ collection hiện có)."""
+    provider = (provider or EMBEDDING_PROVIDER).lower()
+    return "" if provider == "google" else f"_{provider}"
+
+
+def create_embeddings(provider: Optional[str] = None) -> Embeddings:
+    """Tạo Embeddings theo provider (mặc định EMBEDDING_PROVIDER)."""
+    provider = (provider or EMBEDDING_PROVIDER).lower()
+    if provider == "google":
+        from api_key_manager import get_api_key_manager
+        from embedding_cache import CachedEmbeddings
+        from ingest_embedder import KeyPoolEmbeddings
+
+        # Lấy tất cả API key (GOOGLE_API_KEY_1..9, fallback GOOGLE_API_KEY), qua cache trên đĩa
+        api_keys = get_api_key_manager().get_all_keys()
+        embeddings = CachedEmbeddings(
+            KeyPoolEmbeddings(api_keys, model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE),
+            model_name=EMBEDDING_MODEL,
+            document_task_type=EMBEDDING_TASK_TYPE,
+        )
+    elif provider == "local":
+        # Báo lỗi rõ ràng ngay lúc khởi động thay vì lỗi import giữa chừng
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise RuntimeError(_LOCAL_MISSING_MESSAGE)
+        embeddings = SentenceTransformerEmbeddings()
+    elif provider == "hashing":
+        embeddings = HashingEmbeddings()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}' (expected one of {EMBEDDING_PROVIDERS})")
+    logging.info(f"✅ Embedding provider: {provider}")
+    return embeddings
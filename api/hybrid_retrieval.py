@@ -0,0 +1,123 @@
+"""
+Hybrid Retrieval - BM25 (FTS5) + vector, gộp bằng reciprocal rank fusion
+
+Vector similarity hay bỏ sót từ khoá chính xác (tên kỹ năng, chức danh như "Django",
+"Kế toán"). Stage này chạy song song:
+
+- lexical: BM25 trên job_store_fts, khớp bất kỳ kỹ năng / cụm từ mục tiêu nào của CV;
+- vector: vector_index nếu đã bật, không thì Chroma (cùng pre-filter job_id);
+
+rồi gộp hai danh sách bằng RRF: score(job) = Σ 1 / (RRF_K + rank). Job khớp địa điểm /
+loại hình ưu tiên được nhân thêm hệ số boost. Top-k sau khi gộp chính xác hơn từng
+danh sách riêng, nên gửi ít job hơn vào LLM mà không mất kết quả tốt.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from async_db_utils import bm25_job_ids, get_jobs_by_ids
+from chroma_utils import get_job_index, get_vectorstore
+from db_utils import build_fts_any_query
+from job_parsing import fold_text
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATE_K = int(os.getenv("HYBRID_CANDIDATE_K", "50"))  # số ứng viên lấy từ mỗi nhánh
+MATCH_LOCATION_BOOST = float(os.getenv("MATCH_LOCATION_BOOST", "0.2"))
+MATCH_WORK_TYPE_BOOST = float(os.getenv("MATCH_WORK_TYPE_BOOST", "0.1"))
+
+
+def _fold(text: str) -> str:
+    """Bỏ dấu tiếng Việt + lower để so khớp địa điểm/loại hình ("Hà Nội" == "ha noi")."""
+    return fold_text(text).strip()
+
+
+def preferences_from_filters(filters: Dict) -> Dict[str, List[str]]:
+    """Bộ lọc /match -> ưu tiên mềm (vẫn có tác dụng khi bộ lọc cứng không khớp job nào)."""
+    preferences = {}
+    for key, filter_key in (("work_location", "work_location"), ("work_type", "job_type")):
+        value = (filters or {}).get(filter_key)
+        values = value if isinstance(value, list) else [value] if value else []
+        preferences[key] = [v for v in values if isinstance(v, str) and v.strip()]
+    return preferences
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> Dict[int, float]:
+    """RRF: mỗi danh sách xếp hạng góp 1 / (k + rank) (rank bắt đầu từ 1) cho mỗi job."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, job_id in enumerate(ranking, start=1):
+            scores[job_id] = scores.get(job_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def _boost(job: Dict, preferences: Dict[str, List[str]]) -> float:
+    factor = 1.0
+    location = _fold(job.get("work_location") or "")
+    if location and any(_fold(p) in location for p in preferences.get("work_location", [])):
+        factor += MATCH_LOCATION_BOOST
+    work_type = _fold(job.get("work_type") or "")
+    if work_type and any(_fold(p) == work_type for p in preferences.get("work_type", [])):
+        factor += MATCH_WORK_TYPE_BOOST
+    return factor
+
+
+def lexical_phrases(skills: Sequence[str], aspirations: str) -> List[str]:
+    """Cụm từ cho nhánh BM25: từng kỹ năng (phrase) trước, sau đó mục tiêu nghề nghiệp."""
+    phrases = [s for s in skills if isinstance(s, str)]
+    if aspirations:
+        phrases.append(aspirations)
+    return phrases
+
+
+async def _lexical_candidates(skills: Sequence[str], aspirations: str, k: int,
+                              job_ids: Optional[List[int]]) -> List[int]:
+    fts_query = build_fts_any_query(lexical_phrases(skills, aspirations))
+    if not fts_query:
+        return []
+    return await bm25_job_ids(fts_query, k, job_ids)
+
+
+async def _vector_candidates(query: str, k: int, job_ids: Optional[List[int]]) -> List[int]:
+    vectorstore = get_vectorstore()
+    job_index = get_job_index()
+    if job_index is not None and job_index.ready():
+        query_vector = await vectorstore.embeddings.aembed_query(query)
+        return [job_id for job_id, _ in job_index.search(query_vector, k, allowed_ids=job_ids)]
+    job_filter = {"job_id": {"$in": job_ids}} if job_ids is not None else None
+    docs = await vectorstore.asimilarity_search(query, k=k, filter=job_filter)
+    return [int(doc.metadata["job_id"]) for doc in docs if (doc.metadata or {}).get("job_id") is not None]
+
+
+async def hybrid_job_search(query: str, skills: Sequence[str], aspirations: str, top_k: int,
+                            job_ids: Optional[List[int]] = None,
+                            preferences: Optional[Dict[str, List[str]]] = None,
+                            candidate_k: int = HYBRID_CANDIDATE_K) -> List[Tuple[Dict, float]]:
+    """
+    Top `top_k` job (dòng job_store, điểm RRF đã boost) cho một CV.
+    job_ids: pre-filter (None = mọi job). Một nhánh lỗi thì dùng kết quả nhánh còn lại.
+    """
+    job_ids = [int(j) for j in job_ids] if job_ids is not None else None
+    candidate_k = max(candidate_k, top_k)
+    lexical, vector = await asyncio.gather(
+        _lexical_candidates(skills, aspirations, candidate_k, job_ids),
+        _vector_candidates(query, candidate_k, job_ids),
+        return_exceptions=True,
+    )
+    if isinstance(lexical, BaseException) and isinstance(vector, BaseException):
+        raise vector
+    for name, result in (("BM25", lexical), ("vector", vector)):
+        if isinstance(result, BaseException):
+            logging.warning(f"⚠️ Nhánh {name} lỗi, chỉ dùng nhánh còn lại: {result}")
+    rankings = [r for r in (lexical, vector) if not isinstance(r, BaseException)]
+
+    scores = reciprocal_rank_fusion(rankings)
+    jobs = {job["id"]: job for job in await get_jobs_by_ids(list(scores))}
+    preferences = preferences or {}
+    ranked = sorted(((job, scores[job_id] * _boost(job, preferences)) for job_id, job in jobs.items()),
+                    key=lambda item: item[1], reverse=True)
+    lexical_count = 0 if isinstance(lexical, BaseException) else len(lexical)
+    vector_count = 0 if isinstance(vector, BaseException) else len(vector)
+    logging.info(f"🔀 Hybrid retrieval: {lexical_count} BM25 + {vector_count} vector -> "
+                 f"{len(scores)} jobs, top {top_k}")
+    return ranked[:top_k]
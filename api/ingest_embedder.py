@@ -0,0 +1,177 @@
+"""
+Ingest Embedder - Embed song song trên tất cả API key, có giới hạn tốc độ theo key
+
+KeyPoolEmbeddings chia texts thành các request (tối đa EMBED_REQUEST_SIZE text /
+request, đúng giới hạn batchEmbedContents của Gemini) và chạy chúng đồng thời trên
+mọi key của APIKeyManager. Mỗi key có token bucket riêng (EMBED_REQUESTS_PER_MINUTE);
+gặp 429 thì key đó bị tạm dừng với backoff luỹ thừa và request được thử lại trên key
+rảnh nhất. Thời gian index cold-start vì thế tỉ lệ nghịch với số key.
+
+iter_embedded_batches() giữ nhiều batch đang embed cùng lúc nhưng trả kết quả đúng
+thứ tự nạp vào, để phía ghi Chroma vẫn tuần tự và có thứ tự.
+"""
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "1500"))  # mỗi key
+EMBED_WORKERS_PER_KEY = int(os.getenv("EMBED_WORKERS_PER_KEY", "2"))  # số request đồng thời / key
+EMBED_REQUEST_SIZE = int(os.getenv("EMBED_REQUEST_SIZE", "100"))  # số text / request
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_BASE_SECONDS = float(os.getenv("EMBED_BACKOFF_BASE_SECONDS", "2"))
+EMBED_BACKOFF_MAX_SECONDS = 60.0
+
+_RATE_LIMIT_MARKERS = ("429", "resource has been exhausted", "resource_exhausted", "quota", "rate limit")
+
+T = TypeVar("T")
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """Nhận diện lỗi quota/429 (SDK Google bọc lỗi gốc trong GoogleGenerativeAIError)."""
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate_per_minute` request/phút, cho phép burst `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Số giây phải chờ trước khi lấy được 1 token (0 nếu có sẵn)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) / self.rate)
+            return wait
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(min(wait, 1.0))
+
+    def pause(self, seconds: float) -> None:
+        """Tạm dừng key (sau khi bị 429) và xả hết token đang tích."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class KeyPoolEmbeddings(Embeddings):
+    """Embeddings của LangChain chạy trên nhiều API key, mỗi key một client + token bucket."""
+
+    def __init__(self, api_keys: Sequence[str], model: str, task_type: str,
+                 requests_per_minute: float = EMBED_REQUESTS_PER_MINUTE,
+                 workers_per_key: int = EMBED_WORKERS_PER_KEY,
+                 max_retries: int = EMBED_MAX_RETRIES):
+        if not api_keys:
+            raise ValueError("KeyPoolEmbeddings needs at least one API key")
+        self.model = model
+        self.task_type = task_type
+        self.max_retries = max_retries
+        self._clients = [
+            GoogleGenerativeAIEmbeddings(model=model, google_api_key=key, task_type=task_type)
+            for key in api_keys
+        ]
+        self._buckets = [TokenBucket(requests_per_minute, workers_per_key) for _ in api_keys]
+        self._round_robin = itertools.count()
+        self.max_workers = len(api_keys) * max(1, workers_per_key)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed")
+        logging.info(f"✅ Embedding key pool: {len(api_keys)} keys x {workers_per_key} workers")
+
+    @property
+    def key_count(self) -> int:
+        return len(self._clients)
+
+    def _pick_key(self) -> int:
+        """Key chờ ít nhất; hoà nhau thì xoay vòng để chia đều tải."""
+        start = next(self._round_robin) % len(self._clients)
+        order = [(start + i) % len(self._clients) for i in range(len(self._clients))]
+        return min(order, key=lambda i: self._buckets[i].wait_time())
+
+    def _call_with_retry(self, call) -> List:
+        for attempt in range(self.max_retries + 1):
+            idx = self._pick_key()
+            self._buckets[idx].acquire()
+            try:
+                return call(self._clients[idx])
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = min(EMBED_BACKOFF_MAX_SECONDS, EMBED_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                self._buckets[idx].pause(delay)
+                logging.warning(f"⚠️ Embedding key {idx + 1} rate limited, backing off {delay:.1f}s "
+                                f"(attempt {attempt + 1}/{self.max_retries})")
+        raise RuntimeError("unreachable")
+
+    def _embed_request(self, texts: List[str]) -> List[List[float]]:
+        return self._call_with_retry(lambda client: client.embed_documents(texts, batch_size=len(texts)))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        chunks = [texts[i:i + EMBED_REQUEST_SIZE] for i in range(0, len(texts), EMBED_REQUEST_SIZE)]
+        if len(chunks) == 1:
+            return self._embed_request(chunks[0])
+        vectors: List[List[float]] = []
+        for chunk_vectors in self._executor.map(self._embed_request, chunks):  # map giữ đúng thứ tự
+            vectors.extend(chunk_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call_with_retry(lambda client: client.embed_query(text))
+
+
+def iter_embedded_batches(embeddings: Embeddings, batches: Iterable[Tuple[T, List[str]]],
+                          max_in_flight: int = 4) -> Iterator[Tuple[T, List[List[float]]]]:
+    """
+    Embed các batch (payload, texts) đồng thời, trả về (payload, vectors) theo đúng thứ tự vào.
+
+    Tối đa `max_in_flight` batch được embed cùng lúc, nên bộ nhớ không phình khi
+    nguồn batch (vd. đọc file JSONL) nhanh hơn phía embed.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="embed-batch")
+    pending: deque = deque()
+    try:
+        for payload, texts in batches:
+            pending.append((payload, executor.submit(embeddings.embed_documents, texts)))
+            if len(pending) >= max_in_flight:
+                done_payload, future = pending.popleft()
+                yield done_payload, future.result()
+        while pending:
+            done_payload, future = pending.popleft()
+            yield done_payload, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
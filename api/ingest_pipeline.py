@@ -0,0 +1,360 @@
+"""
+Ingest Pipeline - Ingest job từ JSONL/CSV theo luồng nhiều stage, có backpressure
+
+    read (thread) -> parse/normalize (process pool) -> diff (thread) -> embed (key pool) -> write
+
+- read: đọc file theo chunk từ byte offset của checkpoint.
+- parse: job_parsing.parse_job_chunk trên process pool (JSON, lương, deadline, skills, content_hash).
+- diff: so content_hash với job_store, chỉ giữ job mới/đổi nội dung hoặc chưa có
+  trong collection Chroma (vd. collection mới sau khi đổi EMBEDDING_PROVIDER).
+- embed: iter_embedded_batches (nhiều batch song song, trả về đúng thứ tự).
+- write: INSERT nhiều dòng ... RETURNING id vào SQLite, upsert Chroma (id job_{id}),
+  lưu checkpoint rồi commit, theo từng batch.
+
+Các stage nối với nhau bằng queue có giới hạn (INGEST_QUEUE_SIZE chunk), nên stage
+nhanh sẽ chờ stage chậm thay vì dồn cả file vào RAM. Mỗi stage đo số bản ghi và thời
+gian bận để báo throughput.
+"""
+import csv
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from db_utils import (
+    create_tables, get_db_connection, get_read_connection, get_existing_jobs, bulk_upsert_jobs,
+    get_ingest_checkpoint, save_ingest_checkpoint, INGEST_STATUSES, JOB_URL_INDEX,
+)
+from ingest_embedder import iter_embedded_batches, EMBED_REQUEST_SIZE
+from job_parsing import parse_job_chunk
+
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))  # số chunk chờ giữa hai stage
+# Dưới ngưỡng này parse ngay trên thread (khởi động process pool tốn hơn lợi ích)
+INGEST_PARALLEL_MIN_BYTES = int(os.getenv("INGEST_PARALLEL_MIN_BYTES", str(16 * 1024 * 1024)))
+
+SOURCE_FORMATS = {".jsonl": "jsonl", ".csv": "csv"}
+
+csv.field_size_limit(16 * 1024 * 1024)  # mô tả job crawl có thể rất dài
+
+
+def source_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SOURCE_FORMATS:
+        raise ValueError(f"Unsupported job source (expected .jsonl or .csv): {path}")
+    return SOURCE_FORMATS[ext]
+
+
+# ===== STAGE STATS =====
+
+class StageStats:
+    """Số bản ghi + thời gian bận của một stage (thread-safe)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def as_dict(self) -> Dict:
+        rate = self.items / self.busy_seconds if self.busy_seconds > 0 else None
+        return {"items": self.items, "busy_s": round(self.busy_seconds, 3),
+                "items_per_s": round(rate, 1) if rate else None}
+
+
+class _TimedEmbeddings(Embeddings):
+    """Bọc Embeddings để đo thời gian của stage embed."""
+
+    def __init__(self, embeddings: Embeddings, stats: StageStats):
+        self.embeddings = embeddings
+        self.stats = stats
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts) if texts else []
+        self.stats.add(len(texts), time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+# ===== BOUNDED QUEUES GIỮA CÁC STAGE =====
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _in_background(iterable: Iterable, name: str, maxsize: int = INGEST_QUEUE_SIZE) -> Iterator:
+    """
+    Chạy `iterable` trên thread riêng, đẩy kết quả qua queue có giới hạn `maxsize`.
+    Queue đầy thì producer chờ (backpressure); lỗi của producer được raise ở phía consumer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=produce, name=f"ingest-{name}", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+
+# ===== STAGES =====
+
+def _iter_file_lines(f, offset: int) -> Iterator[Tuple[bytes, int]]:
+    for raw_line in f:
+        offset += len(raw_line)
+        yield raw_line, offset
+
+
+def read_chunks(path: str, fmt: str, start_offset: int, chunk_size: int,
+                stats: StageStats) -> Iterator[Tuple[list, int]]:
+    """Stage read: (bản ghi thô, byte offset sau bản ghi cuối) theo chunk `chunk_size` bản ghi."""
+    with open(path, 'rb') as f:
+        if fmt == "jsonl":
+            f.seek(start_offset)
+            records_iter = _iter_file_lines(f, start_offset)
+        else:
+            records_iter = _iter_csv_records(f, start_offset)
+        chunk, chunk_start = [], time.perf_counter()
+        end_offset = start_offset
+        for record, end_offset in records_iter:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                stats.add(len(chunk), time.perf_counter() - chunk_start)
+                yield chunk, end_offset
+                chunk, chunk_start = [], time.perf_counter()
+        if chunk:
+            stats.add(len(chunk), time.perf_counter() - chunk_start)
+            yield chunk, end_offset
+
+
+def _iter_csv_records(f, start_offset: int) -> Iterator[Tuple[Dict, int]]:
+    """Dòng CSV dạng dict kèm byte offset sau bản ghi (csv.reader chỉ đọc đúng số dòng của bản ghi)."""
+    position = {"offset": 0}
+
+    def decoded_lines():
+        for raw_line in f:
+            position["offset"] += len(raw_line)
+            yield raw_line.decode('utf-8-sig')
+
+    reader = csv.reader(decoded_lines())
+    header = next(reader, None)
+    if not header:
+        return
+    header = [column.strip() for column in header]
+    if start_offset > position["offset"]:
+        f.seek(start_offset)
+        position["offset"] = start_offset
+        reader = csv.reader(decoded_lines())
+    for values in reader:
+        if values:
+            yield dict(zip(header, values)), position["offset"]
+
+
+def parse_chunks(chunks: Iterable[Tuple[list, int]], fmt: str, stats: StageStats,
+                 workers: int = INGEST_PARSE_WORKERS) -> Iterator[Tuple[List[Dict], int, int]]:
+    """Stage parse: (jobs đã chuẩn hoá, số bản ghi bỏ qua, end_offset), giữ thứ tự chunk."""
+    if workers <= 1:
+        for records, end_offset in chunks:
+            start = time.perf_counter()
+            jobs, skipped = parse_job_chunk(fmt, records)
+            stats.add(len(records), time.perf_counter() - start)
+            yield jobs, skipped, end_offset
+        return
+
+    # spawn thay vì fork: process cha đang có nhiều thread (SQLite, embed)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending: deque = deque()
+
+        def pop():
+            records_count, end_offset, submitted, future = pending.popleft()
+            jobs, skipped = future.result()
+            # Thời gian bận của stage song song: chia theo số worker
+            stats.add(records_count, (time.perf_counter() - submitted) / workers)
+            return jobs, skipped, end_offset
+
+        for records, end_offset in chunks:
+            pending.append((len(records), end_offset, time.perf_counter(),
+                            pool.submit(parse_job_chunk, fmt, records)))
+            if len(pending) >= workers * 2:
+                yield pop()
+        while pending:
+            yield pop()
+
+
+def diff_chunks(parsed: Iterable[Tuple[List[Dict], int, int]], collection,
+                stats: StageStats) -> Iterator[Tuple[Tuple[List[Dict], int, int, int], List[str]]]:
+    """
+    Stage diff: bỏ các job có content_hash không đổi so với job_store (đọc snapshot đã commit)
+    và đã có trong `collection`. Job không đổi nhưng thiếu vector (collection của provider
+    mới, hoặc lần reindex trước bị ngắt) vẫn được embed lại.
+    Trả về ((jobs cần ghi, số job không đổi, số bản ghi bỏ qua, end_offset), texts cần embed).
+    """
+    for jobs, skipped, end_offset in parsed:
+        start = time.perf_counter()
+        with get_read_connection() as conn:
+            current = get_existing_jobs(conn, [job['values'][JOB_URL_INDEX] for job in jobs])
+        doc_ids = []  # id Chroma của job không đổi, None nếu job mới/đổi nội dung
+        for job in jobs:
+            existing = current.get(job['values'][JOB_URL_INDEX])
+            doc_ids.append(f"job_{existing[0]}" if existing and existing[1] == job['content_hash'] else None)
+        unchanged_ids = list({doc_id for doc_id in doc_ids if doc_id})
+        indexed = set(collection.get(ids=unchanged_ids, include=[])["ids"]) if unchanged_ids else set()
+        changed = [job for job, doc_id in zip(jobs, doc_ids) if doc_id not in indexed]
+        stats.add(len(jobs), time.perf_counter() - start)
+        yield (changed, len(jobs) - len(changed), skipped, end_offset), [job['page_content'] for job in changed]
+
+
+def _write_batch(conn, vectorstore, jobs: List[Dict], vectors: List[List[float]],
+                 counts: Dict[str, int]) -> Tuple[List[int], List[List[float]]]:
+    """Stage write: SQLite (bulk upsert) rồi Chroma, cùng một batch. Trả về (job_ids, vectors) đã ghi."""
+    job_ids, ids, metadatas, documents, embeddings, updated_ids = [], [], [], [], [], []
+    for job, vector, (job_id, status) in zip(jobs, vectors, bulk_upsert_jobs(conn, jobs)):
+        counts[status] += 1
+        if job_id is None:  # trùng job_url với bản sau trong cùng batch
+            continue
+        if status == "updated":
+            updated_ids.append(job_id)
+        job_ids.append(job_id)
+        ids.append(f"job_{job_id}")
+        # content_hash trong metadata: reconciler so với job_store để phát hiện vector cũ
+        metadatas.append({**job['metadata'], "job_id": job_id, "content_hash": job['content_hash']})
+        documents.append(job['page_content'])
+        embeddings.append(vector)
+    if updated_ids:
+        # Job đã index trước khi có id cố định (id ngẫu nhiên) -> xoá bản cũ
+        vectorstore._collection.delete(where={"job_id": {"$in": updated_ids}})
+    if ids:
+        vectorstore._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+    return job_ids, embeddings
+
+
+# ===== PIPELINE =====
+
+def run_ingest(source_path: str, vectorstore, batch_size: int = 1000, parse_workers: Optional[int] = None,
+               on_batch_written: Optional[Callable[[List[int], List[List[float]]], None]] = None) -> Dict:
+    """
+    Ingest tăng dần một file JSONL/CSV vào SQLite + Chroma.
+
+    Chỉ job mới hoặc đổi nội dung (content_hash theo job_url) được ghi và embed. Mỗi batch
+    được commit cùng checkpoint (byte offset) sau khi đã vào Chroma, nên lần chạy bị ngắt
+    sẽ tiếp tục từ batch dở; file không đổi kể từ lần chạy xong trước thì bỏ qua.
+    on_batch_written(job_ids, vectors) được gọi sau mỗi batch đã commit (vd. cập nhật vector_index).
+    Trả về {"inserted", "updated", "unchanged", "skipped", "up_to_date", "elapsed_s", "stages"};
+    up_to_date=True khi file đã ingest xong từ trước (số liệu lấy từ checkpoint, không ghi gì).
+    """
+    fmt = source_format(source_path)
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(source_path)
+    create_tables()
+
+    source_path = os.path.abspath(source_path)
+    file_stat = os.stat(source_path)
+    # Checkpoint theo cả collection: đổi EMBEDDING_PROVIDER thì file phải được index lại
+    file_key = (f"{source_path}::{vectorstore._collection.name}", file_stat.st_size, file_stat.st_mtime_ns)
+    stages = {name: StageStats(name) for name in ("read", "parse", "diff", "embed", "write")}
+    started = time.perf_counter()
+
+    with get_db_connection() as conn:
+        checkpoint = get_ingest_checkpoint(conn, file_key[0])
+        same_file = bool(checkpoint) and (checkpoint['file_size'], checkpoint['file_mtime_ns']) == file_key[1:]
+        counts = {status: 0 for status in INGEST_STATUSES}
+        if same_file:
+            counts = {status: checkpoint[status] for status in INGEST_STATUSES}
+        if same_file and checkpoint['completed']:
+            # Số liệu của lần chạy đã hoàn tất, để log / script không báo "0 jobs" cho corpus đã nạp đủ
+            logging.info(f"Skipping ingest: {source_path} unchanged since last run ({counts})")
+            return {**counts, "skipped": 0, "up_to_date": True, "elapsed_s": 0.0, "stages": {}}
+        start_offset = 0
+        if same_file:
+            start_offset = checkpoint['byte_offset']
+            logging.info(f"Resuming ingest of {source_path} at byte {start_offset}")
+        save_ingest_checkpoint(conn, *file_key, start_offset, counts)
+        conn.commit()
+        if parse_workers is None:
+            remaining = file_stat.st_size - start_offset
+            parse_workers = INGEST_PARSE_WORKERS if remaining >= INGEST_PARALLEL_MIN_BYTES else 1
+
+        embeddings = vectorstore.embeddings
+        key_pool = getattr(embeddings, "underlying", embeddings)
+        # Đủ batch đang embed để mọi key đều có việc, nhưng vẫn giới hạn bộ nhớ
+        requests_per_batch = max(1, -(-batch_size // EMBED_REQUEST_SIZE))
+        max_in_flight = max(2, -(-getattr(key_pool, "max_workers", 1) // requests_per_batch) + 1)
+
+        skipped = 0  # bản ghi không hợp lệ (JSON lỗi, thiếu job_url)
+        chunks = _in_background(read_chunks(source_path, fmt, start_offset, batch_size, stages["read"]), "read")
+        parsed = _in_background(parse_chunks(chunks, fmt, stages["parse"], parse_workers), "parse")
+        diffed = _in_background(diff_chunks(parsed, vectorstore._collection, stages["diff"]), "diff")
+        embedded = iter_embedded_batches(_TimedEmbeddings(embeddings, stages["embed"]), diffed, max_in_flight)
+        for (jobs, unchanged, invalid, end_offset), vectors in embedded:
+            write_start = time.perf_counter()
+            counts["unchanged"] += unchanged
+            skipped += invalid
+            written_ids, written_vectors = _write_batch(conn, vectorstore, jobs, vectors, counts)
+            save_ingest_checkpoint(conn, *file_key, end_offset, counts)
+            conn.commit()
+            if on_batch_written and written_ids:
+                on_batch_written(written_ids, written_vectors)
+            stages["write"].add(len(jobs), time.perf_counter() - write_start)
+            if jobs:
+                written = counts["inserted"] + counts["updated"]
+                logging.info(f"Ingested batch of {len(jobs)} jobs ({written} written, "
+                             f"{written / (time.perf_counter() - started):.0f} jobs/s)")
+        save_ingest_checkpoint(conn, *file_key, file_stat.st_size, counts, completed=True)
+        conn.commit()
+
+    result = {**counts, "skipped": skipped, "up_to_date": False, "elapsed_s": round(time.perf_counter() - started, 3),
+              "stages": {name: stats.as_dict() for name, stats in stages.items()}}
+    logging.info(f"Ingested jobs from {source_path}: {counts['inserted']} inserted, "
+                 f"{counts['updated']} updated, {counts['unchanged']} unchanged, {skipped} skipped")
+    for name, stats in result["stages"].items():
+        logging.info(f"   {name:<6} {stats['items']:>8} items  {stats['busy_s']:>8.2f}s busy  "
+                     f"{stats['items_per_s'] or 0:>10.1f} items/s")
+    return result
@@ -0,0 +1,271 @@
+"""
+Job Parsing - Chuẩn hoá các trường text của job một lần lúc ingest
+
+Các hàm ở đây thuần Python (không truy cập DB), được db_utils/chroma_utils
+gọi khi ghi job vào job_store để các truy vấn sau đó chạy bằng index SQL
+thay vì parse lại text ở mỗi request.
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+from dateutil.parser import parse as _dt_parse
+
+# Tỷ giá quy đổi lương USD -> VND (lương lưu thống nhất theo VND)
+USD_TO_VND_RATE = float(os.getenv("USD_TO_VND_RATE", "25000"))
+
+_EMPTY_VALUES = {"", "n/a", "none", "null", "không xác định"}
+_NEGOTIABLE_MARKERS = ("thỏa thuận", "thoả thuận", "thoa thuan", "negotiable", "cạnh tranh", "competitive")
+_DATE_PATTERNS = (
+    (re.compile(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$"), ("d", "m", "y")),
+    (re.compile(r"^(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})$"), ("y", "m", "d")),
+)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# "Còn 5 ngày" / "15 ngày nữa": tính từ thời điểm crawl (cột timestamp)
+_RELATIVE_DAYS_RE = re.compile(r"^(?:còn|con)\s+(\d+)\s*(?:ngày|ngay)|^(\d+)\s*(?:ngày|ngay)\s*(?:nữa|nua)$")
+# Hai ngày mặc định khác nhau ở cả ngày/tháng/năm: parse ra cùng kết quả nghĩa là text có đủ cả ba
+_DATE_DEFAULTS = (datetime(2000, 1, 1), datetime(2004, 2, 2))
+_VIETNAM_TZ = timezone(timedelta(hours=7))  # timestamp crawl là epoch, ngày tính theo giờ Việt Nam
+
+
+def fold_text(text: str) -> str:
+    """Bỏ dấu tiếng Việt + lower ("Đại học" -> "dai hoc") để so khớp text không phụ thuộc dấu."""
+    text = unicodedata.normalize("NFD", (text or "").replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in text if unicodedata.category(c) != "Mn").lower()
+
+
+def normalize_skill(skill: str) -> str:
+    """Khoá chuẩn hoá của skill: gộp khoảng trắng + casefold ("  Python " -> "python")."""
+    return " ".join(str(skill).split()).casefold()
+
+
+def parse_skills(raw: Any) -> List[Tuple[str, str]]:
+    """
+    Tách skills của job thành danh sách (skill_norm, display_name), bỏ trùng.
+
+    Nhận chuỗi phân tách bằng ';' (định dạng dữ liệu crawl: "Python; Django; SQL"),
+    chuỗi JSON array, hoặc list.
+    """
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        text = raw.strip()
+        if text.startswith("["):
+            try:
+                raw = json.loads(text)
+            except json.JSONDecodeError:
+                raw = text.strip("[]").split(";")
+        else:
+            raw = text.split(";")
+    if not isinstance(raw, (list, tuple)):
+        return []
+
+    skills: List[Tuple[str, str]] = []
+    seen = set()
+    for item in raw:
+        if not isinstance(item, str):
+            continue
+        display = " ".join(item.split())
+        norm = normalize_skill(display)
+        if norm and norm not in seen:
+            seen.add(norm)
+            skills.append((norm, display))
+    return skills
+
+
+def parse_timestamp(raw: Any) -> Optional[date]:
+    """Ngày crawl từ cột timestamp (epoch ms / epoch giây / ISO); None nếu không đọc được."""
+    text = str(raw or "").strip()
+    if not text:
+        return None
+    try:
+        if text.isdigit():
+            value = int(text)
+            return datetime.fromtimestamp(value / 1000 if value > 10**11 else value, _VIETNAM_TZ).date()
+        return datetime.fromisoformat(text).date()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def parse_deadline(raw: Any, crawled_at: Any = None) -> Optional[str]:
+    """
+    Chuẩn hoá deadline về ISO YYYY-MM-DD (để so sánh/sort trong SQL).
+    Ưu tiên định dạng Việt Nam dd/mm/yyyy; chỉ nhận text có đủ ngày, tháng, năm.
+    "Còn N ngày" tính từ crawled_at (timestamp lúc crawl), không có thì trả về None.
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, (date, datetime)):
+        return raw.strftime("%Y-%m-%d")
+    text = str(raw).strip()
+    if text.lower() in _EMPTY_VALUES:
+        return None
+    for pattern, order in _DATE_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            parts = dict(zip(order, (int(g) for g in m.groups())))
+            try:
+                return date(parts["y"], parts["m"], parts["d"]).isoformat()
+            except ValueError:
+                return None
+    relative = _RELATIVE_DAYS_RE.match(text.lower())
+    if relative:
+        crawl_date = parse_timestamp(crawled_at)
+        if crawl_date is None:
+            return None
+        return (crawl_date + timedelta(days=int(relative.group(1) or relative.group(2)))).isoformat()
+    try:
+        parsed = [_dt_parse(text, dayfirst=True, default=default) for default in _DATE_DEFAULTS]
+    except (ValueError, OverflowError):
+        return None
+    # Thiếu ngày / tháng / năm ("2025", "tháng 10") thì dateutil điền từ default -> bỏ
+    return parsed[0].strftime("%Y-%m-%d") if parsed[0] == parsed[1] else None
+
+
+def _parse_number(token: str) -> float:
+    """'1,500' / '1.500' -> 1500 (phân cách nghìn), '1.5' / '1,5' -> 1.5 (thập phân)."""
+    parts = re.split(r"[.,]", token)
+    if len(parts) > 1 and all(len(p) == 3 for p in parts[1:]):
+        return float("".join(parts))
+    if len(parts) == 2:
+        return float(f"{parts[0]}.{parts[1]}")
+    return float("".join(parts))
+
+
+def parse_salary(raw: Any) -> Tuple[Optional[int], Optional[int], bool]:
+    """
+    Tách lương text thành (salary_min_vnd, salary_max_vnd, negotiable).
+
+    Ví dụ: "15 - 25 triệu" -> (15_000_000, 25_000_000, False),
+    "Trên 10 triệu" -> (10_000_000, None, False), "Tới 1,500 USD" -> (None, 37_500_000, False),
+    "Tối đa 20 triệu" -> (None, 20_000_000, False),
+    "Thỏa thuận" -> (None, None, True).
+    """
+    if raw is None:
+        return None, None, False
+    text = str(raw).strip().lower()
+    if text in _EMPTY_VALUES:
+        return None, None, False
+    negotiable = any(marker in text for marker in _NEGOTIABLE_MARKERS)
+    numbers = [_parse_number(token) for token in _NUMBER_RE.findall(text)]
+    if not numbers:
+        return None, None, negotiable
+
+    if "usd" in text or "$" in text:
+        multiplier = USD_TO_VND_RATE
+    elif "triệu" in text or "trieu" in text or re.search(r"\d\s*(tr|m)\b", text):
+        multiplier = 1_000_000
+    elif "nghìn" in text or "ngàn" in text or re.search(r"\d\s*k\b", text):
+        multiplier = 1_000
+    else:
+        # Không ghi đơn vị: số nhỏ hiểu là triệu ("10 - 15"), số lớn là VND
+        multiplier = 1_000_000 if max(numbers) < 1000 else 1
+    values = [int(round(n * multiplier)) for n in numbers[:2]]
+
+    if len(values) == 2:
+        low, high = sorted(values)
+        return low, high, negotiable
+    if re.search(r"(trên|từ|tối thiểu|toi thieu|from|over|above|at least|\bmin\b|>)", text):
+        return values[0], None, negotiable
+    if re.search(r"(tới|đến|dưới|tối đa|toi da|lên đến|len den|up to|upto|under|\bmax\b|<)", text):
+        return None, values[0], negotiable
+    return values[0], values[0], negotiable
+
+
+def typed_job_fields(salary: Any, deadline: Any,
+                     timestamp: Any = None) -> Tuple[Optional[str], Optional[int], Optional[int], int]:
+    """Giá trị cho các cột (deadline_date, salary_min_vnd, salary_max_vnd, salary_negotiable) của job_store."""
+    salary_min, salary_max, negotiable = parse_salary(salary)
+    return parse_deadline(deadline, timestamp), salary_min, salary_max, int(negotiable)
+
+
+# Các cột lấy từ dữ liệu crawl (JSONL/CSV), theo thứ tự dùng cho INSERT và content_hash
+JOB_SOURCE_COLUMNS = [
+    "name", "job_title", "job_url", "job_description", "candidate_requirements",
+    "benefits", "work_location", "work_time", "job_tags", "skills",
+    "related_categories", "salary", "experience", "deadline", "company_logo",
+    "company_scale", "company_field", "company_address", "level", "education",
+    "number_of_hires", "work_type", "company_url", "timestamp",
+]
+
+
+def parse_number_of_hires(raw: Any) -> int:
+    """'3 người' -> 3; trống hoặc không đọc được -> 1."""
+    if not raw:
+        return 1
+    try:
+        return int(float(str(raw).split()[0]))
+    except ValueError:
+        return 1
+
+
+def job_row_values(row: dict) -> Tuple:
+    """Giá trị JOB_SOURCE_COLUMNS của một dòng crawl (text đã chuẩn hoá như khi lưu trong SQLite)."""
+    return tuple(
+        parse_number_of_hires(row.get(column)) if column == "number_of_hires" else str(row.get(column) or '')
+        for column in JOB_SOURCE_COLUMNS
+    )
+
+
+def job_content_hash(values: Tuple) -> str:
+    """Fingerprint nội dung job: sha256 của các giá trị JOB_SOURCE_COLUMNS."""
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def job_page_content(row: dict) -> str:
+    """Nội dung đầy đủ (không cắt) của một job để embed."""
+    return (
+        f"{row.get('job_title', '')} "
+        f"{row.get('job_description', '')} "
+        f"{row.get('candidate_requirements', '')} "
+        f"{json.dumps(row.get('skills', []), ensure_ascii=False)}"
+    )
+
+
+def prepare_job(row: dict) -> Optional[dict]:
+    """
+    Chuẩn hoá một dòng crawl thành mọi thứ cần để ghi SQLite + Chroma:
+    values (JOB_SOURCE_COLUMNS), typed, content_hash, skills đã parse, page_content, metadata.
+    Dòng không có job_url (khoá upsert) trả về None.
+    """
+    values = job_row_values(row)
+    if not values[JOB_SOURCE_COLUMNS.index("job_url")]:
+        return None
+    return {
+        "values": values,
+        "typed": typed_job_fields(row.get("salary"), row.get("deadline"), row.get("timestamp")),
+        "content_hash": job_content_hash(values),
+        "skills": parse_skills(row.get("skills")),
+        "page_content": job_page_content(row),
+        # Chroma chỉ nhận metadata kiểu scalar
+        "metadata": {k: v for k, v in row.items() if isinstance(v, (str, int, float, bool))},
+    }
+
+
+def parse_job_chunk(fmt: str, records: list) -> Tuple[List[dict], int]:
+    """
+    Parse + chuẩn hoá một chunk bản ghi thô (dòng JSONL dạng bytes, hoặc dict của CSV).
+    Chạy được trong process pool (chỉ dùng hàm thuần). Trả về (jobs, số bản ghi bị bỏ qua).
+    """
+    jobs, skipped = [], 0
+    for record in records:
+        if fmt == "jsonl":
+            line = record.decode("utf-8-sig").strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+        job = prepare_job(record) if isinstance(record, dict) else None
+        if job is None:
+            skipped += 1
+        else:
+            jobs.append(job)
+    return jobs, skipped
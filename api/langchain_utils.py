@@ -1,19 +1,20 @@
-import sqlite3
 import json
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import create_history_aware_retriever
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.documents import Document
-from typing import List, Tuple
-import os
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from chroma_utils import get_vectorstore
+from api_key_manager import get_next_api_key
+from context_packer import estimate_tokens, pack_documents, pack_text, token_budget
+from db_utils import get_read_connection
+from hybrid_retrieval import hybrid_job_search
+from llm_registry import get_chat_model, get_or_build
+from match_scoring import score_candidates
+from reconciler import reconcile
 import asyncio
-from contextlib import contextmanager
+import os
 import re
+import time
 
 # ======================================================
 # ⚙️ Cấu hình môi trường & logging
@@ -21,23 +22,10 @@ import re
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Tự động tìm đường dẫn database
-base_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(base_dir)
-DB_NAME = os.path.join(project_root, "db", "cv_job_matching.db")
-
-
-# ======================================================
-# 🧩 Kết nối SQLite
-# ======================================================
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Số job ứng viên lấy từ hybrid retrieval (BM25 + vector, RRF) để chấm điểm tại chỗ
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "12"))
+# Số job đầu (sau khi chấm điểm tại chỗ) được LLM viết why_match
+MATCH_EXPLAIN_TOP_N = int(os.getenv("MATCH_EXPLAIN_TOP_N", "5"))
 
 
 # ======================================================
@@ -57,218 +45,219 @@ def _to_int_job_id(x):
     return None
 
 
-def _prefix_doc_with_id(doc: Document) -> Document:
-    """Nhét JOB_ID/TITLE/URL vào đầu page_content và RÚT GỌN content để Gemini xử lý nhanh hơn."""
-    mid = doc.metadata or {}
-    job_id = mid.get("job_id", "")
-    job_title = mid.get("job_title", "")
-    job_url = mid.get("job_url", "")
+# ======================================================
+# 🔍 Prompt giải thích (dựng một lần khi import)
+# ======================================================
+# Xếp hạng do match_scoring làm tại chỗ; LLM chỉ viết why_match cho top job + gợi ý
+MATCH_EXPLAIN_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are a career advisor. The jobs below were already ranked for a candidate by a scoring engine "
+        "(weights: 50% skills, 30% experience, 10% aspirations, 10% education). Do NOT re-rank or re-score them.\n"
+        "For each job, write why_match: explain in Vietnamese why this job matches the CV, focusing on the matched "
+        "skills, experience and career goals listed for it. Be specific and concise, max 60 words.\n"
+        "Then give up to 5 suggestions to improve skills or gain experience relevant to these jobs, "
+        "based on the missing skills listed.\n"
+        "Output NDJSON: one compact JSON object per line, no array, no markdown, in this order:\n"
+        "{{\"type\": \"why_match\", \"job_id\": int, \"why_match\": str}}  (one line per job, in the given order)\n"
+        "{{\"type\": \"suggestion\", \"skill_or_experience\": str, \"suggestion\": str}}  (one line per suggestion)\n"
+        "Use only the job_id values given below and only the provided data, no placeholder or sample data."
+    ),
+    ("human", "CV:\n{cv}\n\nJobs:\n{jobs}")
+])
 
-    # Rút gọn content: chỉ lấy 800 ký tự đầu (đủ cho matching)
-    content = doc.page_content or ""
-    if len(content) > 800:
-        content = content[:800] + "..."
 
-    header = f"JOB_ID: {job_id}\nJOB_TITLE: {job_title}\nJOB_URL: {job_url}\n-----\n"
-    doc.page_content = header + content
-    return doc
+def get_explain_chain(model: str = "gemini-2.5-flash"):
+    """Chain prompt | LLM | text cho key kế tiếp trong vòng xoay (cache theo (model, key) trong llm_registry)."""
+    api_key = get_next_api_key()
+    return get_or_build("match_explain_chain", model, api_key,
+                        lambda: MATCH_EXPLAIN_PROMPT | get_chat_model(model, api_key=api_key) | StrOutputParser())
 
 
-# ======================================================
-# 🔍 Tạo các thành phần RAG (trả về retriever + QA chain)
-# ======================================================
-def get_rag_components(model: str = "gemini-2.5-flash") -> Tuple:
+def _explain_input(cv: dict, scored: List[dict], jobs: Dict[int, dict], model: str) -> dict:
     """
-    Trả về (retriever, qa_chain, qa_prompt).
-    Sau đó ta sẽ tự gọi retriever -> lấy docs -> gọi thẳng qa_chain với {context: docs}.
+    Input cho MATCH_EXPLAIN_PROMPT trong ngân sách token của model (context_packer): tóm tắt
+    CV (~1/5 ngân sách) + mỗi job một dòng điểm / skill khớp, kèm các câu yêu cầu / mô tả
+    liên quan nhất tới CV (boilerplate lặp giữa các job chỉ giữ một lần).
     """
-    # Use API key rotation
-    from api_key_manager import get_next_api_key
-    google_api_key = get_next_api_key()
-
-    llm = ChatGoogleGenerativeAI(model=model, google_api_key=google_api_key)
-
-    # Tạo retriever từ Chroma - lấy 20 jobs để Gemini rank
-    vectorstore = get_vectorstore()
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 20})
-
-    # Prompt tạo query tóm tắt CV thành truy vấn tìm việc (cho history-aware retriever nếu dùng)
-    contextualize_q_system_prompt = (
-        "You are an assistant helping to match CV skills, aspirations, experience, and education with job postings.\n"
-        "Given the match history and a combined input of skills, aspirations, experience, and education from a CV, "
-        "reformulate them into a concise query for job matching.\n"
-        "Extract and prioritize key keywords from skills, experience, aspirations, and education.\n"
-        "Ensure the query focuses on matching CV skills and experience with job description, candidate requirements, and skills listed in job postings.\n"
-        "Do NOT generate an answer, only reformulate the input into a clear and concise query."
+    budget = token_budget(model)
+    skills = [s for s in cv.get("skills", []) or [] if isinstance(s, str)]
+    query = " ".join(skills + [cv.get("aspirations", "") or ""])
+    cv_budget = budget // 5
+    cv_text = (
+        f"Skills: {pack_text(', '.join(skills), cv_budget // 4)}\n"
+        f"Aspirations: {pack_text(cv.get('aspirations', '') or '', cv_budget // 4, query)}\n"
+        f"Experience: {pack_text(cv.get('experience', '') or '', cv_budget // 3, query)}\n"
+        f"Education: {pack_text(cv.get('education', '') or '', cv_budget // 6)}"
     )
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", contextualize_q_system_prompt),
-        MessagesPlaceholder("match_history"),
-        ("human", "Match jobs for CV with input: {input}")
-    ])
-    # Bạn có thể dùng history_aware_retriever nếu cần, hiện tại ta không dùng nó để giữ chủ động context
-    _ = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
-
-    # Prompt chính để RAG đánh giá và match
-    qa_prompt = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        "You are a job matching assistant. Your task is to match CV skills, aspirations, experience, and education with job postings.\n"
-        "Use the provided context (job postings) to identify the top 5 most relevant jobs.\n"
-        "Assign weights: 50% for skills, 30% for experience, 10% for aspirations, 10% for education.\n"
-        "For matched_skills, ONLY include skills explicitly mentioned in the job's candidate_requirements, job_description, or skills list. "
-        "Do NOT include skills from the CV that are not explicitly required or mentioned in the job context.\n"
-        "Match experience by comparing CV experience with job description and experience required. "
-        "Match aspirations with job title or description. Match education with education required.\n"
-        "Provide suggestions to improve skills or gain experience relevant to the matched jobs, focusing on skills present in the CV but not matched.\n"
-        "Return a JSON object with the following structure:\n"
-        "{{\n"
-        "  \"matched_jobs\": [{{\n"
-        "      \"job_id\": int,\n"
-        "      \"job_title\": str,\n"
-        "      \"job_url\": str,\n"
-        "      \"match_score\": float,\n"
-        "      \"matched_skills\": [str],\n"
-        "      \"matched_aspirations\": [str],\n"
-        "      \"matched_experience\": [str],\n"
-        "      \"matched_education\": [str],\n"
-        "      \"why_match\": str (explain in Vietnamese why this job matches the CV, focusing on matched skills, experience, and career goals. Be specific and concise, max 100 words)\n"
-        "  }}],\n"
-        "  \"suggestions\": [{{\"skill_or_experience\": str, \"suggestion\": str}}]\n"
-        "}}\n"
-        "Ensure the response is concise, accurate, and based only on the provided context.\n"
-        "Do not include any placeholder or sample data, mock examples — only use the actual context data.\n"
-        "IMPORTANT:\n"
-        "- The 'job_id' MUST be taken from the 'JOB_ID:' line in the context text (not invented).\n"
-        "- If a job in the context has a 'JOB_ID' that is not a number, skip it.\n"
-        "- Only pick jobs that appear in the provided context.\n"
-    ),
-    ("system", "Context (job postings):\n{context}"),
-    MessagesPlaceholder("match_history"),
-    ("human", "Match jobs for CV with input: {input}")
-])
+    documents = []
+    for item in scored:
+        job = jobs.get(item["job_id"], {})
+        header = (
+            f"- job_id {item['job_id']}: {item['job_title']} | {job.get('name') or ''} | "
+            f"score {item['match_score']:.2f} {json.dumps(item['score_breakdown'])} | "
+            f"matched skills: {', '.join(item['matched_skills']) or 'none'} | "
+            f"missing skills: {', '.join(item['missing_skills'][:8]) or 'none'} | "
+            f"experience required: {job.get('experience') or 'N/A'} | education required: {job.get('education') or 'N/A'}"
+        )
+        documents.append((header, [("  Requirements", job.get("candidate_requirements") or ""),
+                                   ("  Description", job.get("job_description") or "")]))
+    packed = pack_documents(documents, query, budget - estimate_tokens(cv_text))
+    logging.info(f"📦 Context why_match: CV {estimate_tokens(cv_text)} + jobs {packed['tokens']} tokens "
+                 f"(ngân sách {budget}, bỏ {packed['duplicates_dropped']} câu trùng)")
+    return {"cv": cv_text, "jobs": packed["text"]}
+
+
+def _fallback_suggestions(scored: List[dict]) -> List[dict]:
+    """Gợi ý tại chỗ (skill thiếu phổ biến nhất trong top job) khi LLM lỗi."""
+    counts: Dict[str, int] = {}
+    for item in scored:
+        for skill in item["missing_skills"]:
+            counts[skill] = counts.get(skill, 0) + 1
+    top = sorted(counts, key=lambda skill: -counts[skill])[:5]
+    return [{"skill_or_experience": skill,
+             "suggestion": f"Bổ sung kỹ năng {skill} (yêu cầu ở {counts[skill]}/{len(scored)} job phù hợp nhất)"}
+            for skill in top]
+
+
+def _parse_explain_line(line: str) -> Optional[dict]:
+    """Một dòng NDJSON của LLM -> event why_match / suggestion đã kiểm tra; dòng rác -> None."""
+    line = line.strip().strip(",")
+    if not line.startswith("{"):
+        return None  # ``` / dòng trống / text thừa
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    if entry.get("type") == "why_match":
+        job_id = _to_int_job_id(entry.get("job_id"))
+        if job_id is not None and isinstance(entry.get("why_match"), str):
+            return {"type": "why_match", "job_id": job_id, "why_match": entry["why_match"]}
+    elif entry.get("type") == "suggestion" and entry.get("skill_or_experience") and entry.get("suggestion"):
+        return {"type": "suggestion", "skill_or_experience": str(entry["skill_or_experience"]),
+                "suggestion": str(entry["suggestion"])}
+    return None
+
 
-    qa_chain = create_stuff_documents_chain(llm, qa_prompt, output_parser=JsonOutputParser())
-    logging.info("✅ StuffDocumentsChain created for Gemini.")
-    return retriever, qa_chain, qa_prompt
+async def stream_explanations(cv: dict, scored: List[dict], jobs: Dict[int, dict],
+                              model: str = "gemini-2.5-flash") -> AsyncIterator[dict]:
+    """
+    Stream why_match / suggestion của LLM cho các job đã chấm, mỗi event ngay khi dòng NDJSON
+    tương ứng về đủ. job_id lạ bị bỏ. LLM lỗi hoặc không trả gợi ý -> gợi ý tại chỗ.
+    """
+    if not scored:
+        return
+    allowed = {item["job_id"] for item in scored}
+    suggestions = 0
+    buffer = ""
+    try:
+        async for chunk in get_explain_chain(model).astream(_explain_input(cv, scored, jobs, model)):
+            buffer += chunk
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                event = _parse_explain_line(line)
+                if event and (event["type"] == "suggestion" or event["job_id"] in allowed):
+                    suggestions += event["type"] == "suggestion"
+                    yield event
+        event = _parse_explain_line(buffer)
+        if event and (event["type"] == "suggestion" or event["job_id"] in allowed):
+            suggestions += event["type"] == "suggestion"
+            yield event
+    except Exception as e:
+        logging.warning(f"⚠️ Không tạo được why_match/suggestions từ LLM: {e}")
+    if not suggestions:
+        for suggestion in _fallback_suggestions(scored):
+            yield {"type": "suggestion", **suggestion}
+
+
+async def explain_matches(cv: dict, scored: List[dict], jobs: Dict[int, dict],
+                          model: str = "gemini-2.5-flash") -> Tuple[Dict[int, str], List[dict]]:
+    """Gom stream_explanations: ({job_id: why_match}, suggestions)."""
+    why, suggestions = {}, []
+    async for event in stream_explanations(cv, scored, jobs, model):
+        if event["type"] == "why_match":
+            why[event["job_id"]] = event["why_match"]
+        else:
+            suggestions.append({"skill_or_experience": event["skill_or_experience"], "suggestion": event["suggestion"]})
+    return why, suggestions
 
 
 # ======================================================
 # 🤖 Hàm Matching chính (đã fix việc LLM luôn thấy JOB_ID)
 # ======================================================
-async def match_cv(cv: dict, filtered_job_ids: List[int], session_id: str) -> dict:
+async def retrieve_and_score(cv: dict, filtered_job_ids: Optional[List[int]],
+                             preferences: Optional[Dict[str, List[str]]] = None) -> Tuple[List[dict], Dict[int, dict]]:
     """
-    Match một CV với danh sách job sử dụng:
-      1) retriever để lấy top docs
-      2) ép JOB_ID/TITLE/URL vào page_content của từng doc
-      3) gọi thẳng qa_chain với {context: docs}
-    => Tránh việc create_retrieval_chain bỏ qua context thủ công.
+    Bước không cần LLM của match: hybrid retrieval (BM25 + vector, RRF, boost theo preferences)
+    lấy MATCH_TOP_K job, rồi match_scoring chấm điểm và xếp hạng tại chỗ.
+    Trả về (danh sách đã chấm, {job_id: dòng job_store}).
+    """
+    cv_id = cv.get("cv_id")
+    query = (
+        f"Skills: {json.dumps(cv.get('skills', []), ensure_ascii=False)} "
+        f"Aspirations: {cv.get('aspirations', '')} "
+        f"Experience: {cv.get('experience', '')} "
+        f"Education: {cv.get('education', '')}"
+    )
+    logging.info(f"\n🧠 [CV {cv_id}] Query sinh ra từ CV:\n{query}\n")
+
+    # BM25 + vector chạy song song, gộp RRF; có filter thì lọc ngay trong cả hai truy vấn
+    logging.info(f"🔎 Đang truy vấn hybrid retrieval cho CV {cv_id} ...")
+    ranked = await hybrid_job_search(
+        query, cv.get("skills", []) or [], cv.get("aspirations", "") or "", MATCH_TOP_K,
+        job_ids=filtered_job_ids or None, preferences=preferences,
+    )
+    score_start = time.perf_counter()
+    scored = await score_candidates(cv, ranked)
+    logging.info(f"✅ Chấm điểm {len(scored)} jobs tại chỗ ({(time.perf_counter() - score_start) * 1000:.1f} ms)")
+    return scored, {job["id"]: job for job, _ in ranked}
+
+
+def _matched_job(item: dict, why_match: Optional[str] = None) -> dict:
+    """Kết quả chấm điểm -> phần tử matched_jobs (định dạng match_cv / match cache)."""
+    return {
+        "job_id": item["job_id"],
+        "job_title": item["job_title"],
+        "job_url": item["job_url"],
+        "match_score": item["match_score"],
+        "matched_skills": item["matched_skills"],
+        "matched_aspirations": item["matched_aspirations"],
+        "matched_experience": item["matched_experience"],
+        "matched_education": item["matched_education"],
+        "why_match": why_match,
+    }
+
+
+_NO_FILTER_MATCH = [{"skill_or_experience": "N/A", "suggestion": "No jobs matched the filters"}]
+
+
+async def match_cv(cv: dict, filtered_job_ids: List[int], session_id: str,
+                   preferences: Optional[Dict[str, List[str]]] = None,
+                   model: str = "gemini-2.5-flash") -> dict:
+    """
+    Match một CV với danh sách job theo hai bước:
+      1) retrieve_and_score: hybrid retrieval + chấm điểm tại chỗ (skills 50%, experience 30%,
+         aspirations 10%, education 10%) — không gọi LLM
+      2) một lần gọi LLM ngắn viết why_match cho MATCH_EXPLAIN_TOP_N job đầu + suggestions
+    Bản stream từng phần: stream_match_cv.
     """
     try:
         cv_id = cv.get("cv_id")
         if not cv_id:
             raise ValueError("CV must include cv_id")
 
-        # ===== 1) Chuẩn bị query =====
-        query = (
-            f"Skills: {json.dumps(cv.get('skills', []), ensure_ascii=False)} "
-            f"Aspirations: {cv.get('aspirations', '')} "
-            f"Experience: {cv.get('experience', '')} "
-            f"Education: {cv.get('education', '')}"
-        )
-        logging.info(f"\n🧠 [CV {cv_id}] Query sinh ra từ CV:\n{query}\n")
-
-        # ===== 2) Lấy retriever & QA chain =====
-        retriever, qa_chain, qa_prompt = get_rag_components()
-
-        vectorstore = get_vectorstore()
-
-        # ===== 3) Chuẩn bị context docs =====
-        logging.info(f"🔎 Đang truy vấn retriever cho CV {cv_id} ...")
-        docs: List[Document] = []
-        if filtered_job_ids:  # nếu có filter trước
-            job_id_strs = [str(j) for j in filtered_job_ids]
-            raw = vectorstore.get(where={"job_id": {"$in": job_id_strs}})
-            if not raw["ids"]:
-                return {
-                    "cv_id": cv_id,
-                    "matched_jobs": [],
-                    "suggestions": [{"skill_or_experience": "N/A", "suggestion": "No jobs matched the filters"}]
-                }
-            for meta in raw.get("metadatas", []):
-                if str(meta.get("job_id", "")).isdigit():
-                    d = Document(
-                        page_content=meta.get("content", ""),
-                        metadata={
-                            "job_id": meta.get("job_id"),
-                            "job_title": meta.get("job_title"),
-                            "job_url": meta.get("job_url"),
-                        },
-                    )
-                    docs.append(_prefix_doc_with_id(d))
-        else:
-            # Lấy context từ retriever (nhanh & gọn)
-            context_docs = retriever.get_relevant_documents(query)
-            for d in context_docs:
-                docs.append(_prefix_doc_with_id(d))
-
-        # Log số lượng jobs tìm được (rút gọn logging)
-        logging.info(f"✅ Tìm được {len(docs)} jobs phù hợp để gửi vào Gemini")
-
-        # ===== 6) Gọi thẳng QA chain với context thủ công =====
-        result = await qa_chain.ainvoke({
-            "context": docs,
-            "input": query,
-            "match_history": [],
-        })
-
-        # ===== 7) Parse & normalize output =====
-        output = result or {}
-        if not isinstance(output, dict):
-            output = {}
-
-        output["cv_id"] = cv_id
-        matched = output.get("matched_jobs", []) or []
-        normalized_jobs = []
-        for job in matched:
-            try:
-                # chuẩn hóa job_id về int
-                job_id = _to_int_job_id(job.get("job_id"))
-                if job_id is None:
-                    logging.warning(f"⚠️ Invalid job_id trong output: {job}")
-                    continue
-                # ép kiểu cẩn thận
-                job_title = job.get("job_title") or ""
-                job_url = job.get("job_url") or ""
-                match_score = float(job.get("match_score", 0.0))
-                matched_skills = job.get("matched_skills") or []
-                matched_asp = job.get("matched_aspirations") or []
-                matched_exp = job.get("matched_experience") or []
-                matched_edu = job.get("matched_education") or []
-                normalized_jobs.append({
-                    "job_id": job_id,
-                    "job_title": job_title,
-                    "job_url": job_url,
-                    "match_score": match_score,
-                    "matched_skills": matched_skills if isinstance(matched_skills, list) else [],
-                    "matched_aspirations": matched_asp if isinstance(matched_asp, list) else [],
-                    "matched_experience": matched_exp if isinstance(matched_exp, list) else [],
-                    "matched_education": matched_edu if isinstance(matched_edu, list) else [],
-                })
-            except Exception as e:
-                logging.warning(f"⚠️ Lỗi khi chuẩn hóa job: {e} | raw={job}")
-
-        output["matched_jobs"] = normalized_jobs
-
-        if not normalized_jobs:
-            output.setdefault("suggestions", [])
-            output["suggestions"].append({
-                "skill_or_experience": "N/A",
-                "suggestion": "No valid job_id returned by RAG"
-            })
-
-        logging.info(f"✅ CV {cv_id} matched {len(normalized_jobs)} jobs successfully")
-        return output
+        scored, jobs = await retrieve_and_score(cv, filtered_job_ids, preferences)
+        if filtered_job_ids and not scored:
+            return {"cv_id": cv_id, "matched_jobs": [], "suggestions": _NO_FILTER_MATCH}
+
+        # LLM chỉ giải thích top job
+        why, suggestions = await explain_matches(cv, scored[:MATCH_EXPLAIN_TOP_N], jobs, model)
+        matched_jobs = [_matched_job(item, why.get(item["job_id"])) for item in scored]
+
+        logging.info(f"✅ CV {cv_id} matched {len(matched_jobs)} jobs successfully")
+        return {"cv_id": cv_id, "matched_jobs": matched_jobs, "suggestions": suggestions}
 
     except Exception as e:
         logging.error(f"❌ Error matching CV {cv.get('cv_id', 'unknown')}: {e}")
@@ -279,62 +268,54 @@ async def match_cv(cv: dict, filtered_job_ids: List[int], session_id: str) -> di
         }
 
 
+async def stream_match_cv(cv: dict, filtered_job_ids: Optional[List[int]],
+                          preferences: Optional[Dict[str, List[str]]] = None,
+                          model: str = "gemini-2.5-flash") -> AsyncIterator[dict]:
+    """
+    Như match_cv nhưng trả kết quả dần dần (dùng cho /match/stream):
+      {"type": "candidates", "matched_jobs": [...]}  ngay sau retrieval + chấm điểm (chưa có why_match)
+      {"type": "why_match", "job_id", "why_match"} / {"type": "suggestion", ...}  khi LLM viết xong từng dòng
+      {"type": "done", "matched_jobs": [...], "suggestions": [...]}  kết quả đầy đủ (như match_cv)
+    Lỗi -> {"type": "error", "detail"}.
+    """
+    cv_id = cv.get("cv_id")
+    try:
+        scored, jobs = await retrieve_and_score(cv, filtered_job_ids, preferences)
+        yield {"type": "candidates", "cv_id": cv_id, "matched_jobs": [_matched_job(item) for item in scored]}
+        if filtered_job_ids and not scored:
+            yield {"type": "done", "cv_id": cv_id, "matched_jobs": [], "suggestions": _NO_FILTER_MATCH}
+            return
+
+        why, suggestions = {}, []
+        async for event in stream_explanations(cv, scored[:MATCH_EXPLAIN_TOP_N], jobs, model):
+            if event["type"] == "why_match":
+                why[event["job_id"]] = event["why_match"]
+            else:
+                suggestions.append({k: event[k] for k in ("skill_or_experience", "suggestion")})
+            yield event
+        yield {"type": "done", "cv_id": cv_id, "suggestions": suggestions,
+               "matched_jobs": [_matched_job(item, why.get(item["job_id"])) for item in scored]}
+    except Exception as e:
+        logging.error(f"❌ Error streaming match cho CV {cv_id}: {e}")
+        yield {"type": "error", "cv_id": cv_id, "detail": f"Failed to process CV: {e}"}
+
+
 # ======================================================
 # 🧾 Kiểm tra tính nhất quán job_id giữa SQLite và Chroma
 # ======================================================
 def verify_job_id_consistency(job_id: int) -> bool:
+    """Kiểm tra một job bằng reconciler (content_hash SQLite vs metadata Chroma). Toàn corpus: reconciler.reconcile()."""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT job_url, job_title, work_location, skills
-                FROM job_store 
-                WHERE id = ?
-            ''', (job_id,))
-            sqlite_job = cursor.fetchone()
-            if not sqlite_job:
-                logging.error(f"No job found in SQLite for job_id {job_id}")
-                return False
-
-            sqlite_data = dict(sqlite_job)
-            sqlite_data["job_id"] = job_id
-            logging.info(f"SQLite data for job_id {job_id}: {sqlite_data}")
-
-        vectorstore = get_vectorstore()
-        chroma_docs = vectorstore.get(where={"job_id": str(job_id)})
-        if not chroma_docs['ids']:
-            logging.error(f"No document found in Chroma for job_id {job_id}")
+        report = reconcile(job_ids=[job_id])
+        if report["sqlite"]["scanned"] == 0:
+            logging.error(f"No job found in SQLite for job_id {job_id}")
             return False
-
-        chroma_metadata = chroma_docs['metadatas'][0]
-        chroma_data = {
-            "job_id": chroma_metadata.get("job_id", None),
-            "job_url": chroma_metadata.get("job_url", ""),
-            "job_title": chroma_metadata.get("job_title", ""),
-            "work_location": chroma_metadata.get("work_location", ""),
-            "skills": chroma_metadata.get("skills", "")
-        }
-        logging.info(f"Chroma data for job_id {job_id}: {chroma_data}")
-
-        fields_to_compare = ["job_url", "job_title", "work_location", "skills"]
-        is_consistent = True
-        for field in fields_to_compare:
-            sqlite_value = sqlite_data[field]
-            chroma_value = chroma_data[field]
-            if field == "skills" and sqlite_value:
-                try:
-                    sqlite_value = json.dumps(json.loads(sqlite_value), ensure_ascii=False)
-                except json.JSONDecodeError:
-                    pass
-            if sqlite_value != chroma_value:
-                logging.error(f"Mismatch in {field} for job_id {job_id}: SQLite={sqlite_value}, Chroma={chroma_value}")
-                is_consistent = False
-
-        if is_consistent:
-            logging.info(f"✅ job_id {job_id} is consistent between SQLite and Chroma")
-        else:
-            logging.warning(f"⚠️ job_id {job_id} is NOT consistent between SQLite and Chroma")
-        return is_consistent
+        problems = {category: count for category, count in report["counts"].items() if count}
+        if problems:
+            logging.warning(f"⚠️ job_id {job_id} is NOT consistent between SQLite and Chroma: {problems}")
+            return False
+        logging.info(f"✅ job_id {job_id} is consistent between SQLite and Chroma")
+        return True
 
     except Exception as e:
         logging.error(f"Error verifying job_id {job_id}: {e}")
@@ -351,7 +332,7 @@ def test_job_id(job_id: int):
 
 
 async def test_match_cv(cv_id: int, session_id: str = "test_session"):
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT cv_info_json FROM cv_store WHERE id = ?', (cv_id,))
         cv_row = cursor.fetchone()
@@ -369,10 +350,9 @@ async def test_match_cv(cv_id: int, session_id: str = "test_session"):
     matched_jobs = result.get("matched_jobs", [])
     if matched_jobs:
         print("\nKiểm tra tính nhất quán của các job_id trong matched_jobs:")
-        for job in matched_jobs:
-            jid = _to_int_job_id(job.get("job_id"))
-            if jid:
-                test_job_id(jid)
+        job_ids = [jid for jid in (_to_int_job_id(job.get("job_id")) for job in matched_jobs) if jid]
+        report = reconcile(job_ids=job_ids)  # một lượt cho cả danh sách
+        print(json.dumps(report["counts"], ensure_ascii=False))
     else:
         print("\nKhông có công việc nào được khớp để kiểm tra.")
 
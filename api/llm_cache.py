@@ -0,0 +1,195 @@
+"""
+LLM Cache - Cache bền vững cho kết quả LLM (insights CV, gợi ý cải thiện, phân tích biểu đồ)
+
+Mỗi kết quả được lưu theo khoá (model, template, version, sha256(input đã render)) trong
+một file SQLite riêng (db/llm_cache.db, WAL), nên cache còn sau khi restart và dùng chung
+giữa các worker uvicorn. Cùng prompt -> cùng khoá: tải lại dashboard hay mở lại trang CV
+không tốn quota Gemini.
+
+- version: tăng khi sửa prompt / cách parse, entry của version cũ không còn được dùng và
+  bị evict dần;
+- TTL: mỗi entry có expires_at (mặc định LLM_CACHE_TTL_SECONDS, mỗi lời gọi có thể ghi đè);
+- số entry bị giới hạn bởi LLM_CACHE_MAX_ENTRIES: vượt ngưỡng thì xoá entry hết hạn trước,
+  sau đó entry lâu không dùng nhất (theo last_used, ghi theo lô - xem sqlite_cache);
+- metrics: hit/miss theo template của process + tổng số lần hit lưu trong bảng (mọi worker,
+  cập nhật theo lô).
+
+Chỉ kết quả hợp lệ được ghi: producer raise (lỗi API, JSON hỏng) thì không có gì được cache.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from sqlite_cache import SQLiteCacheStore
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(base_dir)
+_default_db_path = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(_default_db_path), "llm_cache.db"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def input_hash(inputs: Union[str, Dict, list]) -> str:
+    """sha256 của input đã render (prompt string, hoặc dict/list serialize ổn định)."""
+    if not isinstance(inputs, str):
+        inputs = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+
+
+class LLMCacheStore(SQLiteCacheStore):
+    """Bảng llm_cache trong SQLite: kết quả lưu dạng JSON."""
+
+    table = "llm_cache"
+    key_columns = ("model", "template", "version", "input_sha256")
+    expires_column = "expires_at"
+    hits_column = "hits"
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(db_path, max_entries)
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self._metrics_lock = threading.Lock()
+
+    def _create_schema(self, conn) -> None:
+        conn.execute('''CREATE TABLE IF NOT EXISTS llm_cache (
+            model TEXT NOT NULL,
+            template TEXT NOT NULL,
+            version TEXT NOT NULL,
+            input_sha256 TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            last_used INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model, template, version, input_sha256)
+        ) WITHOUT ROWID''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at)')
+
+    def _record(self, template: str, outcome: str) -> None:
+        with self._metrics_lock:
+            counters = self._metrics.setdefault(template, {"hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, model: str, template: str, version: str, key: str) -> Optional[Any]:
+        """Kết quả còn hạn của khoá; None nếu chưa có / đã hết hạn."""
+        self._ensure_schema()
+        with self._manager.connection(readonly=True) as conn:
+            row = conn.execute(
+                '''SELECT value FROM llm_cache
+                   WHERE model = ? AND template = ? AND version = ? AND input_sha256 = ? AND expires_at > ?''',
+                (model, template, version, key, int(time.time())),
+            ).fetchone()
+        if row is None:
+            self._record(template, "misses")
+            return None
+        # last_used / hits được gom và ghi theo lô (xem sqlite_cache), không ghi ở mỗi lần hit
+        self._record_touches([(model, template, version, key)])
+        self._record(template, "hits")
+        return json.loads(row["value"])
+
+    def put(self, model: str, template: str, version: str, key: str, value: Any,
+            ttl: Optional[int] = None) -> None:
+        """Ghi (hoặc ghi đè) kết quả với TTL (giây) rồi evict nếu vượt ngưỡng."""
+        self._ensure_schema()
+        now = int(time.time())
+        ttl = LLM_CACHE_TTL_SECONDS if ttl is None else ttl
+        with self._manager.connection() as conn:
+            exists = conn.execute(
+                'SELECT 1 FROM llm_cache WHERE model = ? AND template = ? AND version = ? AND input_sha256 = ?',
+                (model, template, version, key),
+            ).fetchone()
+            conn.execute(
+                '''INSERT OR REPLACE INTO llm_cache
+                   (model, template, version, input_sha256, value, created_at, expires_at, last_used, hits)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)''',
+                (model, template, version, key, json.dumps(value, ensure_ascii=False), now, now + ttl, now),
+            )
+            self._after_insert(conn, 0 if exists else 1)
+            conn.commit()
+
+    def stats(self) -> Dict:
+        """Số entry / tổng hit (mọi worker) theo template + hit/miss của process hiện tại."""
+        self._ensure_schema()
+        self.flush()
+        now = int(time.time())
+        with self._manager.connection(readonly=True) as conn:
+            rows = conn.execute(
+                '''SELECT template, COUNT(*) AS entries, SUM(expires_at <= ?) AS expired, SUM(hits) AS hits
+                   FROM llm_cache GROUP BY template''',
+                (now,),
+            ).fetchall()
+        with self._metrics_lock:
+            metrics = {template: dict(counters) for template, counters in self._metrics.items()}
+        templates = {}
+        for row in rows:
+            templates[row["template"]] = {"entries": row["entries"], "expired": row["expired"] or 0,
+                                          "stored_hits": row["hits"] or 0}
+        for template, counters in metrics.items():
+            lookups = counters["hits"] + counters["misses"]
+            templates.setdefault(template, {"entries": 0, "expired": 0, "stored_hits": 0})
+            templates[template].update(counters, hit_rate=round(counters["hits"] / lookups, 4) if lookups else None)
+        return {
+            "path": self.db_path,
+            "max_entries": self.max_entries,
+            "entries": sum(t["entries"] for t in templates.values()),
+            "templates": templates,
+        }
+
+    def clear(self, template: Optional[str] = None) -> int:
+        """Xoá toàn bộ cache (hoặc chỉ một template). Trả về số entry đã xoá."""
+        self._ensure_schema()
+        with self._manager.connection() as conn:
+            if template is None:
+                deleted = conn.execute('DELETE FROM llm_cache').rowcount
+            else:
+                deleted = conn.execute('DELETE FROM llm_cache WHERE template = ?', (template,)).rowcount
+            conn.commit()
+            self._entry_count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        return deleted
+
+
+_store: Optional[LLMCacheStore] = None
+_store_lock = threading.Lock()
+
+
+def get_llm_cache_store() -> LLMCacheStore:
+    """Store dùng chung cho cả process (singleton, tạo khi dùng lần đầu)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LLMCacheStore()
+    return _store
+
+
+async def cached_llm_call(template: str, version: str, model: str, inputs: Union[str, Dict, list],
+                          producer: Callable[[], Awaitable[Any]], ttl: Optional[int] = None) -> Any:
+    """
+    Kết quả của producer() cho input đã render, qua cache (model, template, version, hash(inputs)).
+
+    producer chỉ được gọi khi cache miss; giá trị trả về phải serialize được JSON. Lỗi của
+    cache (đọc / ghi) chỉ ghi log, request vẫn gọi thẳng LLM.
+    """
+    store = get_llm_cache_store()
+    key = input_hash(inputs)
+    try:
+        cached = await asyncio.to_thread(store.get, model, template, version, key)
+    except Exception as e:
+        logging.warning(f"⚠️ LLM cache lookup failed, calling LLM directly: {e}")
+        cached = None
+    if cached is not None:
+        logging.info(f"✅ LLM cache hit: {template} v{version} ({key[:12]})")
+        return cached
+
+    value = await producer()
+    try:
+        await asyncio.to_thread(store.put, model, template, version, key, value, ttl)
+    except Exception as e:
+        logging.warning(f"⚠️ Failed to write LLM result to cache: {e}")
+    return value
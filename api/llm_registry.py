@@ -0,0 +1,75 @@
+"""
+LLM Registry - Giữ lại client Gemini và các chain đã dựng, thay vì tạo mới mỗi request
+
+ChatGoogleGenerativeAI mở channel gRPC (keep-alive, tự pool kết nối) ngay khi khởi tạo,
+và client async khi được dùng lần đầu. Tạo instance mới cho mỗi request nghĩa là mỗi
+lần gọi Gemini lại dựng client + bắt tay TLS. Registry cache theo (loại, model, key):
+
+- get_chat_model(model, temperature): xoay vòng key như cũ (get_next_api_key), nhưng mỗi
+  key chỉ có một instance cho mỗi model/temperature;
+- get_or_build(name, model, api_key, builder): cache object bất kỳ dựng từ LLM của key đó
+  (prompt, chain...). Request chỉ còn truyền input của lần gọi.
+
+Client async của gRPC gắn với event loop tạo ra nó, nên entry được dựng lại khi gọi từ
+event loop khác (vd. script gọi asyncio.run nhiều lần). Số entry bị chặn bởi số key × model.
+"""
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from api_key_manager import get_next_api_key
+
+T = TypeVar("T")
+
+_registry: Dict[Tuple, Tuple[object, Optional[asyncio.AbstractEventLoop]]] = {}
+_registry_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0}
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def get_or_build(name: str, model: str, api_key: str, builder: Callable[[], T]) -> T:
+    """Object `name` của (model, api_key): dựng một lần bằng builder(), các lần sau dùng lại."""
+    key = (name, model, api_key)
+    loop = _running_loop()
+    with _registry_lock:
+        entry = _registry.get(key)
+        # Entry dựng ngoài event loop (loop=None) dùng được ở mọi loop cho tới khi client async được tạo
+        if entry is not None and (entry[1] is None or entry[1] is loop):
+            if entry[1] is None and loop is not None:
+                _registry[key] = (entry[0], loop)
+            _stats["hits"] += 1
+            return entry[0]
+    obj = builder()
+    with _registry_lock:
+        _registry[key] = (obj, loop)
+        _stats["builds"] += 1
+    logging.info(f"🧩 Registry: dựng {name} cho {model} (key ...{api_key[-4:]})")
+    return obj
+
+
+def get_chat_model(model: str = "gemini-2.5-flash", temperature: Optional[float] = None,
+                   api_key: Optional[str] = None) -> ChatGoogleGenerativeAI:
+    """ChatGoogleGenerativeAI dùng chung cho key kế tiếp trong vòng xoay (hoặc api_key chỉ định)."""
+    api_key = api_key or get_next_api_key()
+    kwargs = {} if temperature is None else {"temperature": temperature}
+    return get_or_build(f"chat(t={temperature})", model, api_key,
+                        lambda: ChatGoogleGenerativeAI(model=model, google_api_key=api_key, **kwargs))
+
+
+def registry_stats() -> Dict:
+    with _registry_lock:
+        return {"entries": len(_registry), **_stats}
+
+
+def clear_registry() -> None:
+    with _registry_lock:
+        _registry.clear()
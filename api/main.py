@@ -1,24 +1,38 @@
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query
+from typing import List, Optional, Dict, Any, Tuple
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic_models import (
     DocumentInfo, DeleteFileRequest, MatchInput, MatchResponse, JobDetails, MatchedJob,
     CVInsightsResponse, CVImproveResponse, ImprovementSuggestion,
-    JobSearchInput, JobSearchResponse, JobSearchResult,
+    JobSearchInput, JobSearchResponse, JobSearchResult, SimilarJob, SimilarJobsResponse,
     ApplyJobInput, ApplicationResponse, ApplicationItem, ApplicationsResponse,
     DocumentPreviewResponse, SuggestQuestionsInput, SuggestQuestionsResponse, QuestionSuggestion
 )
-from langchain_utils import match_cv
-from db_utils import (
-    get_db_connection, insert_cv_record, insert_match_log, get_match_history, get_cached_matches,
-    get_all_cvs, delete_cv_record, get_filtered_jobs,
+from langchain_utils import match_cv, stream_match_cv
+from hybrid_retrieval import preferences_from_filters
+from match_scoring import cv_experience_years
+from reconciler import start_reconcile, get_reconcile_status
+from llm_cache import cached_llm_call, get_llm_cache_store
+from db_utils import close_all_connections, match_filter_hash
+from async_db_utils import (
+    insert_cv_record, insert_match_log, get_match_history,
+    delete_cv_record, get_filtered_jobs,
     insert_application, get_applications_by_cv, check_application_exists,
-    save_cv_insights, get_cv_insights, save_document_preview, get_document_preview
+    save_cv_insights, get_cv_insights, save_document_preview, get_document_preview,
+    get_cv_info, get_cv_record, get_cv_file, list_cv_records, list_cvs_page, cv_exists, job_exists,
+    get_job_title, get_jobs_by_ids, get_jobs_page, search_jobs, compute_jobs_analytics, get_skill_overlap,
+    purge_expired_match_logs, get_match_cache, get_corpus_version,
+    shutdown_db_executor
+)
+from chroma_utils import (
+    preload_jobs as preload_jobs_to_chroma, index_cv_extracts, delete_cv_from_chroma, migrate_legacy_collection,
+    find_similar_jobs
 )
-from chroma_utils import preload_jobs as preload_jobs_to_chroma, index_cv_extracts, delete_cv_from_chroma
 from ai_analysis import (
     analyze_cv_insights, generate_cv_improvements, generate_why_match, generate_question_suggestions
 )
+import asyncio
 import pdfplumber
 import google.generativeai as genai
 import re
@@ -61,13 +75,22 @@ os.makedirs(db_path, exist_ok=True)
 @app.on_event("startup")
 async def startup_event():
     try:
+        # Store cũ (job + CV chung một collection) -> tách sang collection jobs/cvs
+        # Chroma / ingest đều blocking: chạy trên thread để không chặn event loop khi khởi động
+        await asyncio.to_thread(migrate_legacy_collection)
         logging.info("🔄 Preloading jobs into Chroma and SQLite...")
-        preload_jobs_to_chroma(data_path, batch_size=500)
-        logging.info("✅ Preloading completed")
+        stats = await asyncio.to_thread(preload_jobs_to_chroma, data_path, batch_size=500)
+        logging.info(f"✅ Preloading completed: {stats}")
+        await purge_expired_match_logs()
     except Exception as e:
         logging.error(f"Error during startup preload: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_db_executor()
+    close_all_connections()
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Trích xuất văn bản từ file PDF."""
     if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
@@ -236,67 +259,107 @@ def parse_cv_input_string(cv_input: str) -> dict:
         raise HTTPException(status_code=400, detail=f"Failed to parse cv_input string: {str(e)}")
 
 
-def normalize_deadline(val: str) -> str:
-    """Đưa deadline bất kỳ (vd 09/10/2025, 2025/10/09, 09-10-2025, '04/10/2025', ...) về YYYY-MM-DD.
-    Không parse được thì trả về chuỗi rỗng."""
-    if not val:
-        return ""
-    s = str(val).strip()
-    if not s or s.lower() in {"n/a", "none", "null", "không xác định"}:
-        return ""
-    # Thử parse "dayfirst" để nhận dạng định dạng Việt Nam dd/mm/yyyy
-    try:
-        dt = _dt_parse(s, dayfirst=True, fuzzy=True)
-        return dt.strftime("%Y-%m-%d")
-    except Exception:
-        pass
-    # Thử vài regex phổ biến nếu cần
-    import re
-    m = re.match(r"^(\d{2})[/-](\d{2})[/-](\d{4})$", s)
-    if m:
-        d, mth, y = m.groups()
-        try:
-            dt = datetime(int(y), int(mth), int(d))
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
-            return ""
-    return ""
-
-def get_job_details(job_ids: List[int]) -> List[JobDetails]:
-    """Lấy chi tiết công việc từ job_store dựa trên job_id (chuẩn hoá deadline -> YYYY-MM-DD)."""
+async def get_job_details(job_ids: List[int]) -> List[JobDetails]:
+    """Lấy chi tiết công việc từ job_store dựa trên job_id (deadline lấy từ cột deadline_date YYYY-MM-DD)."""
     if not job_ids or not all(isinstance(job_id, int) for job_id in job_ids):
         raise HTTPException(status_code=400, detail="job_ids must be a non-empty list of integers")
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            batch_size = 100
-            jobs: List[JobDetails] = []
-            for i in range(0, len(job_ids), batch_size):
-                batch_ids = job_ids[i:i + batch_size]
-                placeholders = ",".join(["?"] * len(batch_ids))
-                cursor.execute(f"SELECT * FROM job_store WHERE id IN ({placeholders})", batch_ids)
-                rows = cursor.fetchall()
-                for row in rows:
-                    rd = dict(row)
-
-                    # 🔧 Chuẩn hoá deadline về YYYY-MM-DD để hợp schema Pydantic
-                    if "deadline" in rd:
-                        rd["deadline"] = normalize_deadline(rd["deadline"])
-
-                    # (Tùy chọn an toàn) Nếu skills lưu dạng JSON string, có thể parse:
-                    # if isinstance(rd.get("skills"), str) and rd["skills"].strip().startswith("["):
-                    #     try:
-                    #         rd["skills"] = json.loads(rd["skills"])
-                    #     except Exception:
-                    #         pass
-
-                    jobs.append(JobDetails(**rd))
-            return jobs
+        rows = await get_jobs_by_ids(job_ids)
+        jobs: List[JobDetails] = []
+        for rd in rows:
+            # 🔧 deadline_date đã được parse về YYYY-MM-DD lúc ingest (hợp schema Pydantic)
+            rd["deadline"] = rd.get("deadline_date") or ""
+
+            # (Tùy chọn an toàn) Nếu skills lưu dạng JSON string, có thể parse:
+            # if isinstance(rd.get("skills"), str) and rd["skills"].strip().startswith("["):
+            #     try:
+            #         rd["skills"] = json.loads(rd["skills"])
+            #     except Exception:
+            #         pass
+
+            jobs.append(JobDetails(**rd))
+        return jobs
     except Exception as e:
         logging.error(f"Error fetching job details for IDs {job_ids}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch job details: {str(e)}")
 
 
+# ===== MATCH CACHE REFRESH (stale-while-revalidate) =====
+# Khoá (cv_id, filter_hash, model) -> task đang refresh, tránh chạy RAG trùng cho cùng một khoá
+_match_refresh_tasks: Dict[tuple, asyncio.Task] = {}
+
+def _to_int_job_id(x) -> Optional[int]:
+    """Nhận int, '716', 'job_716'... -> int; invalid -> None"""
+    if isinstance(x, int):
+        return x
+    if isinstance(x, str):
+        m = re.search(r"\d+", x.strip())
+        if m:
+            try:
+                return int(m.group())
+            except Exception:
+                return None
+    return None
+
+def _normalize_match_score(ms) -> float:
+    """match_score có thể là 0..1 hoặc phần trăm >1 -> đưa về 0..1"""
+    try:
+        ms = float(ms)
+        if ms > 1.0:          # ví dụ 62 -> 0.62
+            ms = ms / 100.0
+        return max(0.0, min(1.0, ms))
+    except Exception:
+        return 0.0
+
+def _compact_match_results(matched_jobs: List[Dict]) -> List[Dict]:
+    """Kết quả thô của match_cv -> dạng gọn để lưu match cache."""
+    compact = []
+    for job in matched_jobs or []:
+        jid_int = _to_int_job_id(job.get("job_id")) if isinstance(job, dict) else None
+        if jid_int is None:
+            continue
+        compact.append({
+            "job_id": jid_int,
+            "match_score": _normalize_match_score(job.get("match_score", 0.0)),
+            "matched_skills": job.get("matched_skills") or [],
+            "matched_aspirations": job.get("matched_aspirations") or [],
+            "matched_experience": job.get("matched_experience") or [],
+            "matched_education": job.get("matched_education") or [],
+            "why_match": job.get("why_match")
+        })
+    return compact
+
+async def _refresh_match_cache(key: tuple, cv_input: Dict, filters: Dict, session_id: str) -> None:
+    cv_id, filter_hash, model_name = key
+    try:
+        refresh_start = time.time()
+        corpus_version = await get_corpus_version()
+        filtered_job_ids = await get_filtered_jobs(filters)
+        result = await match_cv(cv_input, filtered_job_ids, session_id, preferences_from_filters(filters),
+                                model=model_name)
+        matched = _compact_match_results(result.get("matched_jobs", []) if isinstance(result, dict) else [])
+        if matched:
+            await insert_match_log(session_id, cv_id, matched, filter_hash, model_name, corpus_version)
+            logging.info(f"🔄 Refreshed match cache cho CV {cv_id} ({len(matched)} jobs, {time.time() - refresh_start:.2f}s)")
+    except Exception as e:
+        logging.error(f"❌ Lỗi refresh match cache cho CV {cv_id}: {str(e)}")
+    finally:
+        _match_refresh_tasks.pop(key, None)
+
+def _schedule_match_refresh(key: tuple, cv_input: Dict, filters: Dict, session_id: str) -> None:
+    """Chạy refresh nền cho entry cache đã cũ (bỏ qua nếu khoá này đang được refresh)."""
+    if key in _match_refresh_tasks:
+        logging.info(f"⏳ Match cache {key} đang được refresh, bỏ qua")
+        return
+    _match_refresh_tasks[key] = asyncio.create_task(_refresh_match_cache(key, cv_input, filters, session_id))
+
+def _experience_summary(experience: List[Dict]) -> str:
+    """Tóm tắt experience để index vào Chroma"""
+    return "\n".join([
+        f"{exp.get('title', 'Unknown')} at {exp.get('company', 'Unknown')} ({exp.get('start_date', '')}-{exp.get('end_date', '')}): {exp.get('description', '')}"
+        for exp in experience
+    ]) if experience else "No experience provided"
+
 def normalize_date(date_str: str) -> str:
     """Chuẩn hóa định dạng ngày thành YYYY-MM-DD hoặc giữ 'Present'."""
     if not date_str or date_str.lower() == "present":
@@ -338,20 +401,16 @@ async def upload_cv(file: UploadFile = File(...)):
         experience = cv_info.get("experience", [])
         if not skills and not aspirations:
             raise HTTPException(status_code=400, detail="No skills or career objective found")
-        # Tạo tóm tắt experience để index
-        experience_summary = "\n".join([
-            f"{exp.get('title', 'Unknown')} at {exp.get('company', 'Unknown')} ({exp.get('start_date', '')}-{exp.get('end_date', '')}): {exp.get('description', '')}"
-            for exp in experience
-        ]) if experience else "No experience provided"
+        experience_summary = _experience_summary(experience)
 
         # Insert CV record with file_data
-        cv_id = insert_cv_record(file.filename, cv_info, file_data)
+        cv_id = await insert_cv_record(file.filename, cv_info, file_data)
         if not cv_id:
             raise HTTPException(status_code=500, detail="Failed to generate cv_id from database")
         try:
             await index_cv_extracts(skills, aspirations, experience_summary, education, cv_id)
         except Exception as e:
-            delete_cv_record(cv_id)
+            await delete_cv_record(cv_id)
             raise HTTPException(status_code=500, detail=f"Failed to index CV to Chroma: {str(e)}")
         logging.info(f"Uploaded and indexed CV {cv_id}: {file.filename}")
         return {
@@ -366,126 +425,208 @@ async def upload_cv(file: UploadFile = File(...)):
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)
 
+
+def _clean_match_filters(filters: Dict) -> Dict:
+    valid_keys = {"job_type", "work_location", "experience", "education", "skills", "deadline_after"}
+    cleaned_filters = {k: v for k, v in filters.items() if k in valid_keys}
+    if cleaned_filters != filters:
+        logging.warning(f"Bộ lọc không hợp lệ được bỏ qua: {filters}. Sử dụng: {cleaned_filters}")
+    return cleaned_filters
+
+
+async def _load_match_cv(input: MatchInput) -> Tuple[Any, Dict]:
+    """CV cho /match và /match/stream: theo cv_id, cv_input (text, lưu thành CV mới) hoặc CV mới nhất."""
+    cv_start = time.time()
+    if input.cv_id:
+        cv_id = input.cv_id
+        if not isinstance(cv_id, int):
+            raise HTTPException(status_code=400, detail="cv_id must be an integer")
+        cv_info = await get_cv_info(input.cv_id)
+        if cv_info is None:
+            raise HTTPException(status_code=404, detail=f"CV với ID {input.cv_id} không tìm thấy")
+    elif input.cv_input:
+        cv_id = input.cv_id or str(uuid.uuid4())
+        cv_info = parse_cv_input_string(input.cv_input)
+        cv_id = await insert_cv_record("manual_input", cv_info)
+        await index_cv_extracts(cv_info["skills"], cv_info["career_objective"],
+                                _experience_summary(cv_info.get("experience", [])), cv_info["education"], cv_id)
+    else:
+        cvs, _ = await list_cvs_page(limit=1, fields="id,cv_info")
+        if not cvs:
+            raise HTTPException(status_code=404, detail="Không tìm thấy CV nào")
+        cv = cvs[0]
+        cv_id = cv["id"]
+        cv_info = cv["cv_info"]
+    logging.info(f"✅ Lấy CV {cv_id} thành công ({time.time() - cv_start:.2f}s)")
+    return cv_id, cv_info
+
+
+def _build_match_cv_input(cv_info: Dict, cv_id) -> Dict:
+    """Chuẩn hoá education/experience của cv_info (tại chỗ) và tạo input cho match_cv."""
+    skills = cv_info.get("skills", [])
+    aspirations = cv_info.get("career_objective", "")
+    education = cv_info.get("education", [])
+    experience = cv_info.get("experience", [])
+
+    for edu in education:
+        try:
+            edu["start_date"] = normalize_date(edu.get("start_date", ""))
+            edu["end_date"] = normalize_date(edu.get("end_date", ""))
+            edu["school"] = edu.get("school") or "Unknown"
+            edu["degree"] = edu.get("degree") or "Unknown"
+            edu["major"] = edu.get("major") or "Unknown"
+        except Exception as e:
+            logging.warning(f"Error normalizing education: {str(e)}")
+            edu["start_date"] = ""
+            edu["end_date"] = ""
+            edu["school"] = "Unknown"
+            edu["degree"] = "Unknown"
+            edu["major"] = "Unknown"
+
+    for exp in experience:
+        try:
+            exp["start_date"] = normalize_date(exp.get("start_date", ""))
+            exp["end_date"] = normalize_date(exp.get("end_date", ""))
+            exp["company"] = exp.get("company") or "Unknown"
+            exp["title"] = exp.get("title") or "Unknown"
+            exp["description"] = exp.get("description") or "No description provided"
+        except Exception as e:
+            logging.warning(f"Error normalizing experience: {str(e)}")
+            exp["start_date"] = ""
+            exp["end_date"] = ""
+            exp["company"] = "Unknown"
+            exp["title"] = "Unknown"
+            exp["description"] = "No description provided"
+
+    experience_summary = "\n".join([
+        f"Project: {exp['title']} - {exp['description'][:200] + '...' if len(exp['description']) > 200 else exp['description']}"
+        for exp in experience
+    ]) if experience else "No experience provided"
+    education_summary = "\n".join([
+        f"Degree: {edu['degree']} at {edu['school']} ({edu['start_date']}-{edu['end_date']})"
+        for edu in education
+    ]) if education else "No education provided"
+    aspirations_summary = aspirations if aspirations else "No career objective provided"
+
+    cv_input = {
+        "skills": skills,
+        "aspirations": aspirations_summary,
+        "experience": experience_summary,
+        "education": education_summary,
+        "experience_years": cv_experience_years(experience),  # cho match_scoring
+        "cv_id": cv_id
+    }
+    return cv_input
+
+
+async def _enrich_matched_jobs(matched_jobs_all: List[Dict]) -> List[MatchedJob]:
+    """Kết quả match (job_id + điểm) -> MatchedJob đầy đủ chi tiết từ job_store, giữ thứ tự."""
+    # Post-processing: chuẩn hóa job_id -> int, enrich từ DB
+    # 1) Chuẩn hóa danh sách job_id cho TẤT CẢ jobs
+    job_ids: List[int] = []
+    for job in matched_jobs_all:
+        jid_int = _to_int_job_id(job.get("job_id"))
+        if jid_int is None:
+            logging.warning(f"Invalid job_id skipped: {job.get('job_id')}")
+            continue
+        job_ids.append(jid_int)
+
+    # 2) Lấy chi tiết từ DB
+    if not job_ids:
+        job_details = []
+    else:
+        job_details = await get_job_details(job_ids)
+
+    # 3) Map chi tiết theo INT key (quan trọng)
+    job_details_dict = {int(job.job_id): job for job in job_details if getattr(job, "job_id", None) is not None}
+
+    # 4) Enrich TẤT CẢ jobs đã chấm điểm (MATCH_TOP_K jobs)
+    enriched_all_jobs = []
+    for job in matched_jobs_all:
+        jid_int = _to_int_job_id(job.get("job_id"))
+        if jid_int is None:
+            continue
+
+        detail = job_details_dict.get(jid_int)
+        if not detail:
+            logging.warning(f"Job ID {job.get('job_id')} not found in job_details")
+            continue
+
+        ms = _normalize_match_score(job.get("match_score", 0.0))
+
+        enriched_all_jobs.append(
+            MatchedJob(
+                job_id=str(jid_int),
+                job_title=job.get("job_title") or getattr(detail, "job_title", ""),
+                job_url=(job.get("job_url") or getattr(detail, "job_url", "")),
+                match_score=ms,
+                matched_skills=job.get("matched_skills") or [],
+                matched_aspirations=job.get("matched_aspirations") or [],
+                matched_experience=job.get("matched_experience") or [],
+                matched_education=job.get("matched_education") or [],
+                work_location=getattr(detail, "work_location", None),
+                salary=getattr(detail, "salary", None),
+                deadline=getattr(detail, "deadline", None),
+                benefits=getattr(detail, "benefits", None),
+                job_type=getattr(detail, "work_type", None),
+                experience_required=getattr(detail, "experience", None),
+                education_required=getattr(detail, "education", None),
+                company_name=getattr(detail, "name", None),
+                skills=getattr(detail, "skills", None),
+                why_match=job.get("why_match", None),  # AI-generated reason
+                job_description=getattr(detail, "job_description", None),
+            )
+        )
+    return enriched_all_jobs
+
+
 @app.post("/match", response_model=MatchResponse)
 async def match_cv_endpoint(input: MatchInput, request: Request):
     """Khớp CV với công việc, sử dụng lọc trước và post-processing."""
     start_time = time.time()
 
-    valid_keys = {"job_type", "work_location", "experience", "education", "skills", "deadline_after"}
-    cleaned_filters = {k: v for k, v in input.filters.items() if k in valid_keys}
-    if cleaned_filters != input.filters:
-        logging.warning(f"Bộ lọc không hợp lệ được bỏ qua: {input.filters}. Sử dụng: {cleaned_filters}")
+    cleaned_filters = _clean_match_filters(input.filters)
 
     session_id = input.session_id or str(uuid.uuid4())
     model_name = input.model.value
     cv_id = None
 
     try:
-        # Lấy CV
-        cv_start = time.time()
-        if input.cv_id:
-            cv_id = input.cv_id
-            if not isinstance(cv_id, int):
-                raise HTTPException(status_code=400, detail="cv_id must be an integer")
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, filename, cv_info_json FROM cv_store WHERE id = ?", (input.cv_id,))
-                cv = cursor.fetchone()
-                if not cv:
-                    raise HTTPException(status_code=404, detail=f"CV với ID {input.cv_id} không tìm thấy")
-                cv_info = json.loads(cv["cv_info_json"])
-        elif input.cv_input:
-            cv_id = input.cv_id or str(uuid.uuid4())
-            cv_info = parse_cv_input_string(input.cv_input)
-            cv_id = insert_cv_record("manual_input", cv_info)
-            await index_cv_extracts(cv_info["skills"], cv_info["career_objective"], cv_info["education"], cv_id)
-        else:
-            cvs = get_all_cvs()
-            if not cvs:
-                raise HTTPException(status_code=404, detail="Không tìm thấy CV nào")
-            cv = cvs[0]
-            cv_id = cv["id"]
-            cv_info = json.loads(cv["cv_info_json"])
-        logging.info(f"✅ Lấy CV {cv_id} thành công ({time.time() - cv_start:.2f}s)")
-
-        # Chuẩn hóa education và experience
-        input_start = time.time()
+        cv_id, cv_info = await _load_match_cv(input)
+        cv_input = _build_match_cv_input(cv_info, cv_id)
         skills = cv_info.get("skills", [])
         aspirations = cv_info.get("career_objective", "")
         education = cv_info.get("education", [])
         experience = cv_info.get("experience", [])
 
-        for edu in education:
-            try:
-                edu["start_date"] = normalize_date(edu.get("start_date", ""))
-                edu["end_date"] = normalize_date(edu.get("end_date", ""))
-                edu["school"] = edu.get("school") or "Unknown"
-                edu["degree"] = edu.get("degree") or "Unknown"
-                edu["major"] = edu.get("major") or "Unknown"
-            except Exception as e:
-                logging.warning(f"Error normalizing education: {str(e)}")
-                edu["start_date"] = ""
-                edu["end_date"] = ""
-                edu["school"] = "Unknown"
-                edu["degree"] = "Unknown"
-                edu["major"] = "Unknown"
-
-        for exp in experience:
-            try:
-                exp["start_date"] = normalize_date(exp.get("start_date", ""))
-                exp["end_date"] = normalize_date(exp.get("end_date", ""))
-                exp["company"] = exp.get("company") or "Unknown"
-                exp["title"] = exp.get("title") or "Unknown"
-                exp["description"] = exp.get("description") or "No description provided"
-            except Exception as e:
-                logging.warning(f"Error normalizing experience: {str(e)}")
-                exp["start_date"] = ""
-                exp["end_date"] = ""
-                exp["company"] = "Unknown"
-                exp["title"] = "Unknown"
-                exp["description"] = "No description provided"
-
-
-
-        experience_summary = "\n".join([
-            f"Project: {exp['title']} - {exp['description'][:200] + '...' if len(exp['description']) > 200 else exp['description']}"
-            for exp in experience
-        ]) if experience else "No experience provided"
-        education_summary = "\n".join([
-            f"Degree: {edu['degree']} at {edu['school']} ({edu['start_date']}-{edu['end_date']})"
-            for edu in education
-        ]) if education else "No education provided"
-        aspirations_summary = aspirations if aspirations else "No career objective provided"
-
-        cv_input = {
-            "skills": skills,
-            "aspirations": aspirations_summary,
-            "experience": experience_summary,
-            "education": education_summary,
-            "cv_id": cv_id
-        }
+        # Kiểm tra cache trước: khoá (cv_id, bộ lọc đã chuẩn hoá, model), stale-while-revalidate
+        filter_hash = match_filter_hash(cleaned_filters)
+        cache_key = (cv_id, filter_hash, model_name)
+        cache_entry = await get_match_cache(cv_id, filter_hash, model_name)
 
-        # Lấy filtered_job_ids
-        filtered_job_ids = get_filtered_jobs(cleaned_filters)
-        suggestions = []
-        if filtered_job_ids is None:
-            suggestions = [{"skill_or_experience": "N/A", "suggestion": "No filters applied or no jobs matched, showing best matches from all jobs."}]
+        if cache_entry:
+            logging.info(f"🚀 Sử dụng cached matches cho CV {cv_id} (skip RAG, stale={cache_entry['stale']})")
+            matched_jobs_all = cache_entry["matched_jobs"]
+            suggestions = []
+            if cache_entry["stale"]:
+                _schedule_match_refresh(cache_key, cv_input, cleaned_filters, session_id)
         else:
-            logging.info(f"✅ Lọc được {len(filtered_job_ids)} jobs")
+            corpus_version = await get_corpus_version()
 
-        # Kiểm tra cache trước
-        cached_jobs = get_cached_matches(cv_id)
-
-        if cached_jobs and not cleaned_filters:
-            # Có cache và không có filters → Dùng cache
-            logging.info(f"🚀 Sử dụng cached matches cho CV {cv_id} (skip RAG)")
-            matched_jobs_all = cached_jobs
+            # Lấy filtered_job_ids
+            filtered_job_ids = await get_filtered_jobs(cleaned_filters)
             suggestions = []
-        else:
+            if filtered_job_ids is None:
+                suggestions = [{"skill_or_experience": "N/A", "suggestion": "No filters applied or no jobs matched, showing best matches from all jobs."}]
+            else:
+                logging.info(f"✅ Lọc được {len(filtered_job_ids)} jobs")
+
             # Chạy RAG với match_cv
             try:
                 invoke_start = time.time()
-                result = await match_cv(cv_input, filtered_job_ids, session_id)
+                # Địa điểm / loại hình trong bộ lọc còn là ưu tiên mềm khi xếp hạng (kể cả khi lọc không ra job)
+                result = await match_cv(cv_input, filtered_job_ids, session_id,
+                                        preferences_from_filters(cleaned_filters), model=model_name)
                 logging.info(f"✅ Match CV hoàn tất ({time.time() - invoke_start:.2f}s)")
 
                 if not result or not isinstance(result, dict):
@@ -534,114 +675,25 @@ async def match_cv_endpoint(input: MatchInput, request: Request):
             logging.error(f"suggestions không phải danh sách: {suggestions}")
             suggestions = []
 
-        # Post-processing: chuẩn hóa job_id -> int, enrich từ DB
-        import re
-        def _to_int_job_id(x):
-            """Nhận int, '716', 'job_716'... -> int; invalid -> None"""
-            if isinstance(x, int):
-                return x
-            if isinstance(x, str):
-                m = re.search(r"\d+", x.strip())
-                if m:
-                    try:
-                        return int(m.group())
-                    except Exception:
-                        return None
-            return None
-
-        # 1) Chuẩn hóa danh sách job_id cho TẤT CẢ jobs
-        job_ids: List[int] = []
-        for job in matched_jobs_all:
-            jid_int = _to_int_job_id(job.get("job_id"))
-            if jid_int is None:
-                logging.warning(f"Invalid job_id skipped: {job.get('job_id')}")
-                continue
-            job_ids.append(jid_int)
-
-        # 2) Lấy chi tiết từ DB
-        if not job_ids:
-            job_details = []
-        else:
-            job_details = get_job_details(job_ids)
-
-        # 3) Map chi tiết theo INT key (quan trọng)
-        job_details_dict = {int(job.job_id): job for job in job_details if getattr(job, "job_id", None) is not None}
-
-        # 4) Enrich TẤT CẢ jobs (lên đến 20 jobs)
-        enriched_all_jobs = []
-        for job in matched_jobs_all:
-            jid_int = _to_int_job_id(job.get("job_id"))
-            if jid_int is None:
-                continue
-
-            detail = job_details_dict.get(jid_int)
-            if not detail:
-                logging.warning(f"Job ID {job.get('job_id')} not found in job_details")
-                continue
-
-            # match_score có thể là 0..1 hoặc phần trăm >1 -> đưa về 0..1
-            ms = job.get("match_score", 0.0)
-            try:
-                ms = float(ms)
-                if ms > 1.0:          # ví dụ 62 -> 0.62
-                    ms = ms / 100.0
-                ms = max(0.0, min(1.0, ms))
-            except Exception:
-                ms = 0.0
-
-            enriched_all_jobs.append(
-                MatchedJob(
-                    job_id=str(jid_int),
-                    job_title=job.get("job_title") or getattr(detail, "job_title", ""),
-                    job_url=(job.get("job_url") or getattr(detail, "job_url", "")),
-                    match_score=ms,
-                    matched_skills=job.get("matched_skills") or [],
-                    matched_aspirations=job.get("matched_aspirations") or [],
-                    matched_experience=job.get("matched_experience") or [],
-                    matched_education=job.get("matched_education") or [],
-                    work_location=getattr(detail, "work_location", None),
-                    salary=getattr(detail, "salary", None),
-                    deadline=getattr(detail, "deadline", None),
-                    benefits=getattr(detail, "benefits", None),
-                    job_type=getattr(detail, "work_type", None),
-                    experience_required=getattr(detail, "experience", None),
-                    education_required=getattr(detail, "education", None),
-                    company_name=getattr(detail, "name", None),
-                    skills=getattr(detail, "skills", None),
-                    why_match=job.get("why_match", None),  # AI-generated reason
-                    job_description=getattr(detail, "job_description", None),
-                )
-            )
+        enriched_all_jobs = await _enrich_matched_jobs(matched_jobs_all)
 
-        # 5) Lưu TẤT CẢ jobs vào cache (20 jobs)
+        # 5) Lưu TẤT CẢ jobs vào cache (MATCH_TOP_K jobs) - chỉ kết quả match, chi tiết job hydrate lại lúc đọc
         safe_all_jobs = [
             {
-                "job_id": job.job_id,
-                "job_title": job.job_title,
-                "job_url": job.job_url,
+                "job_id": int(job.job_id),
                 "match_score": job.match_score,
                 "matched_skills": job.matched_skills,
                 "matched_aspirations": job.matched_aspirations,
                 "matched_experience": job.matched_experience,
                 "matched_education": job.matched_education,
-                "work_location": job.work_location,
-                "salary": job.salary,
-                "deadline": job.deadline,
-                "benefits": job.benefits,
-                "job_type": job.job_type,
-                "experience_required": job.experience_required,
-                "education_required": job.education_required,
-                "company_name": job.company_name,
-                "skills": job.skills,
-                "why_match": job.why_match,
-                "job_description": job.job_description
+                "why_match": job.why_match
             }
             for job in enriched_all_jobs
         ]
 
-        # Lưu cache (20 jobs)
-        if not cached_jobs:  # Chỉ lưu nếu không dùng cache
-            insert_match_log(session_id, cv_id, safe_all_jobs)
+        # Lưu cache (MATCH_TOP_K jobs, đã xếp hạng bằng match_scoring)
+        if not cache_entry:  # Chỉ lưu nếu không dùng cache
+            await insert_match_log(session_id, cv_id, safe_all_jobs, filter_hash, model_name, corpus_version)
             logging.info(f"💾 Đã cache {len(safe_all_jobs)} jobs cho CV {cv_id}")
 
         # 6) Trả về TOP 5 jobs
@@ -684,27 +736,91 @@ async def match_cv_endpoint(input: MatchInput, request: Request):
         logging.error(f"Lỗi khi truy cập CV {cv_id if cv_id else 'chưa xác định'}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Không thể truy cập dữ liệu CV: {str(e)}")
     
+def _sse(event: str, data: Dict) -> str:
+    """Một event Server-Sent Events (data là JSON một dòng)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/match/stream")
+async def match_cv_stream_endpoint(input: MatchInput):
+    """
+    Bản stream (Server-Sent Events) của /match: kết quả hiện dần thay vì chờ cả lượt LLM.
+
+    - `candidates`: top 5 job đã chấm điểm tại chỗ (chi tiết đầy đủ, chưa có why_match), gửi
+      ngay sau retrieval — thời gian tới kết quả đầu tiên không phụ thuộc LLM;
+    - `why_match` ({job_id, why_match}) và `suggestion`: gửi ngay khi LLM viết xong từng dòng;
+    - `done`: top 5 hoàn chỉnh + suggestions (kết quả đã được lưu vào match cache);
+    - `error`: lỗi khi đang stream.
+    Cache hit (kể cả stale, refresh chạy nền như /match) -> `candidates` có why_match rồi `done`.
+    """
+    start_time = time.time()
+    cleaned_filters = _clean_match_filters(input.filters)
+    session_id = input.session_id or str(uuid.uuid4())
+    model_name = input.model.value
+
+    # Lỗi CV (404/400) trả về như /match, trước khi bắt đầu stream
+    cv_id, cv_info = await _load_match_cv(input)
+    cv_input = _build_match_cv_input(cv_info, cv_id)
+    filter_hash = match_filter_hash(cleaned_filters)
+    cache_entry = await get_match_cache(cv_id, filter_hash, model_name)
+
+    def payload(**data) -> Dict:
+        return {"cv_id": cv_id, "session_id": session_id, **data, "elapsed_s": round(time.time() - start_time, 3)}
+
+    async def events():
+        try:
+            if cache_entry:
+                logging.info(f"🚀 Stream match từ cache cho CV {cv_id} (stale={cache_entry['stale']})")
+                if cache_entry["stale"]:
+                    _schedule_match_refresh((cv_id, filter_hash, model_name), cv_input, cleaned_filters, session_id)
+                top_jobs = [job.model_dump(mode="json") for job in (await _enrich_matched_jobs(cache_entry["matched_jobs"]))[:5]]
+                yield _sse("candidates", payload(matched_jobs=top_jobs, cached=True))
+                yield _sse("done", payload(matched_jobs=top_jobs, suggestions=[], cached=True))
+                return
+
+            corpus_version = await get_corpus_version()
+            filtered_job_ids = await get_filtered_jobs(cleaned_filters)
+            async for event in stream_match_cv(cv_input, filtered_job_ids, preferences_from_filters(cleaned_filters),
+                                               model=model_name):
+                kind = event.pop("type")
+                if kind == "candidates":
+                    top_jobs = await _enrich_matched_jobs(event["matched_jobs"][:5])
+                    logging.info(f"⚡ Stream {len(top_jobs)} candidates cho CV {cv_id} ({time.time() - start_time:.2f}s)")
+                    yield _sse("candidates", payload(matched_jobs=[job.model_dump(mode="json") for job in top_jobs]))
+                elif kind in ("why_match", "suggestion"):
+                    yield _sse(kind, event)
+                elif kind == "done":
+                    matched = _compact_match_results(event["matched_jobs"])
+                    if matched:
+                        await insert_match_log(session_id, cv_id, matched, filter_hash, model_name, corpus_version)
+                    top_jobs = await _enrich_matched_jobs(event["matched_jobs"][:5])
+                    logging.info(f"✅ Stream match hoàn tất cho CV {cv_id} ({time.time() - start_time:.2f}s)")
+                    yield _sse("done", payload(matched_jobs=[job.model_dump(mode="json") for job in top_jobs],
+                                               suggestions=event["suggestions"]))
+                else:
+                    yield _sse("error", payload(detail=event.get("detail")))
+        except Exception as e:
+            logging.error(f"❌ Lỗi stream match cho CV {cv_id}: {e}")
+            yield _sse("error", payload(detail=str(e)))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get("/list-cvs", response_model=List[DocumentInfo])
-async def list_cvs(page: int = 1, page_size: int = 10):
-    """Liệt kê tất cả CV trong cv_store với phân trang."""
+async def list_cvs(response: Response, page: int = 1, page_size: int = 10, cursor: Optional[str] = None):
+    """
+    Liệt kê tất cả CV trong cv_store với phân trang.
+    Truyền `cursor` (header X-Next-Cursor của trang trước) để phân trang keyset thay cho `page`.
+    """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, filename, cv_info_json, upload_timestamp FROM cv_store ORDER BY upload_timestamp DESC LIMIT ? OFFSET ?",
-                (page_size, (page - 1) * page_size)
-            )
-            cvs = [
-                {
-                    "id": row["id"],
-                    "filename": row["filename"],
-                    "cv_info_json": row["cv_info_json"],
-                    "upload_timestamp": row["upload_timestamp"]
-                }
-                for row in cursor.fetchall()
-            ]
-            logging.info(f"Lấy được {len(cvs)} CV")
-            return [DocumentInfo(**cv) for cv in cvs]
+        cvs, next_cursor = await list_cv_records(page_size, (page - 1) * page_size, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        logging.info(f"Lấy được {len(cvs)} CV")
+        return [DocumentInfo(**cv) for cv in cvs]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Lỗi khi liệt kê CV: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Không thể liệt kê CV: {str(e)}")
@@ -715,12 +831,16 @@ async def delete_cv(request: DeleteFileRequest):
     if not isinstance(request.file_id, int):
         raise HTTPException(status_code=400, detail="file_id must be an integer")
     try:
-        deleted = delete_cv_record(request.file_id)
+        deleted = await delete_cv_record(request.file_id)
         if not deleted:
             raise HTTPException(status_code=404, detail=f"CV {request.file_id} không tìm thấy")
-        deleted_chroma = delete_cv_from_chroma(request.file_id)
+        # Chroma (SQLite bên dưới) là blocking: chạy trên thread
+        if not await asyncio.to_thread(delete_cv_from_chroma, request.file_id):
+            logging.info(f"CV {request.file_id} không có vector trong Chroma")
         logging.info(f"Đã xóa CV {request.file_id} khỏi cv_store và Chroma")
         return {"message": f"CV {request.file_id} đã được xóa"}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Lỗi khi xóa CV {request.file_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Không thể xóa CV: {str(e)}")
@@ -738,16 +858,12 @@ async def get_cv_insights_endpoint(cv_id: int):
     """
     try:
         # Kiểm tra CV tồn tại
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT cv_info_json FROM cv_store WHERE id = ?", (cv_id,))
-            row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
-            cv_info = json.loads(row["cv_info_json"])
+        cv_info = await get_cv_info(cv_id)
+        if cv_info is None:
+            raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
 
         # Kiểm tra cache
-        cached_insights = get_cv_insights(cv_id)
+        cached_insights = await get_cv_insights(cv_id)
         if cached_insights:
             logging.info(f"✅ Lấy insights từ cache cho CV {cv_id}")
             return CVInsightsResponse(
@@ -775,7 +891,7 @@ async def get_cv_insights_endpoint(cv_id: int):
         insights = await analyze_cv_insights(cv_info)
 
         # Lưu vào cache
-        save_cv_insights(cv_id, insights)
+        await save_cv_insights(cv_id, insights)
 
         logging.info(f"✅ Phân tích CV {cv_id} hoàn tất")
         return CVInsightsResponse(
@@ -815,20 +931,16 @@ async def improve_cv_endpoint(cv_id: int = Query(..., description="ID của CV c
     """
     try:
         # Lấy CV info
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT cv_info_json FROM cv_store WHERE id = ?", (cv_id,))
-            row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
-            cv_info = json.loads(row["cv_info_json"])
+        cv_info = await get_cv_info(cv_id)
+        if cv_info is None:
+            raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
 
         # Lấy insights (hoặc phân tích mới)
-        insights = get_cv_insights(cv_id)
+        insights = await get_cv_insights(cv_id)
         if not insights:
             logging.info(f"Chưa có insights, phân tích CV {cv_id} trước...")
             insights_data = await analyze_cv_insights(cv_info)
-            save_cv_insights(cv_id, insights_data)
+            await save_cv_insights(cv_id, insights_data)
             insights = insights_data
 
         # Tạo gợi ý cải thiện
@@ -870,81 +982,28 @@ async def search_jobs_endpoint(input: JobSearchInput):
         logging.info(f"🔍 Tìm kiếm jobs: query='{query}', filters={filters}, cv_id={cv_id}")
 
         # Lấy CV info nếu có cv_id (để AI ranking)
-        cv_info = None
-        if cv_id:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT cv_info_json FROM cv_store WHERE id = ?", (cv_id,))
-                row = cursor.fetchone()
-                if row:
-                    cv_info = json.loads(row["cv_info_json"])
-
-        # Build SQL query
-        sql = "SELECT * FROM job_store WHERE 1=1"
-        params = []
-
-        # Text search
-        if query:
-            sql += " AND (job_title LIKE ? OR job_description LIKE ? OR skills LIKE ?)"
-            search_term = f"%{query}%"
-            params.extend([search_term, search_term, search_term])
-
-        # Filters
-        if filters.get('work_location'):
-            locations = filters['work_location']
-            placeholders = ','.join(['?' for _ in locations])
-            sql += f" AND work_location IN ({placeholders})"
-            params.extend(locations)
-
-        if filters.get('work_type'):
-            work_types = filters['work_type']
-            placeholders = ','.join(['?' for _ in work_types])
-            sql += f" AND work_type IN ({placeholders})"
-            params.extend(work_types)
-
-        if filters.get('experience'):
-            sql += " AND experience = ?"
-            params.append(filters['experience'])
-
-        if filters.get('salary_min'):
-            # Simple salary filter (can be improved)
-            pass
-
-        # Pagination
-        sql += " LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-
-        # Execute query
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql, params)
-            jobs = [dict(row) for row in cursor.fetchall()]
-
-        # Count total
-        count_sql = sql.split("LIMIT")[0]
-        count_params = params[:-2]
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT COUNT(*) as total FROM ({count_sql})", count_params)
-            total = cursor.fetchone()['total']
+        cv_info = await get_cv_info(cv_id) if cv_id else None
+
+        # Tìm kiếm trong job_store (chạy trên SQLite executor)
+        jobs, total = await search_jobs(query, filters, limit, offset, input.sort)
 
         # AI ranking nếu có cv_id - SIMPLE MATCHING (không dùng semantic search)
+        # Overlap skills tính bằng SQL trên job_skills (skill đã chuẩn hoá lúc ingest)
+        overlap = await get_skill_overlap([job['id'] for job in jobs], cv_info.get('skills', [])) if cv_info else {}
         results = []
 
         for job in jobs:
-            job_skills = [s.strip() for s in job.get('skills', '').split(';') if s.strip()]
-
             match_score = None
             why_match = None
 
             if cv_info:
-                cv_skills = cv_info.get('skills', [])
-                matched_skills = set(cv_skills) & set(job_skills)
-                match_score = len(matched_skills) / max(len(job_skills), 1) if job_skills else 0.0
+                job_overlap = overlap.get(job['id'], {"matched": [], "total": 0})
+                matched_skills = job_overlap["matched"]
+                match_score = len(matched_skills) / job_overlap["total"] if job_overlap["total"] else 0.0
 
                 # Generate simple why_match
                 if matched_skills:
-                    why_match = f"Khớp {len(matched_skills)} kỹ năng: {', '.join(list(matched_skills)[:3])}"
+                    why_match = f"Khớp {len(matched_skills)} kỹ năng: {', '.join(matched_skills[:3])}"
                 else:
                     why_match = "Có thể phù hợp với vị trí này"
 
@@ -960,11 +1019,12 @@ async def search_jobs_endpoint(input: JobSearchInput):
                 work_location=job.get('work_location', 'N/A'),
                 work_type=job.get('work_type', 'N/A'),
                 deadline=job.get('deadline', 'N/A'),
-                why_match=why_match
+                why_match=why_match,
+                snippet=job.get('snippet')
             ))
 
-        # Sort by match_score if available
-        if cv_info:
+        # Sort by match_score if available (chỉ khi không chọn thứ tự sort khác)
+        if cv_info and input.sort == "relevance":
             results.sort(key=lambda x: x.match_score or 0, reverse=True)
 
         logging.info(f"✅ Tìm được {total} jobs, trả về {len(results)} jobs")
@@ -980,6 +1040,83 @@ async def search_jobs_endpoint(input: JobSearchInput):
         raise HTTPException(status_code=500, detail=f"Lỗi tìm kiếm: {str(e)}")
 
 
+@app.get("/jobs/{job_id}/similar", response_model=SimilarJobsResponse)
+async def get_similar_jobs(job_id: int, k: int = Query(10, ge=1, le=50)):
+    """
+    Các job tương tự một job (theo vector embedding, cosine similarity)
+
+    Dùng vector_index trong process nếu VECTOR_INDEX_ENABLED, không thì truy vấn Chroma.
+    """
+    try:
+        if not await job_exists(job_id):
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        hits = await find_similar_jobs(job_id, k)
+        if hits is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} has not been indexed")
+
+        jobs = {job['id']: job for job in await get_jobs_by_ids([job_id for job_id, _ in hits])}
+        similar_jobs = []
+        for similar_id, similarity in hits:
+            job = jobs.get(similar_id)
+            if not job:  # vector còn nhưng job đã bị xoá khỏi SQLite
+                continue
+            similar_jobs.append(SimilarJob(
+                job_id=similar_id,
+                job_title=job.get('job_title') or '',
+                company_name=job.get('name') or 'Unknown Company',
+                salary=job.get('salary') or 'N/A',
+                work_location=job.get('work_location') or 'N/A',
+                work_type=job.get('work_type') or 'N/A',
+                job_url=job.get('job_url') or '',
+                similarity=round(similarity, 4),
+            ))
+        return SimilarJobsResponse(job_id=job_id, similar_jobs=similar_jobs)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"❌ Lỗi tìm job tương tự cho job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi tìm job tương tự: {str(e)}")
+
+
+@app.post("/admin/reconcile", status_code=202)
+async def start_reconcile_endpoint(repair: bool = Query(False), batch_size: int = Query(1000, ge=100, le=10000)):
+    """
+    Bắt đầu đối soát job_store <-> Chroma trên thread nền (xem reconciler)
+
+    - repair: embed lại job thiếu/cũ, xoá doc trùng/mồ côi (mặc định chỉ báo cáo)
+    Theo dõi tiến độ bằng GET /admin/reconcile. 409 nếu đang có lần chạy khác.
+    """
+    progress = start_reconcile(repair, batch_size)
+    if progress is None:
+        raise HTTPException(status_code=409, detail="Reconcile is already running")
+    logging.info(f"🔎 Bắt đầu reconcile (repair={repair})")
+    return progress.as_dict()
+
+
+@app.get("/admin/reconcile")
+async def get_reconcile_endpoint():
+    """Tiến độ / báo cáo của lần reconcile gần nhất."""
+    status = get_reconcile_status()
+    if status is None:
+        raise HTTPException(status_code=404, detail="No reconcile has been run")
+    return status
+
+
+@app.get("/admin/llm-cache")
+async def get_llm_cache_endpoint():
+    """Số entry và hit/miss của llm_cache theo template."""
+    return await asyncio.to_thread(get_llm_cache_store().stats)
+
+
+@app.delete("/admin/llm-cache")
+async def clear_llm_cache_endpoint(template: Optional[str] = Query(None, description="Chỉ xoá một template")):
+    """Xoá kết quả LLM đã cache (toàn bộ hoặc một template, vd. cv_insights)."""
+    deleted = await asyncio.to_thread(get_llm_cache_store().clear, template)
+    logging.info(f"🧹 Đã xoá {deleted} entry LLM cache (template={template})")
+    return {"deleted": deleted}
+
+
 @app.post("/apply", response_model=ApplicationResponse)
 async def apply_job_endpoint(input: ApplyJobInput):
     """
@@ -994,25 +1131,19 @@ async def apply_job_endpoint(input: ApplyJobInput):
         status = input.status
 
         # Kiểm tra CV tồn tại
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM cv_store WHERE id = ?", (cv_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
+        if not await cv_exists(cv_id):
+            raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
 
         # Kiểm tra job tồn tại
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM job_store WHERE id = ?", (job_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"Job {job_id} không tìm thấy")
+        if not await job_exists(job_id):
+            raise HTTPException(status_code=404, detail=f"Job {job_id} không tìm thấy")
 
         # Kiểm tra đã apply chưa
-        if check_application_exists(cv_id, job_id):
+        if await check_application_exists(cv_id, job_id):
             raise HTTPException(status_code=400, detail=f"Đã ứng tuyển job {job_id} rồi")
 
         # Lưu application
-        app_id = insert_application(cv_id, job_id, cover_letter, status)
+        app_id = await insert_application(cv_id, job_id, cover_letter, status)
 
         logging.info(f"✅ CV {cv_id} đã ứng tuyển job {job_id}")
         return ApplicationResponse(
@@ -1043,14 +1174,11 @@ async def get_applications_endpoint(
     """
     try:
         # Kiểm tra CV tồn tại
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM cv_store WHERE id = ?", (cv_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
+        if not await cv_exists(cv_id):
+            raise HTTPException(status_code=404, detail=f"CV {cv_id} không tìm thấy")
 
         # Lấy applications
-        applications = get_applications_by_cv(cv_id, status)
+        applications = await get_applications_by_cv(cv_id, status)
 
         app_items = [
             ApplicationItem(
@@ -1088,42 +1216,27 @@ async def preview_document_pdf(file_id: int):
     """
     try:
         from fastapi.responses import FileResponse, Response
-        import os
 
         # Lấy thông tin CV
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT filename, file_data FROM cv_store WHERE id = ?", (file_id,))
-            row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail=f"File {file_id} không tìm thấy")
+        row = await get_cv_file(file_id)
+        if not row:
+            raise HTTPException(status_code=404, detail=f"File {file_id} không tìm thấy")
 
-        # Nếu không có file_data (CV cũ), trả về placeholder
-        if not row['file_data']:
-            logging.warning(f"⚠️ CV {file_id} không có file_data. Trả về placeholder.")
+        # Nếu không có file trong blob store (CV cũ), trả về placeholder
+        if not row['file_path']:
+            logging.warning(f"⚠️ CV {file_id} không có file PDF. Trả về placeholder.")
             return Response(
                 content=f"<html><body><h3>CV Preview không khả dụng</h3><p>File: {row['filename']}</p><p>Vui lòng upload lại CV để xem preview.</p></body></html>",
                 media_type="text/html"
             )
 
-        # Tạo thư mục temp nếu chưa có
-        temp_dir = os.path.join(os.path.dirname(__file__), "..", "temp_pdfs")
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Lưu PDF vào temp file
-        temp_file_path = os.path.join(temp_dir, f"cv_{file_id}.pdf")
-
-        with open(temp_file_path, 'wb') as f:
-            f.write(row['file_data'])
-
-        logging.info(f"✅ Tạo preview PDF cho file {file_id}")
-
-        # Trả về PDF file với header inline để hiển thị trong browser
+        # Serve thẳng file trong blob store (không ghi bản copy tạm); ETag = sha256 nội dung
         return FileResponse(
-            temp_file_path,
+            row['file_path'],
             media_type='application/pdf',
             headers={
-                "Content-Disposition": f"inline; filename={row['filename']}"
+                "Content-Disposition": f"inline; filename={row['filename']}",
+                "ETag": f'"{row["file_sha256"]}"'
             }
         )
 
@@ -1141,71 +1254,26 @@ async def preview_document_info(file_id: int):
     """
     try:
         # Kiểm tra cache
-        cached_preview = get_document_preview(file_id)
+        cached_preview = await get_document_preview(file_id)
         if cached_preview:
             logging.info(f"✅ Lấy preview từ cache cho file {file_id}")
 
             # Lấy thông tin CV
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT filename, cv_info_json FROM cv_store WHERE id = ?", (file_id,))
-                row = cursor.fetchone()
-                if not row:
-                    raise HTTPException(status_code=404, detail=f"File {file_id} không tìm thấy")
-
-                cv_info = json.loads(row["cv_info_json"])
-
-                return DocumentPreviewResponse(
-                    file_id=file_id,
-                    type=cached_preview['type'],
-                    filename=row['filename'],
-                    preview={
-                        "title": f"CV - {cv_info.get('name', 'Unknown')}",
-                        "summary": cached_preview['summary'],
-                        "page_count": cached_preview['page_count'],
-                        "file_size": f"{cached_preview['file_size'] / 1024:.1f} KB" if cached_preview['file_size'] else "N/A"
-                    },
-                    quick_info={
-                        "name": cv_info.get('name', 'N/A'),
-                        "email": cv_info.get('email', 'N/A'),
-                        "phone": cv_info.get('phone', 'N/A'),
-                        "top_skills": cv_info.get('skills', [])[:5]
-                    }
-                )
-
-        # Tạo preview mới
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT filename, cv_info_json FROM cv_store WHERE id = ?", (file_id,))
-            row = cursor.fetchone()
-            if not row:
+            record = await get_cv_record(file_id)
+            if not record:
                 raise HTTPException(status_code=404, detail=f"File {file_id} không tìm thấy")
 
-            cv_info = json.loads(row["cv_info_json"])
+            cv_info = record["cv_info"]
 
-            # Tạo summary
-            skills_str = ", ".join(cv_info.get('skills', [])[:5])
-            summary = f"{cv_info.get('name', 'Unknown')} - {skills_str}"
-
-            # Lưu preview
-            preview_data = {
-                "type": "cv",
-                "summary": summary,
-                "page_count": 1,  # Placeholder
-                "file_size": 0  # Placeholder
-            }
-            save_document_preview(file_id, preview_data)
-
-            logging.info(f"✅ Tạo preview mới cho file {file_id}")
             return DocumentPreviewResponse(
                 file_id=file_id,
-                type="cv",
-                filename=row['filename'],
+                type=cached_preview['type'],
+                filename=record['filename'],
                 preview={
                     "title": f"CV - {cv_info.get('name', 'Unknown')}",
-                    "summary": summary,
-                    "page_count": 1,
-                    "file_size": "N/A"
+                    "summary": cached_preview['summary'],
+                    "page_count": cached_preview['page_count'],
+                    "file_size": f"{cached_preview['file_size'] / 1024:.1f} KB" if cached_preview['file_size'] else "N/A"
                 },
                 quick_info={
                     "name": cv_info.get('name', 'N/A'),
@@ -1215,6 +1283,45 @@ async def preview_document_info(file_id: int):
                 }
             )
 
+        # Tạo preview mới
+        record = await get_cv_record(file_id)
+        if not record:
+            raise HTTPException(status_code=404, detail=f"File {file_id} không tìm thấy")
+
+        cv_info = record["cv_info"]
+
+        # Tạo summary
+        skills_str = ", ".join(cv_info.get('skills', [])[:5])
+        summary = f"{cv_info.get('name', 'Unknown')} - {skills_str}"
+
+        # Lưu preview
+        preview_data = {
+            "type": "cv",
+            "summary": summary,
+            "page_count": 1,  # Placeholder
+            "file_size": record.get('file_size') or 0
+        }
+        await save_document_preview(file_id, preview_data)
+
+        logging.info(f"✅ Tạo preview mới cho file {file_id}")
+        return DocumentPreviewResponse(
+            file_id=file_id,
+            type="cv",
+            filename=record['filename'],
+            preview={
+                "title": f"CV - {cv_info.get('name', 'Unknown')}",
+                "summary": summary,
+                "page_count": 1,
+                "file_size": f"{preview_data['file_size'] / 1024:.1f} KB" if preview_data['file_size'] else "N/A"
+            },
+            quick_info={
+                "name": cv_info.get('name', 'N/A'),
+                "email": cv_info.get('email', 'N/A'),
+                "phone": cv_info.get('phone', 'N/A'),
+                "top_skills": cv_info.get('skills', [])[:5]
+            }
+        )
+
     except HTTPException:
         raise
     except Exception as e:
@@ -1235,24 +1342,14 @@ async def suggest_questions_endpoint(input: SuggestQuestionsInput):
         job_id = input.job_id
 
         # Lấy CV info nếu có
-        cv_info = None
-        if cv_id:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT cv_info_json FROM cv_store WHERE id = ?", (cv_id,))
-                row = cursor.fetchone()
-                if row:
-                    cv_info = json.loads(row["cv_info_json"])
+        cv_info = await get_cv_info(cv_id) if cv_id else None
 
         # Lấy job info nếu có
         job_info = None
         if job_id:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT job_title FROM job_store WHERE id = ?", (job_id,))
-                row = cursor.fetchone()
-                if row:
-                    job_info = {"job_title": row["job_title"]}
+            job_title = await get_job_title(job_id)
+            if job_title is not None:
+                job_info = {"job_title": job_title}
 
         # Tạo gợi ý câu hỏi
         suggestions = generate_question_suggestions(context, cv_info, job_info)
@@ -1272,39 +1369,38 @@ async def suggest_questions_endpoint(input: SuggestQuestionsInput):
 # ===== FRONTEND ENDPOINTS =====
 
 @app.get("/cvs")
-async def get_all_cvs_simple():
+async def get_all_cvs_simple(response: Response, limit: Optional[int] = Query(None, ge=1, le=1000),
+                             cursor: Optional[str] = None, fields: Optional[str] = None):
     """
     Lấy tất cả CVs với thông tin đã parse (cho frontend dashboard)
 
-    Khác với /list-cvs (có phân trang), endpoint này trả về tất cả CVs
-    với cv_info đã được parse thành object (không phải JSON string)
+    Khác với /list-cvs, endpoint này trả về CVs với cv_info đã được parse
+    thành object (không phải JSON string)
+
+    Parameters:
+    - limit: Số CV mỗi trang (mặc định: tất cả); trang sau lấy bằng header X-Next-Cursor
+    - cursor: Cursor của trang trước
+    - fields: Chỉ lấy các field cần, vd "id,filename,name,skills"
+      (id, filename, upload_timestamp, file_size, cv_info, name, email, phone, skills, career_objective)
     """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, filename, cv_info_json, upload_timestamp FROM cv_store ORDER BY upload_timestamp DESC")
-            rows = cursor.fetchall()
-
-            cvs = []
-            for row in rows:
-                cv_info = json.loads(row["cv_info_json"]) if row["cv_info_json"] else {}
-                cvs.append({
-                    "id": row["id"],
-                    "filename": row["filename"],
-                    "cv_info": cv_info,  # Already parsed object
-                    "upload_timestamp": row["upload_timestamp"]
-                })
-
-            logging.info(f"✅ Lấy {len(cvs)} CVs cho frontend")
-            return cvs
+        cvs, next_cursor = await list_cvs_page(limit, cursor, fields)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        logging.info(f"✅ Lấy {len(cvs)} CVs cho frontend")
+        return cvs
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"❌ Lỗi lấy CVs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lỗi lấy CVs: {str(e)}")
 
 
 @app.get("/jobs")
-async def get_all_jobs_simple(limit: int = 100, offset: int = 0):
+async def get_all_jobs_simple(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                              cursor: Optional[str] = None, fields: Optional[str] = None):
     """
     Lấy tất cả jobs (cho frontend dashboard và jobs listing)
 
@@ -1313,46 +1409,49 @@ async def get_all_jobs_simple(limit: int = 100, offset: int = 0):
 
     Parameters:
     - limit: Số lượng jobs tối đa (default: 100)
-    - offset: Vị trí bắt đầu (default: 0)
+    - offset: Vị trí bắt đầu (default: 0), bị bỏ qua khi có cursor
+    - cursor: `next_cursor` của trang trước (keyset pagination, không chậm dần ở trang sâu)
+    - fields: Chỉ lấy các cột cần, vd "id,job_title,name,salary,work_location,summary"
+      (summary = 200 ký tự đầu của job_description)
 
     Returns:
     - jobs: List of job objects
     - total: Tổng số jobs trong database
     - limit: Limit được sử dụng
     - offset: Offset được sử dụng
+    - next_cursor: Cursor cho trang tiếp theo (null nếu hết)
     """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
+        jobs, total, next_cursor = await get_jobs_page(limit, offset, cursor, fields)
 
-            # Get total count
-            cursor.execute("SELECT COUNT(*) as total FROM job_store")
-            total = cursor.fetchone()["total"]
+        logging.info(f"✅ Lấy {len(jobs)} jobs (total: {total}, limit: {limit}, offset: {offset})")
 
-            # Get jobs with pagination
-            cursor.execute(f"SELECT * FROM job_store LIMIT ? OFFSET ?", (limit, offset))
-            jobs = [dict(row) for row in cursor.fetchall()]
-
-            logging.info(f"✅ Lấy {len(jobs)} jobs (total: {total}, limit: {limit}, offset: {offset})")
-
-            return {
-                "jobs": jobs,
-                "total": total,
-                "limit": limit,
-                "offset": offset
-            }
+        return {
+            "jobs": jobs,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": next_cursor
+        }
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"❌ Lỗi lấy jobs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lỗi lấy jobs: {str(e)}")
 
 
 @app.get("/jobs/analytics")
-async def get_jobs_analytics():
+async def get_jobs_analytics(request: Request, response: Response):
     """
     Phân tích xu hướng việc làm - Dashboard Analytics
 
+    Số liệu đọc từ bảng tổng hợp (cập nhật bằng trigger). ETag gồm snapshot_id
+    và ngày hiện tại (deadline_stats tính theo ngày): client gửi If-None-Match
+    sẽ nhận 304 nếu dữ liệu chưa đổi.
+
     Returns:
+    - snapshot_id: Phiên bản dữ liệu job_store (tăng khi job thay đổi)
     - top_job_titles: Top 10 vị trí tuyển dụng nhiều nhất
     - top_companies: Top 10 công ty tuyển dụng nhiều nhất
     - salary_distribution: Phân bố mức lương
@@ -1363,132 +1462,23 @@ async def get_jobs_analytics():
     - deadline_stats: Thống kê deadline (sắp hết hạn, còn lâu)
     """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-
-            # 1. Top 10 Job Titles
-            cursor.execute("""
-                SELECT job_title, COUNT(*) as count
-                FROM job_store
-                WHERE job_title IS NOT NULL AND job_title != ''
-                GROUP BY job_title
-                ORDER BY count DESC
-                LIMIT 10
-            """)
-            top_job_titles = [{"title": row["job_title"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 2. Top 10 Companies
-            cursor.execute("""
-                SELECT name, COUNT(*) as count
-                FROM job_store
-                WHERE name IS NOT NULL AND name != ''
-                GROUP BY name
-                ORDER BY count DESC
-                LIMIT 10
-            """)
-            top_companies = [{"company": row["name"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 3. Salary Distribution (phân loại theo range)
-            cursor.execute("""
-                SELECT salary, COUNT(*) as count
-                FROM job_store
-                WHERE salary IS NOT NULL AND salary != '' AND salary != 'Thỏa thuận'
-                GROUP BY salary
-                ORDER BY count DESC
-                LIMIT 15
-            """)
-            salary_distribution = [{"salary": row["salary"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 4. Location Distribution
-            cursor.execute("""
-                SELECT work_location, COUNT(*) as count
-                FROM job_store
-                WHERE work_location IS NOT NULL AND work_location != ''
-                GROUP BY work_location
-                ORDER BY count DESC
-                LIMIT 10
-            """)
-            location_distribution = [{"location": row["work_location"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 5. Job Type Distribution (work_type column)
-            cursor.execute("""
-                SELECT work_type, COUNT(*) as count
-                FROM job_store
-                WHERE work_type IS NOT NULL AND work_type != ''
-                GROUP BY work_type
-                ORDER BY count DESC
-            """)
-            job_type_distribution = [{"type": row["work_type"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 6. Experience Distribution
-            cursor.execute("""
-                SELECT experience, COUNT(*) as count
-                FROM job_store
-                WHERE experience IS NOT NULL AND experience != ''
-                GROUP BY experience
-                ORDER BY count DESC
-            """)
-            experience_distribution = [{"experience": row["experience"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # 7. Top Skills (parse từ skills JSON array)
-            cursor.execute("SELECT skills FROM job_store WHERE skills IS NOT NULL AND skills != ''")
-            skills_counter = {}
-            for row in cursor.fetchall():
-                try:
-                    skills_list = json.loads(row["skills"]) if isinstance(row["skills"], str) else row["skills"]
-                    if isinstance(skills_list, list):
-                        for skill in skills_list:
-                            if skill and isinstance(skill, str):
-                                skill = skill.strip()
-                                skills_counter[skill] = skills_counter.get(skill, 0) + 1
-                except:
-                    pass
-
-            top_skills = [{"skill": skill, "count": count} for skill, count in sorted(skills_counter.items(), key=lambda x: x[1], reverse=True)[:20]]
-
-            # 8. Deadline Stats (sắp hết hạn trong 7 ngày, 30 ngày)
-            from datetime import datetime, timedelta
-            today = datetime.now().date()
-            deadline_7_days = (today + timedelta(days=7)).isoformat()
-            deadline_30_days = (today + timedelta(days=30)).isoformat()
-
-            cursor.execute("""
-                SELECT
-                    COUNT(CASE WHEN deadline <= ? THEN 1 END) as expiring_7_days,
-                    COUNT(CASE WHEN deadline <= ? THEN 1 END) as expiring_30_days,
-                    COUNT(*) as total
-                FROM job_store
-                WHERE deadline IS NOT NULL AND deadline != ''
-            """, (deadline_7_days, deadline_30_days))
-            deadline_row = cursor.fetchone()
-            deadline_stats = {
-                "expiring_7_days": deadline_row["expiring_7_days"] or 0,
-                "expiring_30_days": deadline_row["expiring_30_days"] or 0,
-                "total_with_deadline": deadline_row["total"] or 0
-            }
-
-            # 9. Total Stats
-            cursor.execute("SELECT COUNT(*) as total FROM job_store")
-            total_jobs = cursor.fetchone()["total"]
-
-            logging.info(f"✅ Phân tích {total_jobs} jobs thành công")
-
-            return {
-                "total_jobs": total_jobs,
-                "top_job_titles": top_job_titles,
-                "top_companies": top_companies,
-                "salary_distribution": salary_distribution,
-                "location_distribution": location_distribution,
-                "job_type_distribution": job_type_distribution,
-                "experience_distribution": experience_distribution,
-                "top_skills": top_skills,
-                "deadline_stats": deadline_stats
-            }
+        analytics = await compute_jobs_analytics()
+        etag = f'"analytics-{analytics["snapshot_id"]}-{datetime.now().date().isoformat()}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        logging.info(f"✅ Phân tích {analytics['total_jobs']} jobs thành công")
+        return analytics
 
     except Exception as e:
         logging.error(f"❌ Lỗi phân tích jobs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lỗi phân tích: {str(e)}")
 
+# Phân tích biểu đồ được cache trong llm_cache theo prompt đã render (chart_type + dữ liệu)
+CHART_INSIGHT_PROMPT_VERSION = "1"
+CHART_INSIGHT_CACHE_TTL = int(os.getenv("CHART_INSIGHT_CACHE_TTL", str(24 * 3600)))
+
 @app.post("/jobs/analytics/insights")
 async def generate_chart_insights(request: Dict[str, Any]):
     """
@@ -1500,6 +1490,8 @@ async def generate_chart_insights(request: Dict[str, Any]):
         "data": [...chart data...]
     }
 
+    Kết quả được cache trong llm_cache theo prompt đã render (xem /admin/llm-cache).
+
     Returns:
     {
         "analysis": "AI-generated analysis text in Vietnamese"
@@ -1512,9 +1504,6 @@ async def generate_chart_insights(request: Dict[str, Any]):
         if not chart_type or not data:
             return {"analysis": "Thiếu thông tin biểu đồ để phân tích."}
 
-        # Import LLM from ai_analysis
-        from ai_analysis import llm
-
         # Create prompt based on chart type
         if chart_type == "top_jobs":
             data_str = "\n".join([f"- {item.get('title', 'N/A')}: {item.get('count', 0)} việc làm" for item in data[:10]])
@@ -1604,13 +1593,18 @@ Trả lời bằng tiếng Việt, chuyên nghiệp, súc tích."""
             return {"analysis": "Loại biểu đồ không hợp lệ."}
 
         # Call LLM with API key rotation
-        logging.info(f"Generating analysis for chart type: {chart_type}")
-        from ai_analysis import get_llm
-        llm_instance = get_llm()
-        response = await llm_instance.ainvoke(prompt)
-        analysis = response.content.strip()
-
-        logging.info(f"Generated analysis: {analysis[:100]}...")
+        from ai_analysis import ANALYSIS_MODEL, get_llm
+
+        async def generate() -> str:
+            logging.info(f"Generating analysis for chart type: {chart_type}")
+            response = await get_llm().ainvoke(prompt)
+            analysis = response.content.strip()
+            logging.info(f"Generated analysis: {analysis[:100]}...")
+            return analysis
+
+        # Cùng dữ liệu biểu đồ -> cùng prompt: tải lại dashboard không gọi lại Gemini
+        analysis = await cached_llm_call(f"chart_insight:{chart_type}", CHART_INSIGHT_PROMPT_VERSION,
+                                         ANALYSIS_MODEL, prompt, generate, ttl=CHART_INSIGHT_CACHE_TTL)
         return {"analysis": analysis}
 
     except Exception as e:
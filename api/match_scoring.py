@@ -0,0 +1,254 @@
+"""
+Match Scoring - Chấm điểm CV ↔ job tại chỗ, thay cho việc nhờ LLM xếp hạng
+
+Trước đây Gemini nhận ~20 job và tự áp trọng số rồi chọn top 5 (một round trip dài,
+hàng nghìn token). Giờ điểm được tính tất định trong process, cùng trọng số cũ:
+
+- skills (50%)     : tỉ lệ skill yêu cầu của job (cột skills) mà CV có; job không liệt kê
+                     skill thì dùng tỉ lệ skill của CV xuất hiện trong mô tả / yêu cầu;
+- experience (30%) : số năm kinh nghiệm của CV so với số năm job yêu cầu ("2 năm",
+                     "Dưới 1 năm", "Trên 5 năm", "Không yêu cầu"...);
+- aspirations (10%): cosine giữa embedding mục tiêu nghề nghiệp và vector của job;
+- education (10%)  : so bậc học (THPT < Trung cấp < Cao đẳng < Đại học < Thạc sĩ < Tiến sĩ).
+
+Thiếu thông tin ở một phía thì tiêu chí đó nhận điểm trung tính (NEUTRAL_SCORE). LLM chỉ
+còn viết why_match / suggestions cho top job (xem langchain_utils.match_cv).
+"""
+import asyncio
+import logging
+import re
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chroma_utils import get_job_index, get_vectorstore
+from job_parsing import fold_text, normalize_skill, parse_skills
+
+MATCH_WEIGHTS = {"skills": 0.5, "experience": 0.3, "aspirations": 0.1, "education": 0.1}
+NEUTRAL_SCORE = 0.5
+
+# Giá trị giữ chỗ mà /match dùng khi CV thiếu phần tương ứng
+_PLACEHOLDERS = {"no career objective provided", "no experience provided", "no education provided"}
+
+# Bậc học: (bậc, từ khoá đã bỏ dấu + lower). Bậc cao hơn được xét trước.
+EDUCATION_LEVELS = [
+    (6, ("tien si", "phd", "doctor")),
+    (5, ("thac si", "master", "mba", "cao hoc")),
+    (4, ("dai hoc", "cu nhan", "ky su", "bachelor", "university", "engineer")),
+    (3, ("cao dang", "college", "associate")),
+    (2, ("trung cap", "vocational")),
+    (1, ("trung hoc", "thpt", "high school", "12/12")),
+]
+_NO_REQUIREMENT = ("khong yeu cau", "chua co kinh nghiem", "khong can kinh nghiem", "no experience")
+
+_YEARS_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(nam|year|yr|thang|month)")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _has_value(text: Optional[str]) -> bool:
+    return bool(text and text.strip() and text.strip().lower() not in _PLACEHOLDERS)
+
+
+# ===== KINH NGHIỆM =====
+
+def required_experience_years(text: Optional[str]) -> Optional[float]:
+    """Số năm kinh nghiệm tối thiểu job yêu cầu; None nếu không đọc được."""
+    folded = fold_text(text or "")
+    if not folded.strip():
+        return None
+    if any(marker in folded for marker in _NO_REQUIREMENT) or folded.strip().startswith("duoi"):
+        return 0.0
+    match = _YEARS_RE.search(folded)
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    return value / 12 if match.group(2) in ("thang", "month") else value
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    if value.strip().lower() == "present":
+        return date.today()
+    try:
+        return date.fromisoformat(value.strip()[:10])
+    except ValueError:
+        return None
+
+
+def cv_experience_years(experience: Sequence[Dict]) -> Optional[float]:
+    """Tổng số năm kinh nghiệm từ các mục experience (start_date/end_date), gộp khoảng chồng nhau."""
+    spans = []
+    for entry in experience or []:
+        start, end = _parse_date(entry.get("start_date")), _parse_date(entry.get("end_date"))
+        if start and end and end > start:
+            spans.append((start, end))
+    if not spans:
+        return None
+    spans.sort()
+    total_days, (current_start, current_end) = 0, spans[0]
+    for start, end in spans[1:]:
+        if start > current_end:
+            total_days += (current_end - current_start).days
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    total_days += (current_end - current_start).days
+    return round(total_days / 365.25, 2)
+
+
+def _experience_years_from_text(text: str) -> Optional[float]:
+    values = [float(m.group(1).replace(",", ".")) / (12 if m.group(2) in ("thang", "month") else 1)
+              for m in _YEARS_RE.finditer(fold_text(text))]
+    return max(values) if values else None
+
+
+def experience_score(cv_years: Optional[float], required: Optional[float]) -> float:
+    """Đủ số năm yêu cầu -> 1, thiếu thì tỉ lệ thuận; CV không có kinh nghiệm -> 0."""
+    if required is None:
+        return NEUTRAL_SCORE
+    if required <= 0:
+        return 1.0
+    return min(1.0, (cv_years or 0.0) / required)
+
+
+# ===== HỌC VẤN =====
+
+def education_level(text: Optional[str]) -> Optional[int]:
+    """Bậc học cao nhất nhắc tới trong text; None nếu không nhận ra."""
+    folded = fold_text(text or "")
+    for level, keywords in EDUCATION_LEVELS:
+        if any(keyword in folded for keyword in keywords):
+            return level
+    return None
+
+
+def education_score(cv_level: Optional[int], required: Optional[int]) -> float:
+    if required is None:
+        return 1.0
+    if cv_level is None:
+        return NEUTRAL_SCORE
+    return 1.0 if cv_level >= required else max(0.0, 1.0 - 0.5 * (required - cv_level))
+
+
+# ===== KỸ NĂNG =====
+
+def _skill_in_text(skill_folded: str, text_folded: str) -> bool:
+    return re.search(rf"(?<!\w){re.escape(skill_folded)}(?!\w)", text_folded) is not None
+
+
+def skill_overlap(cv_skills: Sequence[str], job: Dict) -> Tuple[float, List[str], List[str]]:
+    """(điểm, skill khớp, skill job yêu cầu mà CV thiếu). Chỉ trả skill có trong job."""
+    cv_folded = {fold_text(normalize_skill(s)): s for s in cv_skills if isinstance(s, str) and s.strip()}
+    if not cv_folded:
+        return 0.0, [], []
+    required = parse_skills(job.get("skills"))
+    if required:
+        matched, missing = [], []
+        for norm, display in required:
+            folded = fold_text(norm)
+            hit = folded in cv_folded or any(_skill_in_text(cv, folded) or _skill_in_text(folded, cv)
+                                             for cv in cv_folded)
+            (matched if hit else missing).append(display)
+        return len(matched) / len(required), matched, missing
+    # Job không liệt kê skills: tìm skill của CV trong mô tả / yêu cầu
+    text = fold_text(f"{job.get('job_title') or ''} {job.get('candidate_requirements') or ''} "
+                     f"{job.get('job_description') or ''} {job.get('job_tags') or ''}")
+    matched = [original for folded, original in cv_folded.items() if _skill_in_text(folded, text)]
+    return min(1.0, len(matched) / min(len(cv_folded), 5)), matched, []
+
+
+# ===== MỤC TIÊU NGHỀ NGHIỆP =====
+
+def _job_vectors(job_ids: List[int]) -> Dict[int, np.ndarray]:
+    """Vector đã index của các job: vector_index nếu sẵn sàng, không thì đọc từ Chroma."""
+    job_index = get_job_index()
+    if job_index is not None and job_index.ready():
+        vectors = {job_id: job_index.get_vector(job_id) for job_id in job_ids}
+        return {job_id: v for job_id, v in vectors.items() if v is not None}
+    result = get_vectorstore()._collection.get(ids=[f"job_{job_id}" for job_id in job_ids],
+                                               include=["embeddings", "metadatas"])
+    return {int(metadata["job_id"]): np.asarray(vector, dtype=np.float32)
+            for vector, metadata in zip(result["embeddings"], result["metadatas"])
+            if metadata and metadata.get("job_id") is not None}
+
+
+async def aspiration_similarities(aspirations: str, job_ids: List[int]) -> Dict[int, float]:
+    """Cosine (cắt về 0..1) giữa mục tiêu nghề nghiệp và vector từng job."""
+    if not _has_value(aspirations) or not job_ids:
+        return {}
+    query, vectors = await asyncio.gather(get_vectorstore().embeddings.aembed_query(aspirations),
+                                          asyncio.to_thread(_job_vectors, job_ids))
+    query = np.asarray(query, dtype=np.float32)
+    query_norm = np.linalg.norm(query) or 1.0
+    return {job_id: float(max(0.0, min(1.0, np.dot(query, v) / (query_norm * (np.linalg.norm(v) or 1.0)))))
+            for job_id, v in vectors.items()}
+
+
+def _title_overlap(aspirations: str, job_title: str) -> List[str]:
+    words = {w for w in _WORD_RE.findall(fold_text(aspirations)) if len(w) > 2}
+    title_words = set(_WORD_RE.findall(fold_text(job_title)))
+    return [job_title] if words & title_words else []
+
+
+# ===== TỔNG HỢP =====
+
+def cv_profile(cv: Dict) -> Dict:
+    """Các đại lượng của CV dùng chung cho mọi job (tính một lần / request)."""
+    experience_text = cv.get("experience") or ""
+    years = cv.get("experience_years")
+    if years is None and _has_value(experience_text):
+        years = _experience_years_from_text(experience_text)
+    education_text = cv.get("education") or ""
+    return {
+        "skills": [s for s in (cv.get("skills") or []) if isinstance(s, str)],
+        "aspirations": cv.get("aspirations") or "",
+        "experience_years": years,
+        "education_level": education_level(education_text) if _has_value(education_text) else None,
+    }
+
+
+def score_job(profile: Dict, job: Dict, aspiration_similarity: Optional[float]) -> Dict:
+    """Điểm thành phần + match_score (0..1) + các trường matched_* của một job."""
+    skills, matched_skills, missing_skills = skill_overlap(profile["skills"], job)
+    required_years = required_experience_years(job.get("experience"))
+    experience = experience_score(profile["experience_years"], required_years)
+    required_level = education_level(job.get("education"))
+    education = education_score(profile["education_level"], required_level)
+    aspirations = NEUTRAL_SCORE if aspiration_similarity is None else aspiration_similarity
+    scores = {"skills": skills, "experience": experience, "aspirations": aspirations, "education": education}
+    matched_experience = []
+    if profile["experience_years"] is not None and required_years is not None and experience >= 1.0:
+        matched_experience = [f"{profile['experience_years']:g} năm kinh nghiệm (yêu cầu: {job.get('experience')})"]
+    return {
+        "job_id": job["id"],
+        "job_title": job.get("job_title") or "",
+        "job_url": job.get("job_url") or "",
+        "match_score": round(sum(MATCH_WEIGHTS[k] * v for k, v in scores.items()), 4),
+        "score_breakdown": {k: round(v, 4) for k, v in scores.items()},
+        "matched_skills": matched_skills,
+        "missing_skills": missing_skills,
+        "matched_aspirations": _title_overlap(profile["aspirations"], job.get("job_title") or "")
+        if _has_value(profile["aspirations"]) else [],
+        "matched_experience": matched_experience,
+        "matched_education": [job["education"]] if job.get("education") and required_level is not None
+        and education >= 1.0 else [],
+    }
+
+
+async def score_candidates(cv: Dict, ranked: Sequence[Tuple[Dict, float]]) -> List[Dict]:
+    """
+    Chấm điểm các job ứng viên (kết quả hybrid_job_search) và sắp giảm dần theo match_score;
+    hoà điểm thì giữ thứ tự retrieval. Không gọi LLM.
+    """
+    profile = cv_profile(cv)
+    jobs = [job for job, _ in ranked]
+    try:
+        similarities = await aspiration_similarities(profile["aspirations"], [job["id"] for job in jobs])
+    except Exception as e:
+        logging.warning(f"⚠️ Không tính được similarity mục tiêu nghề nghiệp: {e}")
+        similarities = {}
+    scored = [score_job(profile, job, similarities.get(job["id"])) for job in jobs]
+    order = sorted(range(len(scored)), key=lambda i: (-scored[i]["match_score"], i))
+    return [scored[i] for i in order]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 from enum import Enum
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
 import re
 
@@ -256,8 +256,9 @@ class CVImproveResponse(BaseModel):
 class JobSearchInput(BaseModel):
     """Input cho endpoint /jobs/search"""
     query: Optional[str] = Field(None, description="Từ khóa tìm kiếm")
-    filters: Dict[str, Any] = Field(default_factory=dict, description="Bộ lọc")
+    filters: Dict[str, Any] = Field(default_factory=dict, description="Bộ lọc (work_location, work_type, experience, salary_min/salary_max theo VND, deadline_after YYYY-MM-DD)")
     cv_id: Optional[int] = Field(None, description="ID CV để AI ranking")
+    sort: Literal["relevance", "deadline", "salary_desc", "salary_asc", "newest"] = Field("relevance", description="Thứ tự sắp xếp")
     limit: int = Field(20, ge=1, le=100, description="Số lượng kết quả")
     offset: int = Field(0, ge=0, description="Offset cho pagination")
 
@@ -272,6 +273,7 @@ class JobSearchResult(BaseModel):
     work_type: str = Field(..., description="Loại hình")
     deadline: str = Field(..., description="Hạn nộp")
     why_match: Optional[str] = Field(None, description="Lý do phù hợp")
+    snippet: Optional[str] = Field(None, description="Đoạn trích khớp từ khóa (highlight bằng <mark>)")
 
     class Config:
         populate_by_name = True  # Allow both field name and alias
@@ -283,6 +285,22 @@ class JobSearchResponse(BaseModel):
     limit: int = Field(..., description="Limit")
     offset: int = Field(..., description="Offset")
 
+class SimilarJob(BaseModel):
+    """Job tương tự (theo vector embedding)"""
+    job_id: int = Field(..., description="ID job")
+    job_title: str = Field(..., description="Tiêu đề job")
+    company_name: str = Field(..., description="Tên công ty")
+    salary: str = Field(..., description="Mức lương")
+    work_location: str = Field(..., description="Địa điểm")
+    work_type: str = Field(..., description="Loại hình")
+    job_url: str = Field(..., description="Link job")
+    similarity: float = Field(..., description="Cosine similarity với job gốc")
+
+class SimilarJobsResponse(BaseModel):
+    """Response cho endpoint /jobs/{job_id}/similar"""
+    job_id: int = Field(..., description="ID job gốc")
+    similar_jobs: List[SimilarJob] = Field(..., description="Các job tương tự, giảm dần theo similarity")
+
 class ApplyJobInput(BaseModel):
     """Input cho endpoint /apply"""
     cv_id: int = Field(..., ge=1, description="ID của CV")
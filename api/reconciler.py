@@ -0,0 +1,270 @@
+"""
+Reconciler - Đối soát toàn bộ job giữa SQLite (job_store) và Chroma (collection jobs)
+
+Sau crash hoặc preload dở dang hai store có thể lệch nhau. Reconciler đọc theo batch:
+
+1. Chroma: duyệt collection theo trang (chỉ metadata), gom {job_id: [(doc_id, content_hash)]}.
+2. SQLite: duyệt job_store theo keyset (id, content_hash), so với phần Chroma của từng id:
+   - missing : job không có vector;
+   - stale   : content_hash trong metadata khác job_store (hoặc chỉ có doc id cũ, không
+               phải job_{id});
+   - unhashed: vector ghi trước khi metadata có content_hash (không kiểm chứng được);
+   - duplicate: doc thừa của cùng job_id (id ngẫu nhiên từ các lần preload cũ).
+3. Doc còn lại trong Chroma (job_id không còn trong job_store / không có job_id) là orphaned.
+
+repair=True chỉ sửa các mục lệch: embed lại missing/stale/unhashed từ job_store (qua
+embedding cache, text không đổi thì không gọi API), xoá duplicate/orphaned, và cập nhật
+vector_index nếu đang bật. Tiến độ cập nhật vào ReconcileProgress (dùng cho endpoint admin).
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from chroma_utils import get_job_index, get_vectorstore
+from db_utils import get_jobs_by_ids, get_read_connection
+from job_parsing import JOB_SOURCE_COLUMNS, prepare_job
+
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "1000"))
+RECONCILE_CATEGORIES = ("missing", "stale", "unhashed", "duplicate", "orphaned")
+_SAMPLE_SIZE = 20  # số id mẫu giữ lại cho mỗi loại trong báo cáo
+
+
+class ReconcileProgress:
+    """Trạng thái một lần reconcile (thread-safe, đọc bằng as_dict())."""
+
+    def __init__(self, repair: bool):
+        self.repair = repair
+        self.phase = "pending"
+        self.chroma_total = 0
+        self.chroma_scanned = 0
+        self.sqlite_total = 0
+        self.sqlite_scanned = 0
+        self.counts = {category: 0 for category in RECONCILE_CATEGORIES}
+        self.samples: Dict[str, List] = {category: [] for category in RECONCILE_CATEGORIES}
+        self.reembedded = 0
+        self.deleted = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def update(self, **fields) -> None:
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+
+    def record(self, category: str, items: List) -> None:
+        with self._lock:
+            self.counts[category] += len(items)
+            room = _SAMPLE_SIZE - len(self.samples[category])
+            if room > 0:
+                self.samples[category].extend(items[:room])
+
+    def add(self, **increments) -> None:
+        with self._lock:
+            for key, value in increments.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None and self.phase != "pending"
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            done = self.chroma_scanned + self.sqlite_scanned
+            total = self.chroma_total + self.sqlite_total
+            return {
+                "phase": self.phase,
+                "repair": self.repair,
+                "progress": round(done / total, 4) if total else (1.0 if self.finished_at else 0.0),
+                "chroma": {"scanned": self.chroma_scanned, "total": self.chroma_total},
+                "sqlite": {"scanned": self.sqlite_scanned, "total": self.sqlite_total},
+                "counts": dict(self.counts),
+                "samples": {k: list(v) for k, v in self.samples.items()},
+                "reembedded": self.reembedded,
+                "deleted": self.deleted,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_s": round((self.finished_at or time.time()) - self.started_at, 3),
+                "error": self.error,
+            }
+
+
+def _job_id_of(metadata: Optional[Dict]) -> Optional[int]:
+    try:
+        return int((metadata or {}).get("job_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _iter_chroma_pages(collection, batch_size: int, job_ids: Optional[List[int]]):
+    if job_ids is not None:  # chỉ các job cần kiểm tra
+        for start in range(0, len(job_ids), batch_size):
+            yield collection.get(where={"job_id": {"$in": job_ids[start:start + batch_size]}}, include=["metadatas"])
+        return
+    for offset in range(0, collection.count(), batch_size):
+        yield collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+
+
+def _scan_chroma(collection, batch_size: int, progress: ReconcileProgress,
+                 job_ids: Optional[List[int]] = None) -> Tuple[Dict[int, List[Tuple[str, Optional[str]]]], List[str]]:
+    """{job_id: [(doc_id, content_hash)]} của collection (hoặc của job_ids) + các doc không có job_id hợp lệ."""
+    by_job: Dict[int, List[Tuple[str, Optional[str]]]] = {}
+    no_job_id: List[str] = []
+    progress.update(phase="scanning_chroma", chroma_total=collection.count() if job_ids is None else 0)
+    for page in _iter_chroma_pages(collection, batch_size, job_ids):
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            job_id = _job_id_of(metadata)
+            if job_id is None:
+                no_job_id.append(doc_id)
+            else:
+                by_job.setdefault(job_id, []).append((doc_id, (metadata or {}).get("content_hash")))
+        progress.add(chroma_scanned=len(page["ids"]))
+    return by_job, no_job_id
+
+
+def _iter_job_hashes(batch_size: int, job_ids: Optional[List[int]] = None):
+    """(id, content_hash) của job_store theo batch, keyset trên id (không giữ transaction dài)."""
+    if job_ids is not None:
+        with get_read_connection() as conn:
+            placeholders = ",".join("?" * len(job_ids))
+            rows = conn.execute(f"SELECT id, content_hash FROM job_store WHERE id IN ({placeholders}) ORDER BY id",
+                                job_ids).fetchall()
+        yield [(row["id"], row["content_hash"]) for row in rows]
+        return
+    last_id = 0
+    while True:
+        with get_read_connection() as conn:
+            rows = conn.execute("SELECT id, content_hash FROM job_store WHERE id > ? ORDER BY id LIMIT ?",
+                                (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        yield [(row["id"], row["content_hash"]) for row in rows]
+        last_id = rows[-1]["id"]
+
+
+def _reembed(vectorstore, job_ids: List[int]) -> List[int]:
+    """Embed lại các job từ job_store rồi upsert vào Chroma (id job_{id}). Trả về job_id đã ghi."""
+    prepared = []
+    for row in get_jobs_by_ids(job_ids):
+        job = prepare_job({column: row.get(column) for column in JOB_SOURCE_COLUMNS})
+        if job:
+            prepared.append((row["id"], job))
+    if not prepared:
+        return []
+    vectors = vectorstore.embeddings.embed_documents([job["page_content"] for _, job in prepared])
+    vectorstore._collection.upsert(
+        ids=[f"job_{job_id}" for job_id, _ in prepared],
+        embeddings=vectors,
+        metadatas=[{**job["metadata"], "job_id": job_id, "content_hash": job["content_hash"]}
+                   for job_id, job in prepared],
+        documents=[job["page_content"] for _, job in prepared],
+    )
+    job_index = get_job_index()
+    if job_index is not None:
+        job_index.add([job_id for job_id, _ in prepared], vectors)
+    return [job_id for job_id, _ in prepared]
+
+
+def _delete_docs(collection, doc_ids: List[str], batch_size: int) -> int:
+    for start in range(0, len(doc_ids), batch_size):
+        collection.delete(ids=doc_ids[start:start + batch_size])
+    return len(doc_ids)
+
+
+def reconcile(repair: bool = False, batch_size: int = RECONCILE_BATCH_SIZE, job_ids: Optional[List[int]] = None,
+              progress: Optional[ReconcileProgress] = None) -> Dict:
+    """
+    Đối soát job_store với collection jobs; repair=True thì sửa các mục lệch.
+    job_ids: chỉ kiểm tra các job này (không báo orphaned). Trả về progress.as_dict().
+    """
+    progress = progress or ReconcileProgress(repair)
+    vectorstore = get_vectorstore()
+    collection = vectorstore._collection
+    try:
+        with get_read_connection() as conn:
+            sqlite_total = len(job_ids) if job_ids is not None else conn.execute(
+                "SELECT COUNT(*) FROM job_store").fetchone()[0]
+        progress.update(sqlite_total=sqlite_total)
+        by_job, no_job_id = _scan_chroma(collection, batch_size, progress, job_ids)
+        progress.update(phase="diffing")
+
+        for rows in _iter_job_hashes(batch_size, job_ids):
+            missing, stale, unhashed, duplicate_docs = [], [], [], []
+            for job_id, content_hash in rows:
+                docs = by_job.pop(job_id, [])
+                canonical = f"job_{job_id}"
+                canonical_hashes = [h for doc_id, h in docs if doc_id == canonical]
+                duplicate_docs += [doc_id for doc_id, _ in docs if doc_id != canonical]
+                if not docs:
+                    missing.append(job_id)
+                elif not canonical_hashes:
+                    stale.append(job_id)  # chỉ có doc id cũ (trước khi id cố định job_{id})
+                elif canonical_hashes[0] is None:
+                    unhashed.append(job_id)
+                elif canonical_hashes[0] != content_hash:
+                    stale.append(job_id)
+            for category, items in (("missing", missing), ("stale", stale), ("unhashed", unhashed),
+                                    ("duplicate", duplicate_docs)):
+                progress.record(category, items)
+            if repair:
+                to_embed = missing + stale + unhashed
+                if to_embed:
+                    progress.update(phase="repairing")
+                    progress.add(reembedded=len(_reembed(vectorstore, to_embed)))
+                if duplicate_docs:
+                    progress.add(deleted=_delete_docs(collection, duplicate_docs, batch_size))
+                progress.update(phase="diffing")
+            progress.add(sqlite_scanned=len(rows))
+            logging.info(f"🔎 Reconcile: {progress.sqlite_scanned}/{sqlite_total} jobs checked, {progress.counts}")
+
+        if job_ids is None:
+            orphaned_docs = no_job_id + [doc_id for docs in by_job.values() for doc_id, _ in docs]
+            progress.record("orphaned", orphaned_docs)
+            if repair and orphaned_docs:
+                progress.update(phase="repairing")
+                progress.add(deleted=_delete_docs(collection, orphaned_docs, batch_size))
+                job_index = get_job_index()
+                if job_index is not None and by_job:
+                    job_index.remove(list(by_job))
+        progress.update(phase="done", finished_at=time.time())
+    except Exception as e:
+        progress.update(phase="failed", error=str(e), finished_at=time.time())
+        logging.error(f"❌ Reconcile failed: {e}")
+        raise
+    report = progress.as_dict()
+    logging.info(f"✅ Reconcile done (repair={repair}): {report['counts']}, "
+                 f"{report['reembedded']} re-embedded, {report['deleted']} deleted in {report['elapsed_s']}s")
+    return report
+
+
+# ===== LẦN CHẠY NỀN (ENDPOINT ADMIN) =====
+
+_current: Optional[ReconcileProgress] = None
+_current_lock = threading.Lock()
+
+
+def start_reconcile(repair: bool = False, batch_size: int = RECONCILE_BATCH_SIZE) -> Optional[ReconcileProgress]:
+    """Chạy reconcile trên thread nền; None nếu đang có một lần chạy khác."""
+    global _current
+    with _current_lock:
+        if _current is not None and _current.running:
+            return None
+        progress = ReconcileProgress(repair)
+        progress.update(phase="starting")
+        _current = progress
+
+    def run():
+        try:
+            reconcile(repair, batch_size, progress=progress)
+        except Exception:
+            pass  # lỗi đã được ghi vào progress
+
+    threading.Thread(target=run, name="reconcile", daemon=True).start()
+    return progress
+
+
+def get_reconcile_status() -> Optional[Dict]:
+    return _current.as_dict() if _current is not None else None
@@ -0,0 +1,156 @@
+"""
+SQLite Cache - Phần dùng chung của các cache bền vững trên đĩa (embedding_cache, llm_cache)
+
+Mỗi cache là một file SQLite riêng (WAL), dùng chung giữa các worker uvicorn:
+
+- last_used (phục vụ evict LRU) không được ghi ở mỗi lần hit: lượt dùng được gom trong
+  process và ghi một lần (một transaction) mỗi CACHE_TOUCH_FLUSH_SECONDS hoặc khi đủ
+  CACHE_TOUCH_FLUSH_SIZE khoá, hoặc cùng lúc với một lần ghi entry mới. Cache đọc nhiều
+  vì vậy gần như không lấy write lock; đổi lại thứ tự LRU chỉ chính xác tới khoảng flush.
+- evict: bộ đếm entry của process chỉ dùng để quyết định khi nào kiểm tra; _evict đếm
+  lại trong file (worker khác cũng ghi vào), xoá entry hết hạn trước rồi tới entry lâu
+  không dùng nhất, xuống còn CACHE_EVICT_RATIO ngưỡng.
+"""
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence, Tuple
+
+from db_utils import ConnectionManager
+
+CACHE_TOUCH_FLUSH_SECONDS = int(os.getenv("CACHE_TOUCH_FLUSH_SECONDS", "60"))
+CACHE_TOUCH_FLUSH_SIZE = int(os.getenv("CACHE_TOUCH_FLUSH_SIZE", "1000"))
+CACHE_EVICT_RATIO = 0.9  # evict xuống còn 90% ngưỡng để không phải evict ở mỗi lần ghi
+
+
+class SQLiteCacheStore(ABC):
+    """
+    Lớp cơ sở: lớp con khai báo table, key_columns, (tuỳ chọn) expires_column / hits_column
+    và cài _create_schema(conn).
+    """
+
+    table: str = ""
+    key_columns: Tuple[str, ...] = ()
+    expires_column: Optional[str] = None  # cột hết hạn (epoch giây), None = không có TTL
+    hits_column: Optional[str] = None  # cột đếm số lần hit (cộng dồn lúc flush)
+
+    def __init__(self, db_path: str, max_entries: int):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._manager = ConnectionManager(db_path)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._entry_count = 0
+        self._inserted_since_count = 0
+        # Lượt dùng chưa ghi xuống file: {khoá: (last_used, số lần hit)}
+        self._touches: Dict[Tuple, Tuple[int, int]] = {}
+        self._touch_lock = threading.Lock()
+        self._last_flush = time.time()
+
+    @abstractmethod
+    def _create_schema(self, conn) -> None:
+        """CREATE TABLE / INDEX của cache (bảng phải có cột last_used)."""
+
+    def _ensure_schema(self) -> None:
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            with self._manager.connection() as conn:
+                self._create_schema(conn)
+                conn.commit()
+                self._entry_count = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+            self._initialized = True
+            logging.info(f"✅ Cache {self.table} ready: {self.db_path} ({self._entry_count} entries)")
+
+    # ===== LAST_USED (GOM THEO LÔ) =====
+
+    def _record_touches(self, keys: Sequence[Tuple]) -> None:
+        """Ghi nhận lượt dùng của các khoá; flush xuống file khi tới hạn."""
+        now = int(time.time())
+        with self._touch_lock:
+            for key in keys:
+                hits = self._touches.get(key, (0, 0))[1]
+                self._touches[key] = (now, hits + 1)
+            due = (len(self._touches) >= CACHE_TOUCH_FLUSH_SIZE
+                   or time.time() - self._last_flush >= CACHE_TOUCH_FLUSH_SECONDS)
+        if due:
+            try:
+                with self._manager.connection() as conn:
+                    self._flush_touches(conn)
+                    conn.commit()
+            except Exception as e:
+                logging.warning(f"⚠️ Failed to flush usage of cache {self.table}: {e}")
+
+    def _flush_touches(self, conn) -> None:
+        """Ghi last_used (+ hits) đã gom trong cùng transaction của conn (không commit)."""
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+            self._last_flush = time.time()
+        if not touches:
+            return
+        where = " AND ".join(f"{column} = ?" for column in self.key_columns)
+        if self.hits_column:
+            sql = (f'UPDATE {self.table} SET last_used = MAX(last_used, ?), '
+                   f'{self.hits_column} = {self.hits_column} + ? WHERE {where}')
+            rows = [(last_used, hits, *key) for key, (last_used, hits) in touches.items()]
+        else:
+            sql = f'UPDATE {self.table} SET last_used = MAX(last_used, ?) WHERE {where}'
+            rows = [(last_used, *key) for key, (last_used, _) in touches.items()]
+        conn.executemany(sql, rows)
+
+    # ===== EVICT =====
+
+    def _after_insert(self, conn, inserted: int) -> None:
+        """
+        Gọi trong transaction ghi, sau khi thêm `inserted` entry mới: flush lượt dùng đã gom,
+        rồi evict khi bộ đếm vượt ngưỡng (hoặc đã thêm đủ nhiều để cần đếm lại).
+        """
+        self._flush_touches(conn)
+        self._entry_count += inserted
+        self._inserted_since_count += inserted
+        recount_every = max(1, int(self.max_entries * (1 - CACHE_EVICT_RATIO)))
+        if self._entry_count > self.max_entries or self._inserted_since_count >= recount_every:
+            self._evict(conn)
+
+    def _evict(self, conn) -> None:
+        # Worker khác cũng ghi vào file này: đếm lại thay vì tin vào bộ đếm của process
+        expired = 0
+        if self.expires_column:
+            expired = conn.execute(f'DELETE FROM {self.table} WHERE {self.expires_column} <= ?',
+                                   (int(time.time()),)).rowcount
+        count = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        self._inserted_since_count = 0
+        self._entry_count = count
+        if count <= self.max_entries:
+            if expired:
+                logging.info(f"🧹 Removed {expired} expired entries from cache {self.table}")
+            return
+        excess = count - int(self.max_entries * CACHE_EVICT_RATIO)
+        keys = ", ".join(self.key_columns)
+        conn.execute(
+            f'''DELETE FROM {self.table} WHERE ({keys}) IN (
+                    SELECT {keys} FROM {self.table} ORDER BY last_used LIMIT ?)''',
+            (excess,),
+        )
+        self._entry_count = count - excess
+        logging.info(f"🧹 Evicted {expired} expired + {excess} LRU entries from cache {self.table} "
+                     f"(max {self.max_entries})")
+
+    def flush(self) -> None:
+        """Ghi các lượt dùng còn gom trong process (gọi trước khi đọc thống kê / khi đóng)."""
+        if not self._initialized:
+            return
+        with self._manager.connection() as conn:
+            self._flush_touches(conn)
+            conn.commit()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logging.warning(f"⚠️ Failed to flush usage of cache {self.table}: {e}")
+        self._manager.close_all()
@@ -0,0 +1,15 @@
+"""
+Cấu hình chung cho test: các module trong api/ được import phẳng (như khi chạy uvicorn
+trong api/), DB / cache trỏ vào thư mục tạm và embedding dùng provider hashing (offline).
+"""
+import os
+import sys
+import tempfile
+
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="talentbridge-test-")
+os.environ.setdefault("TALENTBRIDGE_DB_PATH", os.path.join(_TEST_DB_DIR, "cv_job_matching.db"))
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key-not-used")  # main / ai_analysis cần key lúc import
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
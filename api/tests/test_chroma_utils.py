@@ -0,0 +1,27 @@
+import asyncio
+import threading
+
+import chroma_utils
+
+
+class _RecordingVectorstore:
+    def __init__(self):
+        self.calls = []
+
+    def add_documents(self, documents, ids):
+        self.calls.append((threading.get_ident(), ids, documents[0].page_content))
+
+
+def test_index_cv_extracts_embeds_off_the_event_loop(monkeypatch):
+    vectorstore = _RecordingVectorstore()
+    monkeypatch.setattr(chroma_utils, "get_cv_vectorstore", lambda: vectorstore)
+
+    async def index():
+        return threading.get_ident(), await chroma_utils.index_cv_extracts(
+            ["Python"], "Backend", "Dev at A", "BK", cv_id=7)
+
+    loop_thread, indexed = asyncio.run(index())
+    assert indexed
+    (thread, ids, content), = vectorstore.calls
+    assert ids == ["cv_7"] and "Experience: Dev at A" in content
+    assert thread != loop_thread
@@ -0,0 +1,37 @@
+from context_packer import estimate_tokens, pack_documents, pack_sections, pack_text, query_terms
+
+SECTIONS = [
+    ("Yêu cầu", "Biết Python. Biết Django. Có 2 năm kinh nghiệm."),
+    ("Phúc lợi", "Lương tháng 13. Bảo hiểm đầy đủ."),
+]
+
+
+def test_pack_sections_prefers_query_sentences_within_budget():
+    text, tokens, _ = pack_sections(SECTIONS, query_terms("Django"), budget=15)
+    assert tokens <= 15
+    assert "Django" in text
+    assert "Bảo hiểm" not in text
+
+
+def test_pack_sections_drops_sentences_seen_in_earlier_documents():
+    seen: set = set()
+    pack_sections(SECTIONS, set(), 200, seen)
+    text, _, duplicates = pack_sections([("Phúc lợi", "Lương tháng 13. Du lịch hằng năm.")], set(), 200, seen)
+    assert duplicates == 1
+    assert text == "Phúc lợi: Du lịch hằng năm."
+
+
+def test_pack_text_truncates_a_first_sentence_longer_than_the_budget():
+    sentence = " ".join(["kinh nghiệm"] * 60)
+    packed = pack_text(sentence, 20)
+    assert packed.endswith("…")
+    assert 0 < estimate_tokens(packed) <= 20
+    assert pack_text("Ngắn gọn.", 20) == "Ngắn gọn."
+
+
+def test_pack_documents_stays_under_budget():
+    documents = [(f"JOB_ID: {i}", SECTIONS) for i in range(4)]
+    packed = pack_documents(documents, "python", budget=60)
+    assert packed["tokens"] <= 60
+    assert all(f"JOB_ID: {i}" in packed["text"] for i in range(4))  # header luôn được giữ
+    assert packed["duplicates_dropped"] > 0
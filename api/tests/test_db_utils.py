@@ -0,0 +1,130 @@
+import base64
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import db_utils
+from db_utils import (
+    CV_LIST_FIELDS, JOB_LIST_FIELDS, decode_cursor, encode_cursor, get_db_connection, insert_cv_record,
+    list_cv_records, parse_fields,
+)
+
+
+@pytest.fixture(scope="module")
+def client():
+    db_utils.create_tables()
+    import main
+    return TestClient(main.app)
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+# ===== KEYSET CURSOR =====
+
+def test_cursor_round_trip():
+    key = ["2025-11-15 08:00:00", 42]
+    cursor = encode_cursor("cvs", key)
+    assert "=" not in cursor
+    assert decode_cursor("cvs", cursor, 2) == key
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    _raw_cursor({"t": "cvs", "k": ["2025-11-15", 1]}),  # khác loại
+    _raw_cursor({"t": "jobs", "k": [1, 2]}),  # sai số phần tử
+    _raw_cursor({"t": "jobs", "k": [[1]]}),  # không phải scalar
+    _raw_cursor(["jobs", 1]),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("jobs", cursor, 1)
+
+
+@pytest.mark.parametrize("path", ["/jobs", "/cvs?limit=2", "/list-cvs"])
+def test_tampered_cursor_is_a_client_error(client, path):
+    tampered = _raw_cursor({"t": "jobs", "k": [{"$gt": 0}]})
+    separator = "&" if "?" in path else "?"
+    response = client.get(f"{path}{separator}cursor={tampered}")
+    assert response.status_code == 400
+
+
+def test_cv_pages_do_not_skip_or_repeat_on_timestamp_ties():
+    db_utils.create_tables()
+    ids = [insert_cv_record(f"tie_{i}.pdf", {"name": f"CV {i}"}) for i in range(5)]
+    with get_db_connection() as conn:
+        conn.execute(f"UPDATE cv_store SET upload_timestamp = '2030-01-01 00:00:00' "
+                     f"WHERE id IN ({','.join('?' * len(ids))})", ids)
+        conn.commit()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = list_cv_records(2, cursor=cursor)
+        seen += [cv["id"] for cv in page]
+        if not cursor:
+            break
+    # Cùng timestamp: thứ tự theo id giảm dần, mỗi CV xuất hiện đúng một lần
+    assert [i for i in seen if i in ids] == sorted(ids, reverse=True)
+    assert len(seen) == len(set(seen))
+
+
+# ===== FIELDS =====
+
+def test_parse_fields_keeps_order_and_drops_duplicates():
+    assert parse_fields("job_title, id,job_title", JOB_LIST_FIELDS) == ["job_title", "id"]
+    assert parse_fields(None, JOB_LIST_FIELDS) is None
+    assert parse_fields(" , ", CV_LIST_FIELDS) is None
+
+
+def test_unknown_fields_are_rejected(client):
+    with pytest.raises(ValueError, match="password"):
+        parse_fields("id,password", CV_LIST_FIELDS)
+    assert client.get("/jobs?fields=id,password").status_code == 400
+    assert client.get("/cvs?fields=id,file_data").status_code == 400
+
+
+# ===== FTS QUERY =====
+
+def _fts_matches(query: str, documents) -> list:
+    """Chạy biểu thức MATCH trên bảng FTS5 tạm dùng cùng tokenizer / cách gộp đ như job_store_fts."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE VIRTUAL TABLE docs USING fts5(body, tokenize='{db_utils.JOB_FTS_TOKENIZER}')")
+    conn.executemany("INSERT INTO docs(rowid, body) VALUES (?, ?)",
+                     [(i, db_utils.fold_vietnamese(doc)) for i, doc in enumerate(documents)])
+    return [row[0] for row in conn.execute("SELECT rowid FROM docs WHERE docs MATCH ? ORDER BY rowid", (query,))]
+
+
+def test_build_fts_query_quotes_operators_and_special_characters():
+    query = db_utils.build_fts_query('kế toán" OR NOT c++ NEAR(')
+    assert query == '"kế"* "toán"* "OR"* "NOT"* "c"* "NEAR"*'
+    assert db_utils.build_fts_query('"*()') is None
+    # Toán tử đã được đặt trong nháy: chỉ khớp như từ thường, không lỗi cú pháp FTS5
+    assert _fts_matches(db_utils.build_fts_query("kế toán OR"), ["Kế toán tổng hợp", "Kế toán OR thuế"]) == [1]
+
+
+def test_build_fts_query_folds_d_and_diacritics():
+    documents = ["Nhân viên Đà Nẵng", "Nhân viên Hà Nội"]
+    assert db_utils.build_fts_query("Đà Nẵng") == '"Dà"* "Nẵng"*'
+    assert _fts_matches(db_utils.build_fts_query("da nang"), documents) == [0]
+    assert _fts_matches(db_utils.build_fts_query("Đà Nẵng"), documents) == [0]
+
+
+def test_build_fts_any_query_ors_distinct_phrases():
+    query = db_utils.build_fts_any_query(["Kế toán", "kế  toán", 'Đồ họa "3D"', "NEAR(a b)"])
+    assert query == '"kế toán" OR "dồ họa 3d" OR "near a b"'
+    assert _fts_matches(query, ["Chuyên viên kế toán", "Thiết kế đồ họa 3D", "Toán kế"]) == [0, 1]
+    assert db_utils.build_fts_any_query(["", "  "]) is None
+
+
+# ===== MATCH FILTER HASH =====
+
+def test_match_filter_hash_ignores_key_order_list_order_and_empty_values():
+    base = db_utils.match_filter_hash({"location": "Hà Nội", "skills": ["SQL", "Python"]})
+    assert db_utils.match_filter_hash({"skills": ["Python", " SQL ", "SQL"], "location": " Hà Nội",
+                                       "education": [], "job_type": None}) == base
+    assert db_utils.match_filter_hash(None) == db_utils.match_filter_hash({"skills": []})
+    assert db_utils.match_filter_hash({"location": "Đà Nẵng", "skills": ["SQL", "Python"]}) != base
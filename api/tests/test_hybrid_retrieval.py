@@ -0,0 +1,23 @@
+from hybrid_retrieval import MATCH_LOCATION_BOOST, MATCH_WORK_TYPE_BOOST, _boost, reciprocal_rank_fusion
+
+
+def test_rrf_rewards_jobs_ranked_high_in_both_lists():
+    scores = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    order = sorted(scores, key=scores.get, reverse=True)
+    assert order[:2] == [1, 3]  # có mặt ở cả hai nhánh
+    assert scores[1] == 1 / 61 + 1 / 62
+    assert scores[4] == 1 / 63
+
+
+def test_rrf_ties_when_ranks_mirror():
+    scores = reciprocal_rank_fusion([[1, 2], [2, 1]], k=60)
+    assert scores[1] == scores[2]
+    assert reciprocal_rank_fusion([]) == {}
+
+
+def test_boost_matches_location_and_work_type_ignoring_diacritics():
+    job = {"work_location": "Hà Nội, Cầu Giấy", "work_type": "Toàn thời gian"}
+    preferences = {"work_location": ["ha noi"], "work_type": ["toàn thời gian"]}
+    assert _boost(job, preferences) == 1.0 + MATCH_LOCATION_BOOST + MATCH_WORK_TYPE_BOOST
+    assert _boost(job, {"work_location": ["Đà Nẵng"]}) == 1.0
+    assert _boost({}, preferences) == 1.0
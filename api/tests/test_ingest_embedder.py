@@ -0,0 +1,41 @@
+import pytest
+
+import ingest_embedder
+from ingest_embedder import TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_bursts_then_refills_at_rate(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ingest_embedder.time, "monotonic", clock)
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)  # 1 token/giây, burst 2
+
+    bucket.acquire()
+    bucket.acquire()
+    assert bucket.wait_time() == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now += 10  # không tích quá capacity
+    bucket.acquire()
+    bucket.acquire()
+    assert bucket.wait_time() == pytest.approx(1.0)
+
+
+def test_token_bucket_pause_drains_tokens(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ingest_embedder.time, "monotonic", clock)
+    bucket = TokenBucket(rate_per_minute=600, capacity=5)
+
+    bucket.pause(30)
+    assert bucket.wait_time() == pytest.approx(30)
+    clock.now += 29
+    assert bucket.wait_time() == pytest.approx(1)  # vẫn đang pause dù đã có token
+    clock.now += 1
+    assert bucket.wait_time() == 0
@@ -0,0 +1,52 @@
+import json
+import uuid
+
+import pytest
+from langchain_chroma import Chroma
+
+from embedding_providers import HashingEmbeddings
+from ingest_pipeline import run_ingest
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _write_jobs(path, count):
+    run = uuid.uuid4().hex[:8]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "job_title": f"Lập trình viên Python {i}",
+                "job_url": f"http://example.com/{run}/job{i}",
+                "job_description": "Phát triển ứng dụng web bằng Python và Django.",
+                "skills": "Python; Django",
+                "salary": "15 - 25 triệu",
+                "deadline": "15/11/2025",
+            }, ensure_ascii=False) + "\n")
+
+
+def test_interrupted_ingest_resumes_from_checkpoint(tmp_path):
+    source = tmp_path / "jobs.jsonl"
+    _write_jobs(source, 10)
+    vectorstore = Chroma(collection_name=f"jobs_{uuid.uuid4().hex[:8]}", embedding_function=HashingEmbeddings(),
+                         persist_directory=str(tmp_path / "chroma"))
+
+    def stop_after_first_batch(job_ids, vectors):
+        raise _Interrupted()
+
+    with pytest.raises(_Interrupted):
+        run_ingest(str(source), vectorstore, batch_size=4, parse_workers=1, on_batch_written=stop_after_first_batch)
+    assert vectorstore._collection.count() == 4
+
+    # Lần chạy lại đọc tiếp từ byte offset đã lưu: chỉ 6 bản ghi còn lại
+    resumed = run_ingest(str(source), vectorstore, batch_size=4, parse_workers=1)
+    assert resumed["stages"]["read"]["items"] == 6
+    assert resumed["inserted"] == 10
+    assert resumed["up_to_date"] is False
+    assert vectorstore._collection.count() == 10
+
+    # File không đổi: bỏ qua, nhưng vẫn trả về số liệu của checkpoint
+    again = run_ingest(str(source), vectorstore, batch_size=4, parse_workers=1)
+    assert again["up_to_date"] is True
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (10, 0, 0)
@@ -0,0 +1,43 @@
+from job_parsing import parse_deadline, parse_salary
+
+CRAWLED_AT = "1757717200000"  # 2025-09-13 05:46 giờ Việt Nam (epoch ms)
+
+
+def test_parse_deadline_absolute_dates():
+    assert parse_deadline("15/11/2025") == "2025-11-15"
+    assert parse_deadline("2025-11-15") == "2025-11-15"
+    assert parse_deadline("Nov 15, 2025") == "2025-11-15"
+    assert parse_deadline("31/02/2025") is None
+
+
+def test_parse_deadline_relative_days_use_crawl_timestamp():
+    assert parse_deadline("Còn 5 ngày", CRAWLED_AT) == "2025-09-18"
+    assert parse_deadline("15 ngày nữa", CRAWLED_AT) == "2025-09-28"
+    # Không có thời điểm crawl thì không đoán ngày
+    assert parse_deadline("Còn 5 ngày") is None
+    assert parse_deadline("15 ngày nữa") is None
+
+
+def test_parse_deadline_rejects_partial_dates():
+    assert parse_deadline("2025") is None
+    assert parse_deadline("tháng 10") is None
+    assert parse_deadline("Hạn nộp sắp tới") is None
+    assert parse_deadline("N/A") is None
+
+
+def test_parse_salary_ranges_and_bounds():
+    assert parse_salary("15 - 25 triệu") == (15_000_000, 25_000_000, False)
+    assert parse_salary("Trên 10 triệu") == (10_000_000, None, False)
+    assert parse_salary("Tới 1,500 USD") == (None, 37_500_000, False)
+    assert parse_salary("12 triệu") == (12_000_000, 12_000_000, False)
+
+
+def test_parse_salary_upper_bound_markers():
+    assert parse_salary("Tối đa 20 triệu") == (None, 20_000_000, False)
+    assert parse_salary("Lên đến 20 triệu") == (None, 20_000_000, False)
+    assert parse_salary("Up to 2000 USD") == (None, 50_000_000, False)
+
+
+def test_parse_salary_negotiable():
+    assert parse_salary("Thỏa thuận") == (None, None, True)
+    assert parse_salary("") == (None, None, False)
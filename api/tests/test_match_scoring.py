@@ -0,0 +1,44 @@
+import pytest
+
+from match_scoring import MATCH_WEIGHTS, NEUTRAL_SCORE, cv_experience_years, cv_profile, score_job
+
+JOB = {
+    "id": 1,
+    "job_title": "Lập trình viên Python",
+    "skills": "Python; Django; SQL; AWS",
+    "experience": "2 năm",
+    "education": "Đại học",
+}
+
+
+def test_cv_experience_years_merges_overlapping_spans():
+    experience = [
+        {"start_date": "2019-01-01", "end_date": "2021-01-01"},
+        {"start_date": "2020-06-01", "end_date": "2022-01-01"},  # chồng lên mục trước
+        {"start_date": "2023-01-01", "end_date": None},  # thiếu ngày kết thúc: bỏ qua
+    ]
+    assert cv_experience_years(experience) == 3.0
+    assert cv_experience_years([]) is None
+
+
+def test_score_job_applies_weights():
+    profile = cv_profile({"skills": ["Python", "django", "Docker"], "experience_years": 3,
+                          "education": "Cử nhân Công nghệ thông tin"})
+    result = score_job(profile, JOB, aspiration_similarity=0.8)
+
+    assert result["score_breakdown"] == {"skills": 0.5, "experience": 1.0, "aspirations": 0.8, "education": 1.0}
+    assert result["match_score"] == pytest.approx(0.5 * 0.5 + 0.3 * 1.0 + 0.1 * 0.8 + 0.1 * 1.0)
+    assert result["matched_skills"] == ["Python", "Django"]
+    assert result["missing_skills"] == ["SQL", "AWS"]
+    assert result["matched_education"] == ["Đại học"]
+
+
+def test_score_job_partial_experience_and_missing_data():
+    profile = cv_profile({"skills": ["Python"], "experience_years": 1})
+    result = score_job(profile, JOB, aspiration_similarity=None)
+
+    assert result["score_breakdown"]["experience"] == 0.5  # 1 / 2 năm yêu cầu
+    assert result["score_breakdown"]["aspirations"] == NEUTRAL_SCORE
+    assert result["score_breakdown"]["education"] == NEUTRAL_SCORE  # CV không ghi học vấn
+    expected = sum(MATCH_WEIGHTS[k] * v for k, v in result["score_breakdown"].items())
+    assert result["match_score"] == pytest.approx(expected)
@@ -0,0 +1,41 @@
+import time
+
+from embedding_cache import EmbeddingCacheStore
+from llm_cache import LLMCacheStore
+
+
+def test_hits_are_flushed_in_batches(tmp_path):
+    store = LLMCacheStore(str(tmp_path / "llm_cache.db"), max_entries=100)
+    store.put("m", "t", "1", "k", {"answer": 42})
+    with store._manager.connection() as conn:
+        conn.execute("UPDATE llm_cache SET last_used = 0")
+        conn.commit()
+
+    for _ in range(3):
+        assert store.get("m", "t", "1", "k") == {"answer": 42}
+    with store._manager.connection(readonly=True) as conn:
+        row = conn.execute("SELECT last_used, hits FROM llm_cache").fetchone()
+    assert (row["last_used"], row["hits"]) == (0, 0)  # chưa ghi gì khi hit
+
+    store.flush()
+    with store._manager.connection(readonly=True) as conn:
+        row = conn.execute("SELECT last_used, hits FROM llm_cache").fetchone()
+    assert row["hits"] == 3 and row["last_used"] >= int(time.time()) - 5
+
+
+def test_eviction_recounts_rows_written_by_other_workers(tmp_path):
+    path = str(tmp_path / "embedding_cache.db")
+    worker_a, worker_b = EmbeddingCacheStore(path, max_entries=20), EmbeddingCacheStore(path, max_entries=20)
+    worker_a.put_many("m", "doc", [(f"a{i}", [0.1, 0.2]) for i in range(15)])
+    # Bộ đếm của worker_b chỉ thấy entry của nó, nhưng evict đếm lại cả file
+    worker_b.put_many("m", "doc", [(f"b{i}", [0.1, 0.2]) for i in range(15)])
+    with worker_b._manager.connection(readonly=True) as conn:
+        remaining = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert remaining <= 20
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    store = LLMCacheStore(str(tmp_path / "llm_cache.db"), max_entries=100)
+    store.put("m", "t", "1", "old", "stale", ttl=-1)
+    assert store.get("m", "t", "1", "old") is None
+    assert store.stats()["templates"]["t"]["misses"] == 1
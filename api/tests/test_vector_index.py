@@ -0,0 +1,37 @@
+import numpy as np
+
+from vector_index import JobVectorIndex
+
+
+class _Collection:
+    """Collection giả: chỉ các hàm mà JobVectorIndex._build dùng."""
+
+    name = "jobs"
+
+    def __init__(self, count: int, dim: int = 8):
+        self.vectors = np.random.default_rng(0).normal(size=(count, dim)).tolist()
+
+    def count(self) -> int:
+        return len(self.vectors)
+
+    def get(self, limit, offset, include):
+        page = self.vectors[offset:offset + limit]
+        return {"embeddings": page, "metadatas": [{"job_id": offset + i + 1} for i in range(len(page))]}
+
+
+def test_index_is_rebuilt_when_collection_count_drifts(tmp_path):
+    index = JobVectorIndex(str(tmp_path / "jobs"))
+    collection = _Collection(50)
+    assert index.ensure_built(collection)
+    assert not index.ensure_built(collection)
+
+    # Job thêm qua index.add (delta) vẫn khớp số lượng với Chroma
+    collection.vectors.append([1.0] * 8)
+    index.add([51], [[1.0] * 8])
+    assert not index.ensure_built(collection)
+
+    # Job ghi vào Chroma mà không qua index -> lệch số lượng, build lại
+    collection.vectors.extend([[0.5] * 8] * 3)
+    assert index.needs_rebuild(collection.count())
+    assert index.ensure_built(collection)
+    assert index.stats()["count"] == 54
@@ -0,0 +1,429 @@
+"""
+Vector Index - Index ANN trong process cho vector job (IVF trên file memory-mapped)
+
+Bản sao của collection job trong Chroma, tối ưu cho truy vấn top-k trong process:
+
+- Ma trận vector int8 (đã chuẩn hoá L2 rồi lượng tử hoá theo hàng, kèm scale float32;
+  cosine = tích vô hướng * scale) lưu bằng .npy và mở bằng np.load(mmap_mode='r'): nhiều
+  uvicorn worker dùng chung một bản trong page cache. int8 thay vì float16 vì numpy đổi
+  int8 -> float32 nhanh hơn nhiều (float16 không có đường tăng tốc trên đa số CPU).
+- IVF: k-means cầu (numpy thuần) chia vector thành ~4*sqrt(N) list; các hàng được xếp
+  theo list nên mỗi list là một đoạn liên tục. Truy vấn chỉ quét `nprobe` list gần nhất.
+- Delta: job mới/đổi nội dung sau lần build được nối vào file delta (append-only) và
+  quét tuần tự; bản ghi trong delta thay thế hàng cũ của cùng job_id. Khi delta vượt
+  VECTOR_INDEX_MAX_DELTA_RATIO thì build lại.
+
+Mỗi lần build ghi vào thư mục generation mới rồi đổi manifest.json bằng os.replace
+(atomic); reader phát hiện manifest đổi (kiểm tra tối đa mỗi VECTOR_INDEX_RELOAD_SECONDS)
+và mở generation mới. Chỉ một process ghi tại một thời điểm (file lock).
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khoá trong process
+    fcntl = None
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(base_dir)
+_default_db_path = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(os.path.dirname(_default_db_path), "vector_index"))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+VECTOR_INDEX_MAX_DELTA_RATIO = float(os.getenv("VECTOR_INDEX_MAX_DELTA_RATIO", "0.1"))
+VECTOR_INDEX_RELOAD_SECONDS = float(os.getenv("VECTOR_INDEX_RELOAD_SECONDS", "1.0"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64  # số điểm train k-means / list
+_BUILD_CHUNK = 8192  # số hàng xử lý mỗi lần khi build (giới hạn RAM)
+_MIN_DELTA_REBUILD = 1000
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _quantize(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Lượng tử hoá int8 đối xứng theo hàng: matrix ≈ q * scale[:, None]."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    return np.rint(matrix / scales[:, None]).astype(np.int8), scales
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Chỉ số của k điểm cao nhất, sắp giảm dần."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def train_ivf(sample: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """K-means cầu trên `sample` (đã chuẩn hoá): trả về `nlist` centroid đã chuẩn hoá (float32)."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        lists, starts = np.unique(assign[order], return_index=True)
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[lists] = sums
+        empty = np.setdiff1d(np.arange(nlist), lists)
+        if len(empty):  # list rỗng: lấy lại điểm ngẫu nhiên
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _BUILD_CHUNK):
+        chunk = np.asarray(vectors[start:start + _BUILD_CHUNK], dtype=np.float32)
+        assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+class _Snapshot:
+    """Các mảng của một phiên bản manifest (đổi nguyên khối khi reload, không khoá khi đọc)."""
+
+    def __init__(self, root: str, manifest: Dict):
+        self.manifest = manifest
+        gen_dir = os.path.join(root, manifest["generation"])
+        self.dim = manifest["dim"]
+        self.vectors = np.load(os.path.join(gen_dir, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(gen_dir, "scales.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(gen_dir, "ids.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(gen_dir, "centroids.npy"))
+        self.offsets = np.load(os.path.join(gen_dir, "offsets.npy"))
+        self.id_order = np.argsort(self.ids, kind="stable")
+        self.sorted_ids = np.asarray(self.ids)[self.id_order]
+
+        delta_count = manifest.get("delta_count", 0)
+        if delta_count:
+            self.delta_vectors = np.memmap(os.path.join(gen_dir, "delta_vectors.i8"), dtype=np.int8,
+                                           mode="r", shape=(delta_count, self.dim))
+            self.delta_scales = np.fromfile(os.path.join(gen_dir, "delta_scales.f32"), dtype=np.float32,
+                                            count=delta_count)
+            delta_ids = np.fromfile(os.path.join(gen_dir, "delta_ids.i64"), dtype=np.int64, count=delta_count)
+        else:
+            self.delta_vectors = np.zeros((0, self.dim), dtype=np.int8)
+            self.delta_scales = np.zeros(0, dtype=np.float32)
+            delta_ids = np.zeros(0, dtype=np.int64)
+        # Bản ghi cuối cùng của mỗi job trong delta thắng; id âm = job đã bị xoá
+        latest: Dict[int, int] = {}
+        for row, job_id in enumerate(delta_ids.tolist()):
+            latest[abs(job_id)] = row
+        self.superseded = np.fromiter(latest.keys(), dtype=np.int64, count=len(latest))
+        self.delta_rows = np.array([row for row in latest.values() if delta_ids[row] > 0], dtype=np.int64)
+        self.delta_live_ids = delta_ids[self.delta_rows] if len(self.delta_rows) else np.zeros(0, dtype=np.int64)
+        self.delta_lookup = {int(delta_ids[row]): int(row) for row in self.delta_rows}
+
+    @property
+    def count(self) -> int:
+        return len(self.ids) - int(np.isin(self.superseded, self.sorted_ids).sum()) + len(self.delta_rows)
+
+    def main_row(self, job_id: int) -> Optional[int]:
+        pos = np.searchsorted(self.sorted_ids, job_id)
+        if pos < len(self.sorted_ids) and self.sorted_ids[pos] == job_id:
+            return int(self.id_order[pos])
+        return None
+
+
+class JobVectorIndex:
+    """Index IVF của một collection job, thư mục `root` (manifest + các generation)."""
+
+    def __init__(self, root: str, nprobe: int = VECTOR_INDEX_NPROBE):
+        self.root = root
+        self.nprobe = nprobe
+        self._snapshot: Optional[_Snapshot] = None
+        self._manifest_stamp = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # ===== ĐỌC =====
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _current(self, force: bool = False) -> Optional[_Snapshot]:
+        """Snapshot hiện tại; mở lại nếu manifest đã đổi (kiểm tra tối đa mỗi RELOAD_SECONDS)."""
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._checked_at < VECTOR_INDEX_RELOAD_SECONDS:
+            return self._snapshot
+        with self._reload_lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.manifest_path)
+            except FileNotFoundError:
+                self._snapshot, self._manifest_stamp = None, None
+                return None
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if stamp != self._manifest_stamp:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    self._snapshot = _Snapshot(self.root, json.load(f))
+                self._manifest_stamp = stamp
+            return self._snapshot
+
+    def ready(self) -> bool:
+        return self._current() is not None
+
+    def stats(self) -> Dict:
+        snapshot = self._current()
+        if snapshot is None:
+            return {"ready": False}
+        manifest = snapshot.manifest
+        return {"ready": True, "count": snapshot.count, "dim": snapshot.dim, "nlist": manifest["nlist"],
+                "delta_count": manifest.get("delta_count", 0), "generation": manifest["generation"],
+                "built_at": manifest["built_at"]}
+
+    def search(self, vector: Sequence[float], k: int, allowed_ids: Optional[Iterable[int]] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (job_id, cosine similarity). Có allowed_ids thì chấm điểm chính xác trên đúng
+        các job đó (pre-filter); không thì quét `nprobe` list IVF gần nhất + toàn bộ delta.
+        """
+        snapshot = self._require()
+        query = _normalize(vector)
+        if allowed_ids is not None:
+            return self._search_subset(snapshot, query, k, allowed_ids)
+
+        nprobe = min(nprobe or self.nprobe, len(snapshot.centroids))
+        lists = _top_k(snapshot.centroids @ query, nprobe)
+        rows = np.concatenate([np.arange(snapshot.offsets[i], snapshot.offsets[i + 1]) for i in lists])
+        return self._score_rows(snapshot, query, k, rows, snapshot.delta_rows, snapshot.delta_live_ids)
+
+    def exact_search(self, vector: Sequence[float], k: int) -> List[Tuple[int, float]]:
+        """Quét toàn bộ (ground truth cho benchmark recall)."""
+        snapshot = self._require()
+        return self._score_rows(snapshot, _normalize(vector), k, np.arange(len(snapshot.ids)),
+                                snapshot.delta_rows, snapshot.delta_live_ids)
+
+    def _require(self) -> _Snapshot:
+        snapshot = self._current()
+        if snapshot is None:
+            raise RuntimeError(f"Vector index at {self.root} has not been built")
+        return snapshot
+
+    def _search_subset(self, snapshot: _Snapshot, query: np.ndarray, k: int,
+                       allowed_ids: Iterable[int]) -> List[Tuple[int, float]]:
+        allowed = np.unique(np.fromiter((int(j) for j in allowed_ids), dtype=np.int64))
+        rows = np.array([], dtype=np.int64)
+        if len(allowed) and len(snapshot.sorted_ids):
+            pos = np.minimum(np.searchsorted(snapshot.sorted_ids, allowed), len(snapshot.sorted_ids) - 1)
+            rows = np.sort(snapshot.id_order[pos[snapshot.sorted_ids[pos] == allowed]])
+        delta = [(j, snapshot.delta_lookup[j]) for j in allowed.tolist() if j in snapshot.delta_lookup]
+        delta_ids = np.array([j for j, _ in delta], dtype=np.int64)
+        delta_rows = np.array([row for _, row in delta], dtype=np.int64)
+        return self._score_rows(snapshot, query, k, rows, delta_rows, delta_ids)
+
+    @staticmethod
+    def _score_rows(snapshot: _Snapshot, query: np.ndarray, k: int, rows: np.ndarray,
+                    delta_rows: np.ndarray, delta_ids: np.ndarray) -> List[Tuple[int, float]]:
+        """Chấm điểm các hàng chính (trừ hàng đã bị delta thay thế) + các hàng delta, lấy top-k."""
+        ids = np.asarray(snapshot.ids[rows])
+        scores = (snapshot.vectors[rows].astype(np.float32) @ query) * snapshot.scales[rows]
+        if len(snapshot.superseded):
+            keep = ~np.isin(ids, snapshot.superseded)
+            ids, scores = ids[keep], scores[keep]
+        if len(delta_rows):
+            ids = np.concatenate([ids, delta_ids])
+            delta_scores = (snapshot.delta_vectors[delta_rows].astype(np.float32) @ query) * snapshot.delta_scales[delta_rows]
+            scores = np.concatenate([scores, delta_scores])
+        if not len(ids):
+            return []
+        best = _top_k(scores, k)
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+    def get_vector(self, job_id: int) -> Optional[np.ndarray]:
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        if job_id in snapshot.delta_lookup:
+            row = snapshot.delta_lookup[job_id]
+            return snapshot.delta_vectors[row].astype(np.float32) * snapshot.delta_scales[row]
+        if job_id in snapshot.superseded:
+            return None
+        row = snapshot.main_row(job_id)
+        return None if row is None else snapshot.vectors[row].astype(np.float32) * snapshot.scales[row]
+
+    def similar(self, job_id: int, k: int) -> Optional[List[Tuple[int, float]]]:
+        """Top-k job gần nhất với `job_id` (không gồm chính nó); None nếu job không có trong index."""
+        vector = self.get_vector(job_id)
+        if vector is None:
+            return None
+        return [hit for hit in self.search(vector, k + 1) if hit[0] != job_id][:k]
+
+    # ===== GHI =====
+
+    @contextmanager
+    def _locked(self):
+        """Khoá ghi: thread trong process + file lock giữa các process (uvicorn worker, script)."""
+        os.makedirs(self.root, exist_ok=True)
+        with self._write_lock, open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def needs_rebuild(self, collection_count: Optional[int] = None) -> bool:
+        """
+        True nếu chưa có index, delta quá lớn, hoặc số job của index (main + delta) khác
+        `collection_count` - vd. job được ghi vào Chroma bởi process không cập nhật index.
+        """
+        snapshot = self._current(force=True)
+        if snapshot is None:
+            return True
+        manifest = snapshot.manifest
+        limit = max(_MIN_DELTA_REBUILD, VECTOR_INDEX_MAX_DELTA_RATIO * manifest["count"])
+        if manifest.get("delta_count", 0) > limit:
+            return True
+        if collection_count is not None and snapshot.count != collection_count:
+            logging.info(f"⚠️ Vector index is stale: {snapshot.count} vectors, collection has {collection_count}")
+            return True
+        return False
+
+    def ensure_built(self, collection) -> bool:
+        """Build từ `collection` nếu index chưa có / delta quá lớn / lệch số job. True nếu đã build lại."""
+        with self._locked():
+            if not self.needs_rebuild(collection.count()):  # process khác có thể vừa build xong
+                return False
+            self._build(collection)
+            return True
+
+    def build_from_collection(self, collection) -> Dict:
+        with self._locked():
+            return self._build(collection)
+
+    def _build(self, collection, page_size: int = 5000) -> Dict:
+        """Đọc toàn bộ vector của collection Chroma, train IVF, ghi generation mới rồi đổi manifest."""
+        started = time.perf_counter()
+        generation = f"gen-{time.time_ns()}"
+        gen_dir = os.path.join(self.root, generation)
+        os.makedirs(gen_dir)
+        try:
+            total = collection.count()
+            raw_path = os.path.join(gen_dir, "raw.npy")
+            raw, ids, dim, n = None, np.zeros(max(total, 1), dtype=np.int64), 0, 0
+            for offset in range(0, total, page_size):
+                page = collection.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+                rows = [(int(metadata["job_id"]), embedding)
+                        for embedding, metadata in zip(page["embeddings"], page["metadatas"])
+                        if metadata and metadata.get("job_id") is not None]
+                if not rows:
+                    continue
+                if raw is None:
+                    dim = len(rows[0][1])
+                    raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float16, shape=(total, dim))
+                raw[n:n + len(rows)] = _normalize(np.array([vector for _, vector in rows]))
+                ids[n:n + len(rows)] = [job_id for job_id, _ in rows]
+                n += len(rows)
+            if n == 0:
+                raise ValueError(f"Collection '{collection.name}' has no job vectors to index")
+            ids = ids[:n]
+
+            nlist = max(1, min(n, int(4 * np.sqrt(n))))
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(n, min(n, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+            centroids = train_ivf(np.asarray(raw[sample_rows], dtype=np.float32), nlist)
+            assign = _assign(raw[:n], centroids)
+            order = np.argsort(assign, kind="stable")
+            offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+
+            vectors = np.lib.format.open_memmap(os.path.join(gen_dir, "vectors.npy"), mode="w+",
+                                                dtype=np.int8, shape=(n, dim))
+            scales = np.empty(n, dtype=np.float32)
+            for start in range(0, n, _BUILD_CHUNK):
+                chunk = order[start:start + _BUILD_CHUNK]
+                rows = np.asarray(raw[np.sort(chunk)], dtype=np.float32)[np.argsort(np.argsort(chunk))]
+                vectors[start:start + len(chunk)], scales[start:start + len(chunk)] = _quantize(rows)
+            vectors.flush()
+            del vectors, raw
+            os.remove(raw_path)
+            np.save(os.path.join(gen_dir, "ids.npy"), ids[order])
+            np.save(os.path.join(gen_dir, "scales.npy"), scales)
+            np.save(os.path.join(gen_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(gen_dir, "offsets.npy"), offsets.astype(np.int64))
+            for name in ("delta_vectors.i8", "delta_scales.f32", "delta_ids.i64"):
+                open(os.path.join(gen_dir, name), "wb").close()
+        except BaseException:
+            shutil.rmtree(gen_dir, ignore_errors=True)
+            raise
+
+        manifest = {"generation": generation, "source": collection.name, "count": int(n), "dim": int(dim),
+                    "nlist": int(nlist), "dtype": "int8", "metric": "cosine", "delta_count": 0,
+                    "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._write_manifest(manifest)
+        # Generation cũ: reader đang mmap vẫn đọc được sau khi unlink (POSIX)
+        for name in os.listdir(self.root):
+            if name.startswith("gen-") and name != generation:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self._current(force=True)
+        logging.info(f"✅ Built vector index for '{collection.name}': {n} vectors x {dim} dims, "
+                     f"{nlist} lists in {time.perf_counter() - started:.1f}s")
+        return manifest
+
+    def _append_delta(self, job_ids: List[int], vectors: np.ndarray) -> None:
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is None:
+                return  # chưa build: lần build sau sẽ đọc từ Chroma
+            gen_dir = os.path.join(self.root, manifest["generation"])
+            delta_count = manifest.get("delta_count", 0)
+            # Ghi đè từ vị trí delta_count: bỏ phần thừa của lần ghi trước bị ngắt giữa chừng
+            quantized, scales = _quantize(vectors)
+            for name, data, itemsize in (("delta_vectors.i8", quantized, manifest["dim"]),
+                                         ("delta_scales.f32", scales, 4),
+                                         ("delta_ids.i64", np.asarray(job_ids, dtype=np.int64), 8)):
+                with open(os.path.join(gen_dir, name), "r+b") as f:
+                    f.seek(delta_count * itemsize)
+                    f.write(data.tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+            manifest["delta_count"] = delta_count + len(job_ids)
+            self._write_manifest(manifest)
+
+    def add(self, job_ids: List[int], vectors: Sequence[Sequence[float]]) -> None:
+        """Thêm/cập nhật vector của các job (sau khi đã ghi vào Chroma)."""
+        if job_ids:
+            self._append_delta(list(job_ids), _normalize(np.asarray(vectors)))
+
+    def remove(self, job_ids: List[int]) -> None:
+        """Đánh dấu xoá các job khỏi index (tombstone trong delta)."""
+        if job_ids:
+            manifest = self._read_manifest()
+            if manifest:
+                self._append_delta([-int(j) for j in job_ids], np.zeros((len(job_ids), manifest["dim"])))
@@ -40,9 +40,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // ===== LOAD JOBS FROM API =====
 
+// Chỉ lấy các cột cần cho card (summary = 200 ký tự đầu của mô tả)
+const JOB_LIST_FIELDS = 'id,name,job_title,work_location,salary,experience,deadline,company_logo,work_type,level,summary';
+
 async function loadJobs() {
     try {
-        const response = await fetch(`${API_BASE_URL}/jobs?limit=1000`);
+        const response = await fetch(`${API_BASE_URL}/jobs?limit=1000&fields=${JOB_LIST_FIELDS}`);
         
         if (!response.ok) {
             throw new Error(`Failed to load jobs: ${response.statusText}`);
@@ -197,7 +200,7 @@ function applyFilters() {
             const searchLower = currentFilters.search;
             const matchTitle = (job.job_title || '').toLowerCase().includes(searchLower);
             const matchCompany = (job.name || '').toLowerCase().includes(searchLower);
-            const matchDesc = (job.job_description || '').toLowerCase().includes(searchLower);
+            const matchDesc = (job.summary || '').toLowerCase().includes(searchLower);
             
             if (!matchTitle && !matchCompany && !matchDesc) {
                 return false;
@@ -309,7 +312,7 @@ function renderJobCard(job) {
                         <span class="card-time">${experience}</span>
                     </div>
                     <p class="font-sm color-text-paragraph mt-15">
-                        ${(job.job_description || '').substring(0, 120)}...
+                        ${(job.summary || '').substring(0, 120)}...
                     </p>
                     <div class="mt-30">
                         <a class="btn btn-grey-small mr-5" href="#">${level}</a>
@@ -0,0 +1,133 @@
+"""
+Benchmark độ trễ event loop: gọi SQLite blocking trực tiếp vs qua async_db_utils
+
+Mô phỏng tải hỗn hợp của các endpoint (analytics nặng + lọc job + đọc/ghi
+match cache) chạy song song với một "heartbeat" coroutine ngủ 5ms mỗi vòng.
+Độ trễ của heartbeat so với lịch = thời gian event loop bị chặn.
+
+Chạy:
+    python scripts/bench_event_loop_lag.py --jobs 20000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# DB tạm, phải set trước khi import db_utils
+_tmp_dir = tempfile.mkdtemp(prefix="bench_loop_lag_")
+os.environ["TALENTBRIDGE_DB_PATH"] = os.path.join(_tmp_dir, "bench.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+import db_utils  # noqa: E402
+import async_db_utils  # noqa: E402
+
+LOCATIONS = ["Hà Nội", "Hồ Chí Minh", "Đà Nẵng", "Cần Thơ", "Hải Phòng"]
+WORK_TYPES = ["Toàn thời gian", "Bán thời gian", "Thực tập"]
+SKILLS = ["Python", "SQL", "Django", "React", "Excel", "SEO", "Java", "Kế toán", "Photoshop", "Docker"]
+
+
+def seed_jobs(n_jobs: int) -> None:
+    db_utils.create_tables()
+    rows = []
+    for i in range(n_jobs):
+        skills = "; ".join(random.sample(SKILLS, 3))
+        rows.append((
+            f"Công ty {i % 500}", f"Vị trí {i % 300}", f"http://bench/job{i}",
+            "Mô tả công việc " * 40, "Yêu cầu ứng viên " * 20, skills,
+            random.choice(LOCATIONS), random.choice(WORK_TYPES), f"{random.randint(0, 5)} năm",
+            f"{random.randint(1, 28):02d}/{random.randint(1, 12):02d}/2025", "10 - 20 triệu",
+        ))
+    with db_utils.get_db_connection() as conn:
+        conn.executemany('''INSERT INTO job_store (name, job_title, job_url, job_description,
+                            candidate_requirements, skills, work_location, work_type, experience,
+                            deadline, salary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        conn.commit()
+    # Chạy lại migration để tách job_skills + parse salary/deadline cho các job vừa seed
+    db_utils.create_tables()
+    for cv_id in range(1, 51):
+        db_utils.insert_match_log(f"bench-{cv_id}", cv_id, [{"job_id": j, "match_score": 0.5} for j in range(20)])
+
+
+def _request_plan(n_requests: int):
+    """Danh sách (tên hàm, args) cố định cho cả hai chế độ."""
+    random.seed(42)
+    plan = []
+    for i in range(n_requests):
+        r = random.random()
+        if r < 0.1:
+            plan.append(("compute_jobs_analytics", ()))
+        elif r < 0.5:
+            plan.append(("get_filtered_jobs", ({"skills": random.sample(SKILLS, 2),
+                                                "work_location": random.choice(LOCATIONS)},)))
+        elif r < 0.8:
+            plan.append(("get_cached_matches", (random.randint(1, 50),)))
+        else:
+            plan.append(("insert_match_log", (f"bench-{i}", random.randint(1, 50), [{"job_id": 1}])))
+    return plan
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.005) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def run_mode(mode: str, plan, concurrency: int) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(stop, lags))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(name, args):
+        async with semaphore:
+            if mode == "blocking":
+                getattr(db_utils, name)(*args)  # gọi thẳng trên event loop (hành vi cũ)
+                await asyncio.sleep(0)
+            else:
+                await getattr(async_db_utils, name)(*args)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(name, args) for name, args in plan))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat
+
+    lags_sorted = sorted(lags) or [0.0]
+    return {
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(lags_sorted),
+        "lag_p99_ms": lags_sorted[min(len(lags_sorted) - 1, int(len(lags_sorted) * 0.99))],
+        "lag_max_ms": lags_sorted[-1],
+        "heartbeats": len(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=20000, help="Số job giả lập trong job_store")
+    parser.add_argument("--requests", type=int, default=200, help="Số request trong tải hỗn hợp")
+    parser.add_argument("--concurrency", type=int, default=16, help="Số request chạy đồng thời")
+    args = parser.parse_args()
+
+    print(f"Seeding {args.jobs} jobs into {os.environ['TALENTBRIDGE_DB_PATH']} ...")
+    seed_jobs(args.jobs)
+    plan = _request_plan(args.requests)
+
+    print(f"{'mode':<10} {'elapsed':>9} {'lag p50':>9} {'lag p99':>9} {'lag max':>9} {'beats':>6}")
+    for mode in ("blocking", "async"):
+        r = asyncio.run(run_mode(mode, plan, args.concurrency))
+        print(f"{r['mode']:<10} {r['elapsed_s']:>8.2f}s {r['lag_p50_ms']:>7.1f}ms "
+              f"{r['lag_p99_ms']:>7.1f}ms {r['lag_max_ms']:>7.1f}ms {r['heartbeats']:>6}")
+        async_db_utils.shutdown_db_executor()
+        db_utils.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
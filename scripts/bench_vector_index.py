@@ -0,0 +1,84 @@
+"""
+Benchmark vector_index (IVF mmap) so với tìm kiếm chính xác và với Chroma
+
+Query là vector của các job ngẫu nhiên cộng nhiễu (tránh trường hợp query trùng
+hẳn một vector trong index). Với mỗi nprobe in recall@k so với quét toàn bộ và độ
+trễ p50/p95; kèm độ trễ của exact search và của collection.query() trong Chroma.
+
+Chạy:
+    python scripts/bench_vector_index.py --queries 200 --k 20 --nprobe 8,16,32,64
+    python scripts/bench_vector_index.py --rebuild   # build lại index từ Chroma trước
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from chroma_utils import JOBS_COLLECTION, get_vectorstore  # noqa: E402
+from vector_index import JobVectorIndex, VECTOR_INDEX_DIR  # noqa: E402
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):7.3f} ms  p95 {np.percentile(ms, 95):7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200, help="Số query")
+    parser.add_argument("--k", type=int, default=20, help="Top-k")
+    parser.add_argument("--nprobe", default="4,8,16,32,64", help="Các giá trị nprobe, phân tách bằng dấu phẩy")
+    parser.add_argument("--noise", type=float, default=0.05, help="Độ lệch chuẩn nhiễu thêm vào query")
+    parser.add_argument("--rebuild", action="store_true", help="Build lại index từ Chroma trước khi đo")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    collection = get_vectorstore()._collection
+    index = JobVectorIndex(os.path.join(VECTOR_INDEX_DIR, JOBS_COLLECTION))
+    if args.rebuild:
+        index.build_from_collection(collection)
+    else:
+        index.ensure_built(collection)
+    stats = index.stats()
+    print(f"Index: {stats['count']} vectors x {stats['dim']} dims, {stats['nlist']} lists, "
+          f"delta {stats['delta_count']} ({stats['generation']})")
+
+    rng = np.random.default_rng(args.seed)
+    job_ids = rng.choice(np.asarray(index._current().ids), size=args.queries)
+    queries = [index.get_vector(int(job_id)) for job_id in job_ids]
+    queries = [q + rng.normal(0, args.noise, q.shape).astype(np.float32) for q in queries if q is not None]
+
+    exact, exact_times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        exact.append({job_id for job_id, _ in index.exact_search(q, args.k)})
+        exact_times.append(time.perf_counter() - start)
+    print(f"{'exact':<12} recall 1.000  {percentiles(exact_times)}")
+
+    for nprobe in [int(n) for n in args.nprobe.split(",")]:
+        recalls, times = [], []
+        for q, truth in zip(queries, exact):
+            start = time.perf_counter()
+            hits = index.search(q, args.k, nprobe=nprobe)
+            times.append(time.perf_counter() - start)
+            recalls.append(len(truth & {job_id for job_id, _ in hits}) / len(truth))
+        print(f"nprobe={nprobe:<5} recall {np.mean(recalls):.3f}  {percentiles(times)}")
+
+    chroma_times = []
+    for q in queries[:50]:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[q.tolist()], n_results=args.k, include=["metadatas", "distances"])
+        chroma_times.append(time.perf_counter() - start)
+    print(f"{'chroma':<12}               {percentiles(chroma_times)}")
+
+
+if __name__ == "__main__":
+    main()
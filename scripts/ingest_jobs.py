@@ -0,0 +1,45 @@
+"""
+Ingest file job (JSONL hoặc CSV) vào SQLite + Chroma qua ingest_pipeline
+
+Chỉ job mới/đổi nội dung được ghi và embed; chạy lại sau khi bị ngắt sẽ tiếp tục
+từ checkpoint. Khi VECTOR_INDEX_ENABLED bật, vector mới cũng được ghi vào vector_index
+(delta) và index được build lại nếu cần, như chroma_utils.preload_jobs. In ra số job inserted/updated/unchanged và throughput từng stage.
+
+Chạy:
+    python scripts/ingest_jobs.py data/combined_detailpages.csv --batch-size 500
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from chroma_utils import get_job_index, get_vectorstore  # noqa: E402
+from ingest_pipeline import run_ingest  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", help="File .jsonl hoặc .csv")
+    parser.add_argument("--batch-size", type=int, default=500, help="Số bản ghi mỗi batch")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Số process parse (mặc định: tự chọn theo kích thước file)")
+    args = parser.parse_args()
+
+    vectorstore = get_vectorstore()
+    job_index = get_job_index()
+    result = run_ingest(args.source, vectorstore, args.batch_size, args.parse_workers,
+                        on_batch_written=job_index.add if job_index else None)
+    if job_index:
+        # Chưa có index / delta quá lớn / lệch số job với Chroma -> build lại
+        result["vector_index_rebuilt"] = job_index.ensure_built(vectorstore._collection)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Tách Chroma store cũ (job + CV chung collection `langchain`) sang 2 collection `jobs` và `cvs`
+
+Vector đã lưu được chép nguyên (không gọi lại embedding API). App cũng tự chạy
+migration này lúc startup; script dùng khi muốn migrate trước hoặc giữ lại
+collection cũ để kiểm tra (--keep-legacy).
+
+Chạy:
+    python scripts/migrate_chroma_collections.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from chroma_utils import migrate_legacy_collection  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000, help="Số document đọc mỗi lần")
+    parser.add_argument("--keep-legacy", action="store_true", help="Không xoá collection cũ sau khi chép")
+    args = parser.parse_args()
+
+    counts = migrate_legacy_collection(batch_size=args.batch_size, drop_legacy=not args.keep_legacy)
+    print(f"jobs: {counts['jobs']}  cvs: {counts['cvs']}  skipped: {counts['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
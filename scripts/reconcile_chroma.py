@@ -0,0 +1,36 @@
+"""
+Đối soát job giữa SQLite (job_store) và Chroma (collection jobs), có thể sửa lệch
+
+Báo cáo số job thiếu vector (missing), vector cũ (stale / unhashed), doc trùng
+(duplicate) và doc mồ côi (orphaned). --repair chỉ embed lại / xoá đúng các mục lệch.
+
+Chạy:
+    python scripts/reconcile_chroma.py              # chỉ báo cáo
+    python scripts/reconcile_chroma.py --repair
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from reconciler import RECONCILE_BATCH_SIZE, reconcile  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repair", action="store_true", help="Embed lại / xoá các mục lệch")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE, help="Số job / document mỗi batch")
+    args = parser.parse_args()
+
+    report = reconcile(repair=args.repair, batch_size=args.batch_size)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,21 @@ import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Cùng biến môi trường / mặc định với api/db_utils, blob_store, vector_index, embedding_cache,
+# llm_cache và chroma_utils, để reset đúng các file mà API đang dùng
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.getenv("TALENTBRIDGE_DB_PATH", os.path.join(project_root, "db/cv_job_matching.db"))
+DB_DIR = os.path.dirname(DB_PATH)
+CHROMA_PATH = os.path.join(project_root, "db/chroma_db")
+BLOB_STORE_DIR = os.getenv("TALENTBRIDGE_BLOB_DIR", os.path.join(DB_DIR, "cv_blobs"))
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(DB_DIR, "vector_index"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DB_DIR, "embedding_cache.db"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DB_DIR, "llm_cache.db"))
+
 def reset_databases():
     """Xóa toàn bộ database cũ"""
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
     # Xóa ChromaDB
-    chroma_path = os.path.join(base_dir, "db", "chroma_db")
+    chroma_path = CHROMA_PATH
     if os.path.exists(chroma_path):
         try:
             shutil.rmtree(chroma_path)
@@ -22,8 +31,8 @@ def reset_databases():
     else:
         logging.info("ChromaDB không tồn tại")
     
-    # Xóa SQLite
-    sqlite_path = os.path.join(base_dir, "db", "cv_job_matching.db")
+    # Xóa SQLite (kèm file -wal/-shm của chế độ WAL)
+    sqlite_path = DB_PATH
     if os.path.exists(sqlite_path):
         try:
             os.remove(sqlite_path)
@@ -32,9 +41,44 @@ def reset_databases():
             logging.error(f"❌ Lỗi khi xóa SQLite: {e}")
     else:
         logging.info("SQLite database không tồn tại")
+    for suffix in ("-wal", "-shm"):
+        sidecar_path = sqlite_path + suffix
+        if os.path.exists(sidecar_path):
+            try:
+                os.remove(sidecar_path)
+            except Exception as e:
+                logging.error(f"❌ Lỗi khi xóa {sidecar_path}: {e}")
+    
+    # Xóa file PDF của CV (blob store)
+    blob_path = BLOB_STORE_DIR
+    if os.path.exists(blob_path):
+        try:
+            shutil.rmtree(blob_path)
+            logging.info(f"✅ Đã xóa CV blob store: {blob_path}")
+        except Exception as e:
+            logging.error(f"❌ Lỗi khi xóa CV blob store: {e}")
+    
+    # Xóa vector index trong process (bản sao của collection jobs trong ChromaDB)
+    vector_index_path = VECTOR_INDEX_DIR
+    if os.path.exists(vector_index_path):
+        try:
+            shutil.rmtree(vector_index_path)
+            logging.info(f"✅ Đã xóa vector index: {vector_index_path}")
+        except Exception as e:
+            logging.error(f"❌ Lỗi khi xóa vector index: {e}")
+    
+    # Giữ lại embedding cache: rebuild ChromaDB sẽ lấy vector từ cache thay vì gọi lại API
+    embedding_cache_path = EMBEDDING_CACHE_PATH
+    if os.path.exists(embedding_cache_path):
+        logging.info(f"ℹ️ Giữ lại embedding cache: {embedding_cache_path}")
+    
+    # Giữ lại LLM cache: khoá là hash của prompt, dữ liệu mới sinh ra khoá mới
+    llm_cache_path = LLM_CACHE_PATH
+    if os.path.exists(llm_cache_path):
+        logging.info(f"ℹ️ Giữ lại LLM cache: {llm_cache_path}")
     
     # Tạo lại thư mục db
-    db_dir = os.path.join(base_dir, "db")
+    db_dir = DB_DIR
     os.makedirs(db_dir, exist_ok=True)
     logging.info(f"✅ Đã tạo lại thư mục db: {db_dir}")
     